@@ -58,6 +58,18 @@ def setup_test_environment(temp_model_file):
     if test_db_path.exists():
         test_db_path.unlink()
 
+@pytest.fixture(autouse=True)
+def reset_drain_mode():
+    """
+    Sortie de drainage avant chaque test
+
+    L'arrêt du cycle de vie (`with TestClient(app)`) laisse le worker en
+    drainage ; les clients de module, sans cycle de vie, doivent être servis.
+    """
+    from core.lifecycle import drain_controller
+    drain_controller.reset()
+    yield
+
 @pytest.fixture
 def client():
     """Fixture pour le client de test FastAPI"""
@@ -64,4 +64,211 @@ class TestAuthentication:
             "email": "admin2@test.com",
             "password": "password123!"
         })
-        assert response.status_code == 400
\ No newline at end of file
+        assert response.status_code == 400
+    
+    def test_startup_does_not_hash_passwords(self, monkeypatch, tmp_path):
+        """Le démarrage sur une base vide utilise les hashs précalculés (aucun appel bcrypt)"""
+        import asyncio
+        from sqlalchemy import create_engine
+        from sqlalchemy.orm import sessionmaker
+        from core import security, database
+        from services.user_service import UserService
+        
+        def forbidden(*args, **kwargs):
+            raise AssertionError("bcrypt appelé au démarrage")
+        
+        monkeypatch.setattr(security.pwd_context, "hash", forbidden)
+        
+        # Base temporaire vide : les utilisateurs par défaut y sont réellement créés
+        engine = create_engine(f"sqlite:///{tmp_path / 'fresh.db'}")
+        monkeypatch.setattr(database, "engine", engine)
+        monkeypatch.setattr(database, "SessionLocal", sessionmaker(autocommit=False, autoflush=False, bind=engine))
+        
+        asyncio.run(database.init_db())
+        UserService()
+        
+        with database.get_db_context() as db:
+            usernames = {user.username for user in db.query(database.User)}
+        assert usernames == {"admin", "testuser"}
+        engine.dispose()
+
+@pytest.fixture
+def user_tokens():
+    """Paire de tokens fraîche pour testuser"""
+    response = client.post("/auth/login", json={
+        "username": "testuser",
+        "password": "user123!"
+    })
+    return response.json()
+
+
+class TestTokenLifecycle:
+    """Tests du renouvellement et de la révocation des tokens"""
+    
+    def test_refresh_rotates_tokens(self, user_tokens):
+        """Le refresh token donne une nouvelle paire et ne peut servir qu'une fois"""
+        refresh_token = user_tokens["refresh_token"]
+        
+        response = client.post("/auth/refresh", json={"refresh_token": refresh_token})
+        assert response.status_code == 200
+        new_tokens = response.json()
+        assert new_tokens["access_token"] != user_tokens["access_token"]
+        
+        headers = {"Authorization": f"Bearer {new_tokens['access_token']}"}
+        assert client.get("/predict/history", headers=headers).status_code == 200
+        
+        response = client.post("/auth/refresh", json={"refresh_token": refresh_token})
+        assert response.status_code == 401
+    
+    def test_refresh_token_is_not_an_access_token(self, user_tokens):
+        """Un refresh token ne donne pas accès aux routes protégées"""
+        headers = {"Authorization": f"Bearer {user_tokens['refresh_token']}"}
+        assert client.get("/predict/history", headers=headers).status_code == 401
+    
+    def test_logout_revokes_tokens(self, user_tokens):
+        """Après déconnexion, les deux tokens sont refusés"""
+        headers = {"Authorization": f"Bearer {user_tokens['access_token']}"}
+        assert client.get("/predict/history", headers=headers).status_code == 200
+        
+        response = client.post(
+            "/auth/logout",
+            headers=headers,
+            json={"refresh_token": user_tokens["refresh_token"]}
+        )
+        assert response.status_code == 200
+        
+        assert client.get("/predict/history", headers=headers).status_code == 401
+        response = client.post("/auth/refresh", json={"refresh_token": user_tokens["refresh_token"]})
+        assert response.status_code == 401
+
+
+class TestTokenDenylist:
+    """Tests de la denylist à filtre de Bloom"""
+    
+    def test_bloom_filter_has_no_false_negatives(self):
+        from core.denylist import BloomFilter
+        
+        bloom = BloomFilter(capacity=1000, error_rate=0.01)
+        items = [f"jti-{i}" for i in range(1000)]
+        for item in items:
+            bloom.add(item)
+        
+        assert all(item in bloom for item in items)
+        false_positives = sum(f"other-{i}" in bloom for i in range(10000))
+        assert false_positives < 300
+    
+    def test_unknown_token_checked_without_database(self, monkeypatch):
+        """Le cas « non révoqué » est tranché par le filtre, sans accès base"""
+        import time
+        from core import denylist
+        
+        denylist_ = denylist.TokenDenylist(sync_interval=3600)
+        denylist_.sync()
+        
+        def no_db():
+            raise AssertionError("accès base inattendu")
+        
+        monkeypatch.setattr(denylist, "get_db_context", no_db)
+        assert denylist_.is_revoked("never-revoked", time.time() + 60) is False
+        assert denylist_.db_lookups == 0
+    
+    def test_background_sync_reads_other_workers(self):
+        """Les révocations d'un autre worker sont relues par le thread de synchronisation"""
+        import time
+        import uuid
+        from datetime import datetime
+        from core.denylist import TokenDenylist
+        from core.database import get_db_context, RevokedTokenCRUD
+        
+        denylist_ = TokenDenylist(sync_interval=0.05)
+        denylist_.start()
+        try:
+            jti = uuid.uuid4().hex
+            exp = time.time() + 600
+            with get_db_context() as db:
+                RevokedTokenCRUD.revoke(db, jti, datetime.utcfromtimestamp(exp), None)
+            
+            deadline = time.monotonic() + 5
+            while not denylist_.is_revoked(jti, exp) and time.monotonic() < deadline:
+                time.sleep(0.05)
+            assert denylist_.is_revoked(jti, exp) is True
+        finally:
+            denylist_.stop()
+        assert denylist_._thread is None
+    
+    def test_expired_buckets_are_dropped(self):
+        from core.denylist import TokenDenylist
+        
+        denylist_ = TokenDenylist(bucket_seconds=60)
+        denylist_._add_local("old", 100)
+        denylist_._add_local("current", 10_000)
+        
+        assert denylist_._drop_expired_buckets(now=5_000) == 1
+        assert denylist_.stats()["buckets"] == 1
+
+
+class TestAPIKeys:
+    """Tests de l'authentification par clé API"""
+    
+    def test_api_key_lifecycle(self, user_tokens):
+        """Une clé API donne accès aux routes protégées jusqu'à sa révocation"""
+        headers = {"Authorization": f"Bearer {user_tokens['access_token']}"}
+        response = client.post("/auth/api-keys", headers=headers, json={"name": "uploader"})
+        assert response.status_code == 200
+        created = response.json()
+        assert created["key"].startswith("p3_")
+        
+        key_headers = {"X-API-Key": created["key"]}
+        assert client.get("/predict/history", headers=key_headers).status_code == 200
+        
+        keys = client.get("/auth/api-keys", headers=headers).json()
+        assert created["id"] in [key["id"] for key in keys]
+        assert all(key["key"] is None for key in keys)
+        
+        response = client.delete(f"/auth/api-keys/{created['id']}", headers=headers)
+        assert response.status_code == 200
+        assert client.get("/predict/history", headers=key_headers).status_code == 401
+    
+    def test_unknown_api_key_rejected(self):
+        response = client.get("/predict/history", headers={"X-API-Key": "p3_unknown"})
+        assert response.status_code == 401
+    
+    def test_unknown_keys_do_not_evict_valid_keys(self, user_tokens, monkeypatch):
+        """Les clés inconnues ont leur propre cache, plus petit"""
+        from core.api_keys import APIKeyManager
+        
+        manager = APIKeyManager(cache_size=4, cache_ttl=60, unknown_cache_size=8)
+        monkeypatch.setattr(manager, "_next_flush", float("inf"))
+        headers = {"Authorization": f"Bearer {user_tokens['access_token']}"}
+        key = client.post("/auth/api-keys", headers=headers, json={"name": "spray"}).json()["key"]
+        assert manager.authenticate(key) is not None
+        
+        for i in range(50):
+            assert manager.authenticate(f"p3_random_{i}") is None
+        
+        stats = manager.stats()
+        assert stats["size"] == 1
+        assert stats["unknown_keys"]["size"] == 8
+        
+        monkeypatch.setattr(manager, "_load", lambda key_hash: pytest.fail("clé valide relue en base"))
+        assert manager.authenticate(key) is not None
+        assert manager.authenticate("p3_random_49") is None
+    
+    def test_api_key_stored_as_hash(self, user_tokens, monkeypatch):
+        """Seule l'empreinte SHA-256 est stockée ; last_used est écrit par lots"""
+        from core.api_keys import api_key_manager, hash_api_key
+        from core.database import get_db_context, APIKey
+        
+        monkeypatch.setattr(api_key_manager, "_next_flush", float("inf"))
+        headers = {"Authorization": f"Bearer {user_tokens['access_token']}"}
+        key = client.post("/auth/api-keys", headers=headers, json={"name": "hash"}).json()
+        client.get("/predict/history", headers={"X-API-Key": key["key"]})
+        
+        with get_db_context() as db:
+            record = db.query(APIKey).filter(APIKey.id == key["id"]).one()
+            assert record.key_hash == hash_api_key(key["key"])
+            assert record.last_used is None
+        
+        assert api_key_manager.flush_usage() >= 1
+        with get_db_context() as db:
+            assert db.query(APIKey).filter(APIKey.id == key["id"]).one().last_used is not None
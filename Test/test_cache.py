@@ -0,0 +1,73 @@
+import pytest
+
+from core.cache import TTLCache
+from services.user_service import UserCache
+
+
+class FakeClock:
+    """Horloge contrôlable pour tester l'expiration"""
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def make_user(user_id, username, email):
+    return {"id": user_id, "username": username, "email": email}
+
+
+class TestTTLCache:
+    """Tests du cache LRU à expiration"""
+
+    def test_entry_expires_after_ttl(self):
+        clock = FakeClock()
+        cache = TTLCache(maxsize=10, ttl=5, clock=clock)
+        cache.set("a", 1)
+
+        clock.now = 4.9
+        assert cache.get("a") == 1
+
+        clock.now = 5.0
+        assert cache.get("a") is None
+
+    def test_lru_eviction_is_bounded(self):
+        cache = TTLCache(maxsize=2, ttl=60)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        cache.get("a")  # "b" devient la moins récemment utilisée
+        cache.set("c", 3)
+
+        assert len(cache) == 2
+        assert cache.get("b") is None
+        assert cache.get("a") == 1
+        assert cache.get("c") == 3
+
+
+class TestUserCache:
+    """Tests du cache utilisateurs indexé"""
+
+    def test_lookup_by_all_indexes(self):
+        cache = UserCache(maxsize=10, ttl=60)
+        cache.put(make_user(1, "alice", "alice@test.com"))
+
+        assert cache.get_by_id(1)["username"] == "alice"
+        assert cache.get_by_username("alice")["id"] == 1
+        assert cache.get_by_email("alice@test.com")["id"] == 1
+
+    def test_invalidation_drops_secondary_indexes(self):
+        cache = UserCache(maxsize=10, ttl=60)
+        cache.put(make_user(1, "alice", "alice@test.com"))
+        cache.invalidate(1)
+
+        assert cache.get_by_username("alice") is None
+        assert cache.get_by_email("alice@test.com") is None
+
+    def test_email_change_reindexes(self):
+        cache = UserCache(maxsize=10, ttl=60)
+        cache.put(make_user(1, "alice", "old@test.com"))
+        cache.put(make_user(1, "alice", "new@test.com"))
+
+        assert cache.get_by_email("old@test.com") is None
+        assert cache.get_by_email("new@test.com")["id"] == 1
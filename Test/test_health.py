@@ -39,3 +39,110 @@ class TestHealthAndInfo:
         assert data["status"] == "healthy"
         assert "services" in data
         assert "timestamp" in data
+
+    def test_liveness(self):
+        """/livez répond sans vérifier les dépendances"""
+        response = client.get("/livez")
+        assert response.status_code == 200
+        assert response.json()["status"] == "alive"
+
+    def test_readiness(self):
+        """/readyz : modèle préchauffé et base joignable"""
+        response = client.get("/readyz")
+        assert response.status_code == 200
+        data = response.json()
+        assert data == {"status": "ready", "model": "ready", "database": "connected", "state": "serving"}
+
+    def test_readiness_gated_on_warmup_and_cached(self, monkeypatch):
+        """503 tant que le préchauffage n'est pas fini ; résultat gardé pendant le TTL"""
+        import asyncio
+        from services.health_service import HealthService
+        from services.prediction_service import PredictionService
+        import services.health_service as health_module
+
+        pings = []
+        monkeypatch.setattr(health_module, "check_db_connection", lambda: pings.append(1) or True)
+
+        async def scenario():
+            prediction_service = PredictionService()
+            health = HealthService(prediction_service, ttl=60)
+            before = await health.readiness()
+
+            await prediction_service.load_model()
+            cached = await health.readiness()
+            fresh = await HealthService(prediction_service, ttl=60).readiness()
+            return before, cached, fresh
+
+        before, cached, fresh = asyncio.run(scenario())
+        assert before == {"ready": False, "checks": {"model": "not_loaded", "database": "connected", "state": "serving"}}
+        assert cached is before
+        assert fresh["ready"] is True
+        assert len(pings) == 2
+
+    def test_readiness_not_queued_behind_predictions(self):
+        """Exécuteur par défaut saturé (inférence) : la sonde répond quand même"""
+        import asyncio
+        import threading
+        import time
+        from services.health_service import HealthService
+        from services.prediction_service import PredictionService
+
+        release = threading.Event()
+
+        async def scenario():
+            prediction_service = PredictionService()
+            await prediction_service.load_model()
+            loop = asyncio.get_running_loop()
+            busy = [loop.run_in_executor(None, release.wait) for _ in range(64)]
+            health = HealthService(prediction_service, ttl=0, db_timeout=2)
+            try:
+                start = time.monotonic()
+                result = await health.readiness()
+                return result, time.monotonic() - start
+            finally:
+                release.set()
+                await asyncio.gather(*busy)
+                health.shutdown()
+
+        result, elapsed = asyncio.run(scenario())
+        assert result["ready"] is True
+        assert elapsed < 2
+
+    def test_slow_database_ping_times_out(self, monkeypatch):
+        """Ping de la base bloqué : base signalée indisponible après le délai"""
+        import asyncio
+        import threading
+        from services.health_service import HealthService
+        from services.prediction_service import PredictionService
+        import services.health_service as health_module
+
+        release = threading.Event()
+        monkeypatch.setattr(health_module, "check_db_connection", lambda: release.wait(5))
+
+        async def scenario():
+            health = HealthService(PredictionService(), ttl=0, db_timeout=0.1)
+            try:
+                return await health.readiness()
+            finally:
+                release.set()
+                health.shutdown()
+
+        assert asyncio.run(scenario())["checks"]["database"] == "unavailable"
+
+    def test_warmup_runs_every_batch_size(self):
+        """Un appel au modèle par taille de lot configurée"""
+        import asyncio
+        from services.prediction_service import PredictionService
+
+        async def scenario():
+            service = PredictionService()
+            await service.load_model()
+            calls = []
+            predict = service.model.predict
+            service.model.predict = lambda x, verbose=0: calls.append(len(x)) or predict(x, verbose)
+            await service._test_model()
+            return service, calls
+
+        service, calls = asyncio.run(scenario())
+        assert calls == service.warmup_batch_sizes
+        assert 1 in calls and service.is_warmed_up
@@ -0,0 +1,173 @@
+import pytest
+import io
+import gzip
+from fastapi.testclient import TestClient
+from PIL import Image
+import numpy as np
+
+from main import app
+
+client = TestClient(app)
+
+@pytest.fixture
+def auth_headers():
+    """Fixture pour obtenir les headers d'un utilisateur authentifié"""
+    response = client.post("/auth/login", json={
+        "username": "testuser",
+        "password": "user123!"
+    })
+    return {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+@pytest.fixture
+def admin_headers():
+    """Fixture pour obtenir les headers de l'administrateur"""
+    response = client.post("/auth/login", json={
+        "username": "admin",
+        "password": "admin123!"
+    })
+    return {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+@pytest.fixture
+def test_image():
+    """Fixture pour créer une image de test"""
+    img = Image.fromarray(np.random.randint(0, 255, (150, 150, 3), dtype=np.uint8))
+    img_bytes = io.BytesIO()
+    img.save(img_bytes, format='JPEG')
+    img_bytes.seek(0)
+    return img_bytes
+
+class TestCompression:
+    """Tests de la compression des réponses"""
+
+    @staticmethod
+    def _make_client(minimum_size=100):
+        from fastapi import FastAPI
+        from fastapi.responses import StreamingResponse
+        from core.middleware import PipelineMiddleware, CompressionStage
+
+        test_app = FastAPI()
+
+        @test_app.get("/large")
+        async def large():
+            return {"items": ["Playstation"] * 100}
+
+        @test_app.get("/small")
+        async def small():
+            return {"ok": True}
+
+        @test_app.get("/stream")
+        async def stream():
+            async def lines():
+                for i in range(3):
+                    yield f'{{"index": {i}}}\n'.encode()
+            return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+        test_app.add_middleware(PipelineMiddleware, stages=[CompressionStage(minimum_size=minimum_size)])
+        return TestClient(test_app)
+
+    def test_negotiation(self):
+        """Choix du codage selon Accept-Encoding et les q-values"""
+        from core.middleware import negotiate_encoding
+
+        assert negotiate_encoding("") is None
+        assert negotiate_encoding("identity") is None
+        assert negotiate_encoding("gzip;q=0") is None
+        assert negotiate_encoding("deflate, gzip;q=0.5") == "gzip"
+        assert negotiate_encoding("*") in ("br", "gzip")
+
+    def test_large_response_is_compressed(self):
+        """Au-delà du seuil, le corps est compressé et la longueur recalculée"""
+        test_client = self._make_client()
+
+        response = test_client.get("/large", headers={"Accept-Encoding": "gzip"})
+        assert response.status_code == 200
+        assert response.headers["Content-Encoding"] == "gzip"
+        assert "Accept-Encoding" in response.headers["Vary"]
+        assert int(response.headers["Content-Length"]) < len(response.content)
+        assert response.json()["items"][0] == "Playstation"
+
+    def test_small_or_unaccepted_response_is_untouched(self):
+        """Sous le seuil, ou sans Accept-Encoding, la réponse part telle quelle"""
+        test_client = self._make_client()
+
+        response = test_client.get("/small", headers={"Accept-Encoding": "gzip"})
+        assert "Content-Encoding" not in response.headers
+
+        response = test_client.get("/large", headers={"Accept-Encoding": "identity"})
+        assert "Content-Encoding" not in response.headers
+        assert response.json()["items"][-1] == "Playstation"
+
+    def test_streaming_response_is_compressed_per_chunk(self):
+        """Chaque morceau d'un flux est compressé et vidé aussitôt"""
+        test_client = self._make_client(minimum_size=10**6)
+
+        with test_client.stream("GET", "/stream", headers={"Accept-Encoding": "gzip"}) as response:
+            assert response.headers["Content-Encoding"] == "gzip"
+            assert "Content-Length" not in response.headers
+            raw = b"".join(response.iter_raw())
+
+        assert gzip.decompress(raw).decode().splitlines() == [f'{{"index": {i}}}' for i in range(3)]
+
+class TestConditionalRequests:
+    """Tests des requêtes conditionnelles (ETag / If-None-Match)"""
+
+    def test_history_not_modified_until_new_prediction(self, auth_headers, test_image):
+        """L'ETag de l'historique change avec une nouvelle prédiction"""
+        response = client.get("/predict/history", headers=auth_headers)
+        assert response.status_code == 200
+        etag = response.headers["ETag"]
+        assert etag.startswith('W/"')
+
+        response = client.get("/predict/history", headers={**auth_headers, "If-None-Match": etag})
+        assert response.status_code == 304
+        assert response.content == b""
+        assert response.headers["ETag"] == etag
+
+        files = {"file": ("test.jpg", test_image, "image/jpeg")}
+        assert client.post("/predict/image", headers=auth_headers, files=files).status_code == 200
+
+        response = client.get("/predict/history", headers={**auth_headers, "If-None-Match": etag})
+        assert response.status_code == 200
+        assert response.headers["ETag"] != etag
+
+    def test_stats_not_modified_without_changes(self, admin_headers, monkeypatch):
+        """Une 304 sur les statistiques ne recalcule rien"""
+        response = client.get("/admin/stats", headers=admin_headers)
+        assert response.status_code == 200
+        etag = response.headers["ETag"]
+
+        async def fail():
+            raise AssertionError("statistiques recalculées")
+
+        monkeypatch.setattr(app.state.prediction_service, "get_stats_rollup", fail)
+
+        response = client.get("/admin/stats", headers={**admin_headers, "If-None-Match": f'"other", {etag}'})
+        assert response.status_code == 304
+
+    def test_stats_etag_follows_users_created_elsewhere(self, admin_headers):
+        """Un utilisateur créé par un autre worker (même base) change l'ETag"""
+        from core.database import get_db_context, UserCRUD
+
+        response = client.get("/admin/stats", headers=admin_headers)
+        etag, users = response.headers["ETag"], response.json()["users"]
+
+        with get_db_context() as db:
+            user_id = UserCRUD.create_user(db, "autre_worker", "autre_worker@test.com", "hash").id
+        try:
+            response = client.get("/admin/stats", headers={**admin_headers, "If-None-Match": etag})
+            assert response.status_code == 200
+            assert response.json()["users"] == users + 1
+        finally:
+            with get_db_context() as db:
+                UserCRUD.delete_user(db, user_id)
+
+    def test_etag_differs_between_processes(self, auth_headers, monkeypatch):
+        """Mêmes compteurs dans un autre processus (ou après redémarrage) : ETag différent"""
+        import uuid
+
+        etag = client.get("/predict/history", headers=auth_headers).headers["ETag"]
+
+        monkeypatch.setattr(app.state.prediction_service, "epoch", uuid.uuid4().hex)
+        response = client.get("/predict/history", headers={**auth_headers, "If-None-Match": etag})
+        assert response.status_code == 200
+        assert response.headers["ETag"] != etag
@@ -0,0 +1,230 @@
+import pytest
+import io
+import json
+import time
+import asyncio
+import zipfile
+from fastapi.testclient import TestClient
+from PIL import Image
+import numpy as np
+
+from main import app
+
+def make_image() -> bytes:
+    """Image JPEG aléatoire"""
+    img = Image.fromarray(np.random.randint(0, 255, (150, 150, 3), dtype=np.uint8))
+    img_bytes = io.BytesIO()
+    img.save(img_bytes, format='JPEG')
+    return img_bytes.getvalue()
+
+@pytest.fixture
+def jobs_dir(tmp_path, monkeypatch):
+    """Répertoire des jobs isolé par test"""
+    from core.config import settings
+    monkeypatch.setattr(settings, "JOBS_DIR", str(tmp_path))
+    return tmp_path
+
+@pytest.fixture
+def client(jobs_dir):
+    """Client de test avec le cycle de vie complet (workers de jobs démarrés)"""
+    with TestClient(app) as c:
+        yield c
+
+@pytest.fixture
+def auth_headers(client):
+    """Fixture pour obtenir les headers d'un utilisateur authentifié"""
+    response = client.post("/auth/login", json={
+        "username": "testuser",
+        "password": "user123!"
+    })
+    return {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+@pytest.fixture
+def prediction_service():
+    """Service de prédiction avec le modèle factice"""
+    from services.prediction_service import PredictionService
+
+    service = PredictionService()
+    asyncio.run(service.load_model())
+    return service
+
+class TestBatchedInference:
+    """Tests du chemin d'inférence groupé"""
+
+    def test_single_model_call_per_batch(self, prediction_service):
+        """Un seul appel au modèle, une image invalide n'interrompt pas le lot"""
+        calls = []
+        predict = prediction_service.model.predict
+
+        def counting_predict(x, verbose=0):
+            calls.append(len(x))
+            return predict(x, verbose=verbose)
+
+        prediction_service.model.predict = counting_predict
+        images = [(make_image(), "a.jpg"), (b"not an image", "b.jpg"), (make_image(), "c.jpg")]
+        results = asyncio.run(prediction_service.predict_images(images, user_id=2))
+
+        assert calls == [2]
+        assert [r["filename"] for r in results] == ["a.jpg", "b.jpg", "c.jpg"]
+        assert [r["status"].value for r in results] == ["success", "error", "success"]
+        assert results[0]["prediction"]["category"] == "Playstation"
+
+class TestJobs:
+    """Tests de l'API de jobs asynchrones"""
+
+    def _wait_for(self, client, headers, job_id, timeout=10.0):
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            job = client.get(f"/jobs/{job_id}", headers=headers).json()
+            if job["status"] in ("completed", "failed"):
+                return job
+            time.sleep(0.05)
+        raise AssertionError(f"Job {job_id} non terminé")
+
+    def test_job_with_images_and_zip(self, client, auth_headers):
+        """Images et archive zip traitées, résultats en NDJSON"""
+        archive = io.BytesIO()
+        with zipfile.ZipFile(archive, "w") as zf:
+            zf.writestr("photos/one.jpg", make_image())
+            zf.writestr("photos/two.png", make_image())
+            zf.writestr("photos/notes.txt", "ignoré")
+        archive.seek(0)
+
+        files = [
+            ("files", ("a.jpg", io.BytesIO(make_image()), "image/jpeg")),
+            ("files", ("broken.jpg", io.BytesIO(b"not an image"), "image/jpeg")),
+            ("files", ("lot.zip", archive, "application/zip")),
+        ]
+        response = client.post("/jobs", headers=auth_headers, files=files)
+        assert response.status_code == 202
+        job = response.json()
+        assert job["total"] == 4
+        assert job["results_url"] == f"/jobs/{job['id']}/results"
+
+        job = self._wait_for(client, auth_headers, job["id"])
+        assert job["status"] == "completed"
+        assert job["processed"] == 4
+        assert job["failed"] == 1
+        assert job["progress"] == 1.0
+
+        response = client.get(job["results_url"], headers=auth_headers)
+        assert response.headers["content-type"].startswith("application/x-ndjson")
+        lines = [json.loads(line) for line in response.text.splitlines()]
+        assert [line["filename"] for line in lines] == ["a.jpg", "broken.jpg", "one.jpg", "two.png"]
+        assert lines[1]["status"] == "error"
+
+    def test_unknown_job_and_empty_upload(self, client, auth_headers):
+        """Job inconnu : 404 ; envoi sans image : 400"""
+        assert client.get("/jobs/inconnu", headers=auth_headers).status_code == 404
+
+        archive = io.BytesIO()
+        with zipfile.ZipFile(archive, "w") as zf:
+            zf.writestr("notes.txt", "aucune image")
+        archive.seek(0)
+
+        response = client.post("/jobs", headers=auth_headers, files={"files": ("lot.zip", archive, "application/zip")})
+        assert response.status_code == 400
+
+    def test_unfinished_job_is_resumed(self, client, jobs_dir, prediction_service):
+        """Un job interrompu reprend après la dernière ligne complète"""
+        import orjson
+        from core.database import get_db_context, JobCRUD
+        from core.serialization import prediction_payload
+        from services.job_service import JobService, RESULTS_FILE
+
+        async def scenario():
+            # Premier processus : job créé mais arrêté après une image et demie
+            service = JobService(prediction_service, jobs_dir=str(jobs_dir), batch_size=2)
+            job = await service.create_job(2, [(f"{i}.jpg", io.BytesIO(make_image())) for i in range(3)])
+            first = await prediction_service.predict_images([(make_image(), "0.jpg")], 2)
+            (jobs_dir / job["id"] / RESULTS_FILE).write_bytes(
+                orjson.dumps(prediction_payload(first[0])) + b"\n" + b'{"filename": "1.j'
+            )
+            with get_db_context() as db:
+                JobCRUD.update_job(db, job["id"], status="running", processed=1)
+
+            # Redémarrage
+            restarted = JobService(prediction_service, jobs_dir=str(jobs_dir), batch_size=2)
+            await restarted.start()
+            await restarted._queue.join()
+            await restarted.stop()
+            return job["id"]
+
+        job_id = asyncio.run(scenario())
+
+        lines = (jobs_dir / job_id / RESULTS_FILE).read_bytes().splitlines()
+        assert [json.loads(line)["filename"] for line in lines] == ["0.jpg", "1.jpg", "2.jpg"]
+        with get_db_context() as db:
+            job = JobCRUD.get_job(db, job_id)
+            assert (job.status, job.processed) == ("completed", 3)
+
+class TestJobClaims:
+    """Tests de la prise en charge des jobs par plusieurs processus"""
+
+    def test_two_services_process_each_image_once(self, jobs_dir, prediction_service):
+        """Deux services sur la même base : chaque image est prédite une seule fois"""
+        from collections import Counter
+        from core.database import get_db_context, JobCRUD
+        from services.job_service import JobService, RESULTS_FILE
+
+        predicted = Counter()
+        predict_images = prediction_service.predict_images
+
+        async def counting_predict_images(images, user_id, timer=None):
+            predicted.update(filename for _, filename in images)
+            await asyncio.sleep(0.01)  # laisse l'autre service tenter sa chance
+            return await predict_images(images, user_id, timer)
+
+        prediction_service.predict_images = counting_predict_images
+
+        async def scenario():
+            # Jobs créés sans worker : en attente pour les deux services
+            creator = JobService(prediction_service, jobs_dir=str(jobs_dir), batch_size=2)
+            jobs = [
+                await creator.create_job(2, [(f"{j}-{i}.jpg", io.BytesIO(make_image())) for i in range(5)])
+                for j in range(3)
+            ]
+
+            first = JobService(prediction_service, jobs_dir=str(jobs_dir), batch_size=2, workers=2)
+            second = JobService(prediction_service, jobs_dir=str(jobs_dir), batch_size=2, workers=2)
+            await asyncio.gather(first.start(), second.start())
+            await asyncio.gather(first._queue.join(), second._queue.join())
+            await asyncio.gather(first.stop(), second.stop())
+            return [job["id"] for job in jobs]
+
+        job_ids = asyncio.run(scenario())
+
+        assert len(predicted) == 15
+        assert set(predicted.values()) == {1}
+        for job_id in job_ids:
+            lines = (jobs_dir / job_id / RESULTS_FILE).read_bytes().splitlines()
+            assert len(lines) == 5
+            with get_db_context() as db:
+                job = JobCRUD.get_job(db, job_id)
+                assert (job.status, job.processed, job.failed) == ("completed", 5, 0)
+
+    def test_expired_lease_is_taken_over(self, jobs_dir, prediction_service):
+        """Job d'un processus arrêté brutalement : repris après expiration du bail"""
+        from datetime import datetime, timedelta
+        from core.database import get_db_context, JobCRUD
+        from services.job_service import JobService
+
+        async def scenario():
+            service = JobService(prediction_service, jobs_dir=str(jobs_dir))
+            job = await service.create_job(2, [("a.jpg", io.BytesIO(make_image()))])
+            with get_db_context() as db:
+                assert JobCRUD.claim_job(db, job["id"], "disparu", 60)
+                # Bail en cours : personne d'autre ne prend le job
+                assert not JobCRUD.claim_job(db, job["id"], service.owner, 60)
+                JobCRUD.update_job(db, job["id"], lease_expires_at=datetime.utcnow() - timedelta(seconds=1))
+
+            await service.start()
+            await service._queue.join()
+            await service.stop()
+            return job["id"]
+
+        job_id = asyncio.run(scenario())
+        with get_db_context() as db:
+            job = JobCRUD.get_job(db, job_id)
+            assert (job.status, job.processed) == ("completed", 1)
+            assert job.owner != "disparu"
@@ -0,0 +1,159 @@
+import pytest
+import io
+import asyncio
+import time
+from fastapi.testclient import TestClient
+from PIL import Image
+import numpy as np
+
+from main import app
+
+client = TestClient(app)
+
+def make_image() -> bytes:
+    """Image JPEG aléatoire"""
+    img = Image.fromarray(np.random.randint(0, 255, (150, 150, 3), dtype=np.uint8))
+    img_bytes = io.BytesIO()
+    img.save(img_bytes, format='JPEG')
+    return img_bytes.getvalue()
+
+@pytest.fixture
+def prediction_service():
+    """Service de prédiction avec le modèle factice"""
+    from services.prediction_service import PredictionService
+
+    service = PredictionService()
+    asyncio.run(service.load_model())
+    return service
+
+class TestDrainMode:
+    """Tests du mode drainage"""
+
+    def test_admin_drain_rejects_new_work(self):
+        """Après /admin/drain : readiness à 503, nouvelles requêtes refusées, sondes servies"""
+        response = client.post("/auth/login", json={"username": "admin", "password": "admin123!"})
+        headers = {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+        response = client.post("/admin/drain", headers=headers)
+        assert response.status_code == 200
+        assert response.json()["draining"] is True
+
+        assert client.get("/readyz").status_code == 503
+        assert client.get("/livez").status_code == 200
+        response = client.get("/predict/history", headers=headers)
+        assert response.status_code == 503
+        assert response.headers["Retry-After"] == "1"
+
+    def test_in_flight_requests_are_counted(self):
+        """Une requête compte jusqu'à la fin de sa réponse"""
+        from starlette.responses import PlainTextResponse
+        from core.lifecycle import DrainController
+        from core.middleware import PipelineMiddleware, DrainStage
+
+        controller = DrainController()
+        seen = []
+
+        async def endpoint(scope, receive, send):
+            seen.append(controller.in_flight)
+            await PlainTextResponse("ok")(scope, receive, send)
+
+        pipeline = PipelineMiddleware(endpoint, [DrainStage(controller)])
+        scope = {"type": "http", "method": "GET", "path": "/predict/history", "headers": [], "query_string": b""}
+
+        async def receive():
+            return {"type": "http.request", "body": b"", "more_body": False}
+
+        async def send(message):
+            pass
+
+        async def scenario():
+            await pipeline(scope, receive, send)
+            controller.enter()  # requête encore en cours ailleurs
+            waiter = asyncio.ensure_future(controller.wait_idle(5))
+            await asyncio.sleep(0.1)
+            assert not waiter.done()
+            controller.leave()
+            return await waiter
+
+        assert asyncio.run(scenario()) is True
+        assert seen == [1]
+        assert controller.in_flight == 0
+
+    def test_cancelled_request_leaves_drain_count(self):
+        """Une requête annulée (client déconnecté) ne reste pas comptée en cours"""
+        from core.lifecycle import DrainController
+        from core.middleware import PipelineMiddleware, DrainStage
+
+        controller = DrainController()
+        started = asyncio.Event()
+
+        async def endpoint(scope, receive, send):
+            started.set()
+            await asyncio.sleep(60)
+
+        pipeline = PipelineMiddleware(endpoint, [DrainStage(controller)])
+        scope = {"type": "http", "method": "GET", "path": "/predict/history", "headers": [], "query_string": b""}
+
+        async def receive():
+            return {"type": "http.request", "body": b"", "more_body": False}
+
+        async def send(message):
+            pass
+
+        async def scenario():
+            request = asyncio.ensure_future(pipeline(scope, receive, send))
+            await started.wait()
+            assert controller.in_flight == 1
+            request.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await request
+            return await controller.wait_idle(1)
+
+        assert asyncio.run(scenario()) is True
+        assert controller.in_flight == 0
+
+class TestShutdownFlush:
+    """Tests du vidage des files à l'arrêt"""
+
+    def test_micro_batcher_flushes_pending_requests(self, prediction_service):
+        """Les images déjà soumises sont prédites avant l'arrêt"""
+        from services.micro_batcher import MicroBatcher
+
+        async def scenario():
+            batcher = MicroBatcher(prediction_service, max_batch_size=2, max_wait=0.05)
+            await batcher.start()
+            submissions = [asyncio.ensure_future(batcher.submit(make_image(), 2)) for _ in range(5)]
+            await asyncio.sleep(0)
+            await batcher.stop(timeout=5)
+            return await asyncio.gather(*submissions, return_exceptions=True)
+
+        results = asyncio.run(scenario())
+        assert [result["status"].value for result in results] == ["success"] * 5
+
+    def test_job_stops_between_batches(self, prediction_service, tmp_path):
+        """Le lot en cours est terminé et enregistré, le job est rendu pour être repris"""
+        from core.database import get_db_context, JobCRUD
+        from services.job_service import JobService, RESULTS_FILE
+
+        predict_images = prediction_service.predict_images
+
+        async def slow_predict_images(images, user_id, timer=None):
+            await asyncio.sleep(0.2)
+            return await predict_images(images, user_id, timer)
+
+        prediction_service.predict_images = slow_predict_images
+
+        async def scenario():
+            service = JobService(prediction_service, jobs_dir=str(tmp_path), batch_size=2)
+            await service.start()
+            job = await service.create_job(2, [(f"{i}.jpg", io.BytesIO(make_image())) for i in range(6)])
+            await asyncio.sleep(0.05)  # premier lot en cours
+            await service.stop(timeout=5)
+            return job["id"]
+
+        job_id = asyncio.run(scenario())
+        assert len((tmp_path / job_id / RESULTS_FILE).read_bytes().splitlines()) == 2
+        with get_db_context() as db:
+            job = JobCRUD.get_job(db, job_id)
+            assert (job.status, job.processed, job.owner) == ("pending", 2, None)
+            JobCRUD.update_job(db, job_id, status="failed")  # pas de reprise par les tests suivants
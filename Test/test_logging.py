@@ -0,0 +1,78 @@
+import pytest
+import json
+import logging
+import queue
+import sys
+
+from main import app
+
+class TestQueueLogging:
+    """Tests du logging non bloquant"""
+    
+    def test_root_logger_only_enqueues(self):
+        """Aucune écriture synchrone sur stdout depuis le logger racine"""
+        from core.logging_config import NonBlockingQueueHandler
+        
+        handlers = logging.getLogger().handlers
+        assert sum(isinstance(h, NonBlockingQueueHandler) for h in handlers) == 1
+        assert not [
+            h for h in handlers
+            if isinstance(h, logging.StreamHandler) and getattr(h, "stream", None) is sys.stdout
+        ]
+    
+    def test_full_queue_drops_instead_of_blocking(self):
+        """Une file pleine abandonne l'enregistrement et le compte"""
+        from core.logging_config import NonBlockingQueueHandler
+        
+        handler = NonBlockingQueueHandler(queue.Queue(maxsize=1))
+        record = logging.LogRecord("test", logging.INFO, __file__, 1, "message %s", ("a",), None)
+        handler.handle(record)
+        handler.handle(record)
+        
+        assert handler.queue.qsize() == 1
+        assert handler.dropped == 1
+        assert handler.queue.get_nowait().getMessage() == "message a"
+
+class TestStructuredLogger:
+    """Tests des événements structurés"""
+    
+    def _capture(self, structured_logger):
+        records = []
+        handler = logging.Handler()
+        handler.emit = records.append
+        structured_logger.logger.addHandler(handler)
+        structured_logger.logger.setLevel(logging.INFO)
+        return records, handler
+    
+    def test_events_are_json_structured(self):
+        """Les champs de l'événement apparaissent dans la ligne JSON"""
+        from core.logging_config import StructuredLogger, JsonFormatter
+        
+        structured = StructuredLogger("test.structured", sample_rates={})
+        records, handler = self._capture(structured)
+        try:
+            structured.log_prediction(user_id=7, category="Xbox", confidence=0.9, processing_time=0.01)
+        finally:
+            structured.logger.removeHandler(handler)
+        
+        entry = json.loads(JsonFormatter().format(records[0]))
+        assert entry["event"] == "prediction"
+        assert entry["user_id"] == 7
+        assert entry["category"] == "Xbox"
+        assert entry["level"] == "INFO"
+        assert "PREDICTION" in entry["message"]
+    
+    def test_info_events_are_sampled(self):
+        """Les événements INFO à fort volume sont échantillonnés, pas les erreurs"""
+        from core.logging_config import StructuredLogger
+        
+        structured = StructuredLogger("test.sampled", sample_rates={"prediction": 0.0, "error": 0.0})
+        records, handler = self._capture(structured)
+        try:
+            for _ in range(100):
+                structured.log_prediction(user_id=1, category="PC Gaming", confidence=0.5, processing_time=0.01)
+            structured.log_error("TEST", "erreur conservée")
+        finally:
+            structured.logger.removeHandler(handler)
+        
+        assert [record.event for record in records] == ["error"]
@@ -0,0 +1,56 @@
+import pytest
+import asyncio
+import logging
+import time
+
+from core.loop_monitor import EventLoopMonitor
+from core.metrics import metrics
+
+def blocking_callback():
+    """Appel synchrone qui bloque la boucle d'événements"""
+    time.sleep(0.3)
+
+async def run_with_block(monitor: EventLoopMonitor):
+    await monitor.start()
+    await asyncio.sleep(0.1)
+    blocking_callback()
+    await asyncio.sleep(0.2)
+    await monitor.stop()
+
+class TestEventLoopMonitor:
+    """Tests de la mesure du retard de la boucle d'événements"""
+
+    def test_blocking_call_is_recorded(self):
+        """Un appel bloquant de 300 ms est compté comme blocage et exporté"""
+        monitor = EventLoopMonitor(interval=0.05, threshold=0.1, report_stacks=False)
+        asyncio.run(run_with_block(monitor))
+
+        assert monitor.blocked >= 1
+        assert monitor.max_lag >= 0.2
+        assert monitor.stats()["blocked"] == monitor.blocked
+
+        exposition = metrics.render().decode()
+        assert "event_loop_lag_seconds_bucket" in exposition
+        assert "event_loop_blocked_total" in exposition
+
+    def test_idle_loop_is_not_blocked(self):
+        """Boucle libre : aucun blocage"""
+        monitor = EventLoopMonitor(interval=0.02, threshold=0.1, report_stacks=False)
+
+        async def idle():
+            await monitor.start()
+            await asyncio.sleep(0.2)
+            await monitor.stop()
+
+        asyncio.run(idle())
+        assert monitor.blocked == 0
+
+    def test_debug_reports_blocking_stack(self, caplog):
+        """En mode DEBUG, la pile journalisée désigne l'appel bloquant"""
+        monitor = EventLoopMonitor(interval=0.05, threshold=0.1, report_stacks=True)
+        with caplog.at_level(logging.WARNING, logger="core.loop_monitor"):
+            asyncio.run(run_with_block(monitor))
+
+        reports = [record.getMessage() for record in caplog.records if "pile" in record.getMessage()]
+        assert len(reports) == 1
+        assert "blocking_callback" in reports[0]
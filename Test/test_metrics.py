@@ -0,0 +1,148 @@
+import pytest
+import io
+import threading
+from fastapi.testclient import TestClient
+from PIL import Image
+import numpy as np
+
+from main import app
+
+client = TestClient(app)
+
+@pytest.fixture
+def auth_token():
+    """Fixture pour obtenir un token d'authentification"""
+    response = client.post("/auth/login", json={
+        "username": "testuser",
+        "password": "user123!"
+    })
+    return response.json()["access_token"]
+
+@pytest.fixture
+def test_image():
+    """Fixture pour créer une image de test"""
+    img = Image.fromarray(np.random.randint(0, 255, (150, 150, 3), dtype=np.uint8))
+    img_bytes = io.BytesIO()
+    img.save(img_bytes, format='JPEG')
+    img_bytes.seek(0)
+    return img_bytes
+
+class TestMetricsRegistry:
+    """Tests du registre de métriques sans verrou"""
+
+    def test_histogram_buckets_are_cumulative(self):
+        """Exposition Prometheus d'un histogramme"""
+        from core.metrics import MetricsRegistry
+
+        registry = MetricsRegistry(process_metrics=False)
+        histogram = registry.histogram("latency_seconds", "Latence", ("route",), buckets=(0.1, 1.0))
+        for value in (0.05, 0.1, 0.5, 2.0):
+            histogram.labels("/ping").observe(value)
+
+        output = registry.render().decode()
+        assert 'latency_seconds_bucket{le="0.1",route="/ping"} 2.0' in output
+        assert 'latency_seconds_bucket{le="1.0",route="/ping"} 3.0' in output
+        assert 'latency_seconds_bucket{le="+Inf",route="/ping"} 4.0' in output
+        assert 'latency_seconds_count{route="/ping"} 4.0' in output
+
+    def test_thread_shards_are_summed(self):
+        """Chaque thread écrit dans son shard, la collecte additionne"""
+        from core.metrics import MetricsRegistry
+
+        registry = MetricsRegistry(process_metrics=False)
+        counter = registry.counter("events_total", "Événements")
+
+        def worker():
+            for _ in range(1000):
+                counter.inc()
+
+        threads = [threading.Thread(target=worker) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert counter.labels().value == 4000
+
+    def test_cache_stats_are_read_at_collection(self):
+        """Taux de succès des caches lus par callback"""
+        from core.metrics import MetricsRegistry
+
+        registry = MetricsRegistry(process_metrics=False)
+        registry.register_cache("users", lambda: {"hits": 3, "misses": 1, "hit_ratio": 0.75, "size": 2})
+
+        output = registry.render().decode()
+        assert 'cache_hit_ratio{cache="users"} 0.75' in output
+        assert 'cache_hits_total{cache="users"} 3.0' in output
+
+class TestMetricsEndpoint:
+    """Tests de l'endpoint Prometheus"""
+
+    def test_metrics_endpoint_exposes_route_templates(self):
+        """Latence par route déclarée et statut"""
+        client.get("/admin/users/123")
+
+        response = client.get("/metrics")
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("text/plain")
+        assert 'route="/admin/users/{user_id}"' in response.text
+        assert 'route="/admin/users/123"' not in response.text
+        assert "http_request_duration_seconds_bucket" in response.text
+        assert "model_info" in response.text
+
+    def test_prediction_stages_are_recorded(self, auth_token, test_image):
+        """Histogrammes des étapes d'inférence après une prédiction"""
+        headers = {"Authorization": f"Bearer {auth_token}"}
+        files = {"file": ("test.jpg", test_image, "image/jpeg")}
+        assert client.post("/predict/image", headers=headers, files=files).status_code == 200
+
+        text = client.get("/metrics").text
+        for stage in ("read", "decode", "resize", "normalize", "model", "postprocess", "history"):
+            assert f'prediction_stage_duration_seconds_count{{stage="{stage}"}}' in text
+        assert 'predictions_total{status="success"}' in text
+        assert "prediction_batch_size_bucket" in text
+
+    def test_read_stage_covers_body_upload(self):
+        """L'étape read commence à l'arrivée de la requête, avant la réception du corps"""
+        import asyncio
+        import json
+        from fastapi import FastAPI, File, Request, UploadFile
+        from core.metrics import StageTimer
+        from core.middleware import PipelineMiddleware
+
+        upload_app = FastAPI()
+
+        @upload_app.post("/upload")
+        async def upload(request: Request, file: UploadFile = File(...)):
+            timer = StageTimer.from_scope(request.scope)
+            timer.mark("read")
+            return timer.as_milliseconds()
+
+        boundary = "limite"
+        body = (
+            f"--{boundary}\r\nContent-Disposition: form-data; name=\"file\"; filename=\"a.bin\"\r\n"
+            f"Content-Type: application/octet-stream\r\n\r\n{'x' * 1024}\r\n--{boundary}--\r\n"
+        ).encode()
+        chunks = [body[:100], body[100:]]
+        scope = {
+            "type": "http", "http_version": "1.1", "method": "POST", "path": "/upload",
+            "raw_path": b"/upload", "root_path": "", "scheme": "http", "query_string": b"",
+            "client": ("127.0.0.1", 1234), "server": ("testserver", 80),
+            "headers": [(b"content-type", f"multipart/form-data; boundary={boundary}".encode())]
+        }
+        sent = []
+
+        async def receive():
+            # Client lent : 50 ms par morceau du corps
+            await asyncio.sleep(0.05)
+            chunk = chunks.pop(0)
+            return {"type": "http.request", "body": chunk, "more_body": bool(chunks)}
+
+        async def send(message):
+            sent.append(message)
+
+        asyncio.run(PipelineMiddleware(upload_app, stages=[])(scope, receive, send))
+
+        assert sent[0]["status"] == 200
+        timings = json.loads(sent[1]["body"])
+        assert timings["read"] >= 90
@@ -31,6 +31,13 @@ def test_image():
     
     return img_bytes
 
+def make_image() -> bytes:
+    """Image JPEG aléatoire en bytes"""
+    img = Image.fromarray(np.random.randint(0, 255, (150, 150, 3), dtype=np.uint8))
+    img_bytes = io.BytesIO()
+    img.save(img_bytes, format='JPEG')
+    return img_bytes.getvalue()
+
 class TestPrediction:
     """Tests de prédiction d'images"""    
     
@@ -77,4 +84,143 @@ class TestPrediction:
         assert response.status_code == 200
         data = response.json()
         assert "history" in data
-        assert isinstance(data["history"], list)
\ No newline at end of file
+        assert isinstance(data["history"], list)
+    
+    def test_predict_image_server_timing(self, auth_token, test_image):
+        """Test du header Server-Timing et du champ timings optionnel"""
+        headers = {"Authorization": f"Bearer {auth_token}"}
+        files = {"file": ("test.jpg", test_image, "image/jpeg")}
+        
+        response = client.post("/predict/image?timings=true", headers=headers, files=files)
+        assert response.status_code == 200
+        
+        server_timing = response.headers["Server-Timing"]
+        for stage in ("read", "decode", "resize", "normalize", "model", "history"):
+            assert f"{stage};dur=" in server_timing
+        
+        timings = response.json()["timings"]
+        assert set(timings) >= {"read", "decode", "resize", "normalize", "model", "postprocess"}
+        assert all(duration >= 0 for duration in timings.values())
+    
+    def test_predict_image_timings_are_opt_in(self, auth_token, test_image):
+        """Le champ timings n'est renvoyé que sur demande"""
+        headers = {"Authorization": f"Bearer {auth_token}"}
+        files = {"file": ("test.jpg", test_image, "image/jpeg")}
+        
+        response = client.post("/predict/image", headers=headers, files=files)
+        assert response.status_code == 200
+        assert response.json()["timings"] is None
+        assert "Server-Timing" in response.headers
+    
+    def test_batch_reports_invalid_images(self, auth_token, test_image):
+        """Une image illisible dans un lot donne une entrée en erreur, pas une 500"""
+        headers = {"Authorization": f"Bearer {auth_token}"}
+        files = [
+            ("files", ("ok.jpg", test_image, "image/jpeg")),
+            ("files", ("bad.jpg", io.BytesIO(b"not an image"), "image/jpeg"))
+        ]
+        
+        response = client.post("/predict/batch", headers=headers, files=files)
+        assert response.status_code == 200
+        ok, bad = response.json()
+        assert ok["status"] == "success"
+        assert bad["status"] == "error"
+        assert bad["prediction"] is None
+        assert bad["error_message"]
+
+    def test_batch_streams_ndjson(self, auth_token):
+        """Un résultat par ligne NDJSON, dans l'ordre des fichiers"""
+        import json
+        headers = {"Authorization": f"Bearer {auth_token}", "Accept": "application/x-ndjson"}
+        files = [("files", (f"{i}.jpg", make_image(), "image/jpeg")) for i in range(3)]
+
+        response = client.post("/predict/batch", headers=headers, files=files)
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("application/x-ndjson")
+        lines = [json.loads(line) for line in response.text.splitlines()]
+        assert [line["filename"] for line in lines] == ["0.jpg", "1.jpg", "2.jpg"]
+        assert all(line["status"] == "success" for line in lines)
+
+    def test_batch_streams_server_sent_events(self, auth_token):
+        """Un événement `prediction` par image, puis `done`"""
+        headers = {"Authorization": f"Bearer {auth_token}", "Accept": "text/event-stream"}
+        files = [("files", (f"{i}.jpg", make_image(), "image/jpeg")) for i in range(2)]
+
+        response = client.post("/predict/batch", headers=headers, files=files)
+        assert response.headers["content-type"].startswith("text/event-stream")
+        events = [block.splitlines() for block in response.text.strip().split("\n\n")]
+        names = [line for event in events for line in event if line.startswith("event: ")]
+        assert names == ["event: prediction", "event: prediction", "event: done"]
+        assert events[-1][-1] == 'data: {"count": 2}'
+
+    def test_binary_batch_length_prefixed(self, auth_token):
+        """Corps à préfixes de longueur : un résultat par image, dans l'ordre"""
+        from core.binary_upload import encode_length_prefixed
+        headers = {"Authorization": f"Bearer {auth_token}", "Content-Type": "application/octet-stream"}
+        body = encode_length_prefixed([make_image(), b"not an image", make_image()])
+
+        response = client.post("/predict/batch/binary", headers=headers, content=body)
+        assert response.status_code == 200
+        results = response.json()
+        assert [r["filename"] for r in results] == ["image-0", "image-1", "image-2"]
+        assert [r["status"] for r in results] == ["success", "error", "success"]
+
+    def test_binary_batch_msgpack(self, auth_token):
+        """Tableau msgpack de binaires (bin 8 et bin 16)"""
+        images = [b"\x00" * 10, make_image()]
+        body = b"\x92" + b"\xc4\x0a" + images[0] + b"\xc5" + len(images[1]).to_bytes(2, "big") + images[1]
+        headers = {"Authorization": f"Bearer {auth_token}", "Content-Type": "application/msgpack"}
+
+        response = client.post("/predict/batch/binary", headers=headers, content=body)
+        assert response.status_code == 200
+        assert [r["status"] for r in response.json()] == ["error", "success"]
+
+    def test_binary_batch_rejects_malformed_body(self, auth_token):
+        """Image tronquée, Content-Type inconnu ou trop d'images : 400"""
+        from core.binary_upload import encode_length_prefixed
+        headers = {"Authorization": f"Bearer {auth_token}", "Content-Type": "application/octet-stream"}
+
+        truncated = encode_length_prefixed([make_image()])[:-10]
+        assert client.post("/predict/batch/binary", headers=headers, content=truncated).status_code == 400
+
+        too_many = encode_length_prefixed([b"x"] * 11)
+        assert client.post("/predict/batch/binary", headers=headers, content=too_many).status_code == 400
+
+        headers["Content-Type"] = "image/jpeg"
+        assert client.post("/predict/batch/binary", headers=headers, content=make_image()).status_code == 400
+
+    def test_first_micro_batch_has_one_image(self):
+        """Premier résultat après une seule inférence, puis lots complets"""
+        import asyncio
+        from services.prediction_service import PredictionService
+
+        async def scenario():
+            service = PredictionService()
+            await service.load_model()
+            images = [(make_image(), f"{i}.jpg") for i in range(5)]
+            return [len(results) async for results, _ in service.predict_stream(images, 2, batch_size=3)]
+
+        assert asyncio.run(scenario()) == [1, 3, 1]
+
+class TestSerialization:
+    """Tests de la sérialisation rapide des prédictions"""
+    
+    def test_payload_matches_response_model(self):
+        """Même JSON que la validation par PredictionResponse"""
+        import json
+        import orjson
+        from datetime import datetime
+        from core.models import PredictionResponse, PredictionStatus
+        from core.serialization import prediction_payload
+        
+        result = {
+            "filename": "test.jpg",
+            "prediction": {"category": "Xbox", "confidence": 0.9, "probabilities": {"Xbox": 0.9, "PC Gaming": 0.1}},
+            "processing_time": 0.012,
+            "timestamp": datetime(2024, 5, 1, 12, 30, 15, 123456),
+            "user_id": 2,
+            "status": PredictionStatus.SUCCESS
+        }
+        
+        expected = PredictionResponse.model_validate(result).model_dump(mode="json")
+        assert json.loads(orjson.dumps(prediction_payload(result))) == expected
@@ -0,0 +1,100 @@
+import pytest
+import asyncio
+import re
+import threading
+import time
+from fastapi.testclient import TestClient
+
+from main import app
+from core.profiler import profiler, ProfilerBusy
+
+@pytest.fixture(scope="module")
+def client():
+    """Client de test avec le cycle de vie complet"""
+    with TestClient(app) as c:
+        yield c
+
+def login(client: TestClient, username: str, password: str) -> dict:
+    response = client.post("/auth/login", json={"username": username, "password": password})
+    return {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+def busy_inference_worker(stop: threading.Event, allocations: list):
+    """Thread nommé comme un worker d'exécuteur, qui calcule et alloue"""
+    while not stop.is_set():
+        allocations.append(bytearray(4096))
+        sum(range(20000))
+
+@pytest.fixture
+def busy_thread():
+    stop = threading.Event()
+    allocations = []
+    thread = threading.Thread(target=busy_inference_worker, args=(stop, allocations), name="asyncio_7")
+    thread.start()
+    yield thread
+    stop.set()
+    thread.join()
+
+class TestProfiler:
+    """Tests du profilage à la demande"""
+
+    def test_profile_samples_all_threads(self, client, busy_thread):
+        """Les piles repliées couvrent les threads hors boucle d'événements"""
+        response = client.post("/admin/profile?seconds=0.3", headers=login(client, "admin", "admin123!"))
+        assert response.status_code == 200
+
+        data = response.json()
+        assert data["samples"] > 0
+        assert data["threads"]["asyncio_7"] > 0
+        assert "memory" not in data
+        assert any(
+            line.startswith("asyncio_7;") and "busy_inference_worker" in line
+            for line in data["collapsed"].splitlines()
+        )
+
+    def test_profile_collapsed_text(self, client, busy_thread):
+        """Accept: text/plain : format replié brut, une `pile nombre` par ligne"""
+        headers = {**login(client, "admin", "admin123!"), "Accept": "text/plain"}
+        response = client.post("/admin/profile?seconds=0.2&interval_ms=5", headers=headers)
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("text/plain")
+
+        lines = response.text.splitlines()
+        assert lines
+        assert all(re.fullmatch(r"\S.*;.* \d+", line) for line in lines)
+
+    def test_profile_tracemalloc_diff(self, client, busy_thread):
+        """tracemalloc=true : lignes dont les allocations ont grossi"""
+        response = client.post("/admin/profile?seconds=0.3&tracemalloc=true&top=5", headers=login(client, "admin", "admin123!"))
+        assert response.status_code == 200
+
+        memory = response.json()["memory"]
+        assert 0 < len(memory) <= 5
+        assert any("test_profiler.py" in entry["location"] and entry["size_diff_kb"] > 0 for entry in memory)
+
+    def test_frame_label_without_qualname(self):
+        """Python 3.10 : les objets code n'ont pas co_qualname"""
+        from types import SimpleNamespace
+        from core.profiler import frame_label
+
+        code = SimpleNamespace(co_name="predict", co_filename="/app/services/prediction_service.py", co_firstlineno=42)
+        assert frame_label(code) == "predict (prediction_service.py:42)"
+
+    def test_profile_requires_admin(self, client):
+        response = client.post("/admin/profile?seconds=0.1", headers=login(client, "testuser", "user123!"))
+        assert response.status_code == 403
+
+    def test_profile_duration_bounds(self, client):
+        headers = login(client, "admin", "admin123!")
+        assert client.post("/admin/profile?seconds=0", headers=headers).status_code == 400
+        assert client.post("/admin/profile?seconds=3600", headers=headers).status_code == 400
+
+    def test_single_profile_at_a_time(self):
+        """Un deuxième profilage simultané est refusé"""
+        async def both():
+            first = asyncio.create_task(profiler.profile(0.3))
+            await asyncio.sleep(0.05)
+            with pytest.raises(ProfilerBusy):
+                await profiler.profile(0.1)
+            return await first
+
+        assert asyncio.run(both())["samples"] > 0
@@ -20,4 +20,220 @@ class TestRateLimit:
         
         assert "X-RateLimit-Limit" in response.headers
         assert "X-RateLimit-Remaining" in response.headers
-        assert "X-RateLimit-Reset" in response.headers
\ No newline at end of file
+        assert "X-RateLimit-Reset" in response.headers
+
+class FakeClock:
+    """Horloge monotone contrôlable (nanosecondes)"""
+    
+    def __init__(self):
+        self.now = 1_000_000_000
+    
+    def __call__(self):
+        return self.now
+    
+    def advance(self, seconds):
+        self.now += int(seconds * 1_000_000_000)
+
+
+class TestGCRARateLimiter:
+    """Tests du limiteur GCRA"""
+    
+    def test_allows_burst_up_to_limit(self):
+        from core.ratelimit import GCRARateLimiter
+        
+        limiter = GCRARateLimiter(limit=5, window_seconds=60, clock=FakeClock())
+        results = [limiter.hit("client") for _ in range(6)]
+        
+        assert [r.allowed for r in results] == [True] * 5 + [False]
+        assert [r.remaining for r in results[:5]] == [4, 3, 2, 1, 0]
+        assert results[-1].retry_after == pytest.approx(12.0)
+    
+    def test_quota_refills_over_time(self):
+        from core.ratelimit import GCRARateLimiter
+        
+        clock = FakeClock()
+        limiter = GCRARateLimiter(limit=5, window_seconds=60, clock=clock)
+        for _ in range(5):
+            limiter.hit("client")
+        
+        clock.advance(12)
+        assert limiter.hit("client").allowed
+        assert not limiter.hit("client").allowed
+    
+    def test_idle_clients_are_evicted(self):
+        from core.ratelimit import GCRARateLimiter
+        
+        clock = FakeClock()
+        limiter = GCRARateLimiter(limit=5, window_seconds=60, clock=clock)
+        limiter.hit("idle")
+        
+        clock.advance(61)
+        limiter.hit("active")
+        assert len(limiter) == 1
+    
+    def test_tracked_clients_are_bounded(self):
+        from core.ratelimit import GCRARateLimiter
+        
+        limiter = GCRARateLimiter(limit=5, window_seconds=60, max_clients=100, clock=FakeClock())
+        for i in range(1000):
+            limiter.hit(f"client-{i}")
+        
+        assert len(limiter) == 100
+
+
+class BrokenRedis:
+    """Redis injoignable"""
+    
+    async def script_load(self, script):
+        raise ConnectionError("Connection refused")
+
+
+class TestRedisRateLimitStore:
+    """Tests du store Redis (Redis de substitution local : fakeredis)"""
+    
+    def make_store(self, redis_client, limit=3):
+        from core.ratelimit import RedisRateLimitStore, MemoryRateLimitStore
+        
+        return RedisRateLimitStore(
+            redis_client, limit=limit, window_seconds=60,
+            fallback=MemoryRateLimitStore(limit, 60)
+        )
+    
+    def test_limit_shared_between_workers(self):
+        """Deux workers partageant Redis appliquent une seule limite"""
+        import asyncio
+        fakeredis = pytest.importorskip("fakeredis")
+        
+        async def scenario():
+            server = fakeredis.FakeServer()
+            worker_a = self.make_store(fakeredis.FakeAsyncRedis(server=server))
+            worker_b = self.make_store(fakeredis.FakeAsyncRedis(server=server))
+            
+            results = [await worker_a.hit("client"), await worker_b.hit("client"), await worker_a.hit("client")]
+            results.append(await worker_b.hit("client"))
+            return results
+        
+        results = asyncio.run(scenario())
+        assert [r.allowed for r in results] == [True, True, True, False]
+        assert [r.remaining for r in results[:3]] == [2, 1, 0]
+        assert results[-1].retry_after > 0
+    
+    def test_anonymous_key_stable_across_processes(self):
+        """La clé d'un client anonyme ne dépend pas du sel de hash() du processus"""
+        import os
+        import subprocess
+        import sys
+        
+        code = (
+            "from core.middleware import RateLimitStage, RequestContext\n"
+            "scope = {'type': 'http', 'path': '/', 'method': 'GET', 'client': ('10.0.0.1', 1234),"
+            " 'headers': [(b'user-agent', b'curl/8.0')]}\n"
+            "print(RateLimitStage._get_client_identifier(None, RequestContext(scope)))"
+        )
+        
+        def identifier(seed):
+            env = {**os.environ, "PYTHONHASHSEED": seed}
+            return subprocess.run(
+                [sys.executable, "-c", code], env=env, capture_output=True, text=True, check=True
+            ).stdout.strip().splitlines()[-1]
+        
+        first, second = identifier("1"), identifier("2")
+        assert first.startswith("10.0.0.1:")
+        assert first == second
+    
+    def test_concurrent_hits_are_pipelined(self):
+        """Les décisions concurrentes partent dans un seul pipeline"""
+        import asyncio
+        fakeredis = pytest.importorskip("fakeredis")
+        
+        async def scenario():
+            redis_client = fakeredis.FakeAsyncRedis()
+            store = self.make_store(redis_client, limit=100)
+            pipelines = []
+            original = redis_client.pipeline
+            
+            def counting_pipeline(*args, **kwargs):
+                pipelines.append(1)
+                return original(*args, **kwargs)
+            
+            redis_client.pipeline = counting_pipeline
+            results = await asyncio.gather(*[store.hit(f"client-{i}") for i in range(20)])
+            return results, len(pipelines)
+        
+        results, pipeline_count = asyncio.run(scenario())
+        assert all(r.allowed for r in results)
+        assert pipeline_count == 1
+    
+    def test_falls_back_to_local_limit(self):
+        """Si Redis est injoignable, la limite locale s'applique"""
+        import asyncio
+        
+        async def scenario():
+            store = self.make_store(BrokenRedis(), limit=2)
+            return [await store.hit("client") for _ in range(3)], store.available
+        
+        results, available = asyncio.run(scenario())
+        assert [r.allowed for r in results] == [True, True, False]
+        assert available is False
+
+
+class TestWeightedRateLimit:
+    """Tests des coûts par route et des quotas par utilisateur"""
+    
+    def test_request_cost_by_route_and_size(self):
+        from core.config import settings
+        from core.ratelimit import request_cost
+        
+        unit = settings.RATE_LIMIT_COST_BYTES_UNIT
+        assert request_cost("/predict/history") == 1
+        assert request_cost("/predict/image") == settings.RATE_LIMIT_ROUTE_COSTS["/predict/image"]
+        assert request_cost("/predict/batch", 10 * unit) == settings.RATE_LIMIT_ROUTE_COSTS["/predict/batch"] + 10
+    
+    def test_authenticated_requests_use_role_quota(self):
+        """Avec un token, la limite est celle du rôle et non celle de l'IP"""
+        from core.config import settings
+        
+        token = client.post("/auth/login", json={
+            "username": "testuser",
+            "password": "user123!"
+        }).json()["access_token"]
+        
+        response = client.get("/predict/history", headers={"Authorization": f"Bearer {token}"})
+        assert response.headers["X-RateLimit-Limit"] == str(settings.RATE_LIMIT_ROLE_QUOTAS["user"])
+        assert response.headers["X-RateLimit-Cost"] == "1"
+        
+        anonymous = client.get("/predict/history")
+        assert anonymous.headers["X-RateLimit-Limit"] == str(settings.RATE_LIMIT_REQUESTS)
+    
+    def test_chunked_upload_is_charged_for_received_bytes(self, monkeypatch):
+        """Corps en chunked (sans Content-Length) : les octets reçus sont facturés"""
+        from fastapi import FastAPI, Request
+        from core.config import settings
+        from core.middleware import PipelineMiddleware, RateLimitStage
+        
+        monkeypatch.setattr(settings, "RATE_LIMIT_REQUESTS", 10)
+        monkeypatch.setattr(settings, "RATE_LIMIT_COST_BYTES_UNIT", 1024)
+        
+        upload_app = FastAPI()
+        
+        @upload_app.post("/upload")
+        async def upload(request: Request):
+            return {"size": len(await request.body())}
+        
+        upload_app.add_middleware(PipelineMiddleware, stages=[RateLimitStage()])
+        upload_client = TestClient(upload_app)
+        
+        def chunks(count):
+            for _ in range(count):
+                yield b"x" * 1024
+        
+        # 3 Ko : coût de base + 3 unités, facturées pendant la réception
+        response = upload_client.post("/upload", content=chunks(3))
+        assert response.status_code == 200
+        assert "content-length" not in response.request.headers
+        assert response.headers["X-RateLimit-Cost"] == "4"
+        
+        # 20 Ko en chunked : quota épuisé pendant l'envoi
+        response = upload_client.post("/upload", content=chunks(20))
+        assert response.status_code == 429
+        assert "Retry-After" in response.headers
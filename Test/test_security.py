@@ -1,4 +1,5 @@
 import pytest
+import asyncio
 import io
 from fastapi.testclient import TestClient
 from PIL import Image
@@ -31,4 +32,176 @@ class TestSecurity:
         assert response.status_code == 401
         
         response = client.get("/admin/stats")
-        assert response.status_code == 401
\ No newline at end of file
+        assert response.status_code == 401
+
+class TestPasswordHashExecutor:
+    """Tests du pool bcrypt borné"""
+    
+    def test_hash_runs_off_event_loop(self):
+        """Le hachage s'exécute dans un thread du pool dédié"""
+        import threading
+        from core.security import PasswordHashExecutor
+        
+        hasher = PasswordHashExecutor(max_workers=1, max_queue=4)
+        thread_name = asyncio.run(hasher.run(lambda: threading.current_thread().name))
+        
+        assert thread_name.startswith("bcrypt")
+        assert hasher.stats()["completed"] == 1
+        hasher.shutdown()
+    
+    def test_queue_full_rejects(self):
+        """Au-delà de la file d'attente, les appels sont refusés immédiatement"""
+        import threading
+        from core.security import PasswordHashExecutor, PasswordHashQueueFull
+        
+        hasher = PasswordHashExecutor(max_workers=1, max_queue=1)
+        release = threading.Event()
+        
+        async def scenario():
+            running = asyncio.ensure_future(hasher.run(release.wait))
+            await asyncio.sleep(0.05)
+            waiting = asyncio.ensure_future(hasher.run(release.wait))
+            await asyncio.sleep(0.05)
+            with pytest.raises(PasswordHashQueueFull):
+                await hasher.run(release.wait)
+            release.set()
+            await asyncio.gather(running, waiting)
+        
+        asyncio.run(scenario())
+        assert hasher.stats()["rejected"] == 1
+        hasher.shutdown()
+    
+    def test_cancelled_callers_leave_queue(self):
+        """Un appelant annulé avant le hachage libère sa place dans la file"""
+        import threading
+        from core.security import PasswordHashExecutor
+        
+        hasher = PasswordHashExecutor(max_workers=1, max_queue=2)
+        release = threading.Event()
+        
+        async def scenario():
+            running = asyncio.ensure_future(hasher.run(release.wait))
+            await asyncio.sleep(0.05)
+            waiting = [asyncio.ensure_future(hasher.run(release.wait)) for _ in range(2)]
+            await asyncio.sleep(0.05)
+            assert hasher.stats()["queued"] == 2
+            for task in waiting:
+                task.cancel()
+            await asyncio.gather(*waiting, return_exceptions=True)
+            release.set()
+            await running
+            return await hasher.run(lambda: "ok")
+        
+        assert asyncio.run(scenario()) == "ok"
+        stats = hasher.stats()
+        assert stats["queued"] == 0
+        assert stats["in_flight"] == 0
+        assert stats["completed"] == 2
+        hasher.shutdown()
+
+
+class TestVerifiedTokenCache:
+    """Tests du cache des tokens vérifiés"""
+    
+    def test_cached_token_skips_decode(self, monkeypatch):
+        """Un token déjà vérifié n'est pas redécodé"""
+        from core import security
+        
+        token = security.create_tokens({"sub": "cached", "user_id": 42, "role": "user"})["access_token"]
+        assert security.verify_token(token).user_id == 42
+        
+        def fail_decode(*args, **kwargs):
+            raise AssertionError("décodage JWT inattendu")
+        
+        monkeypatch.setattr(security.jwt, "decode", fail_decode)
+        assert security.verify_token(token).username == "cached"
+    
+    def test_entry_expires_with_token(self):
+        """L'entrée n'est plus servie après l'échéance du token"""
+        import time
+        from core.security import VerifiedTokenCache
+        
+        cache = VerifiedTokenCache(maxsize=10)
+        cache.put("expired", {"sub": "a", "exp": time.time() - 1})
+        cache.put("valid", {"sub": "b", "exp": time.time() + 60})
+        
+        assert cache.get("expired") is None
+        assert cache.get("valid")["sub"] == "b"
+    
+    def test_revocation_check_applies_to_cached_entries(self):
+        """Un token révoqué est refusé même s'il est en cache"""
+        import time
+        from core.security import VerifiedTokenCache
+        
+        cache = VerifiedTokenCache(maxsize=10)
+        revoked = set()
+        cache.add_revocation_check(lambda payload: payload["sub"] in revoked)
+        cache.put("token", {"sub": "a", "exp": time.time() + 60})
+        
+        assert cache.get("token") is not None
+        revoked.add("a")
+        assert cache.get("token") is None
+
+class TestMiddlewarePipeline:
+    """Tests du pipeline de middlewares ASGI"""
+    
+    @staticmethod
+    def _make_app(stages):
+        from fastapi import FastAPI
+        from fastapi.responses import StreamingResponse
+        from core.middleware import PipelineMiddleware
+        
+        test_app = FastAPI()
+        
+        @test_app.get("/ping")
+        async def ping():
+            return {"ok": True}
+        
+        @test_app.get("/stream")
+        async def stream():
+            async def chunks():
+                for i in range(3):
+                    yield f"{i}\n".encode()
+            return StreamingResponse(chunks(), media_type="text/plain")
+        
+        test_app.add_middleware(PipelineMiddleware, stages=stages)
+        return test_app
+    
+    def test_stages_share_a_single_pass(self):
+        """Headers de sécurité, temps de traitement et métriques en une couche"""
+        from core.middleware import SecurityHeadersStage, LoggingStage, MetricsStage, BASIC_SECURITY_HEADERS
+        from core.metrics import MetricsRegistry
+        
+        metrics = MetricsStage(MetricsRegistry(process_metrics=False))
+        test_client = TestClient(self._make_app([
+            SecurityHeadersStage(BASIC_SECURITY_HEADERS), LoggingStage(), metrics
+        ]))
+        
+        response = test_client.get("/ping")
+        assert response.status_code == 200
+        assert response.headers["X-Frame-Options"] == "DENY"
+        assert float(response.headers["X-Process-Time"]) >= 0
+        assert metrics.get_metrics()["requests_by_status"] == {200: 1}
+    
+    def test_early_response_skips_application(self):
+        """Une étape peut répondre sans appeler l'application"""
+        from core.middleware import SecurityHeadersStage, ValidationStage, MetricsStage
+        from core.metrics import MetricsRegistry
+        
+        metrics = MetricsStage(MetricsRegistry(process_metrics=False))
+        test_client = TestClient(self._make_app([SecurityHeadersStage(), ValidationStage(), metrics]))
+        
+        response = test_client.post("/predict/image", content=b"{}", headers={"content-type": "application/json"})
+        assert response.status_code == 400
+        assert "Content-Security-Policy" in response.headers
+        assert metrics.get_metrics()["requests_by_status"] == {400: 1}
+    
+    def test_streaming_response_passes_through(self):
+        """Les réponses en streaming ne sont pas mises en tampon"""
+        from core.middleware import SecurityHeadersStage
+        
+        test_client = TestClient(self._make_app([SecurityHeadersStage()]))
+        
+        response = test_client.get("/stream")
+        assert response.text == "0\n1\n2\n"
+        assert response.headers["X-Content-Type-Options"] == "nosniff"
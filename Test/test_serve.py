@@ -0,0 +1,79 @@
+import os
+import pytest
+
+class TestPreforkPlanning:
+    """Tests du dimensionnement du serveur préforké"""
+
+    def test_workers_and_threads_follow_cpus(self):
+        """Sans nombre imposé, un worker pour deux CPU, threads TensorFlow répartis"""
+        from serve import plan_workers
+
+        assert plan_workers(1) == (1, 1)
+        assert plan_workers(8) == (4, 2)
+        assert plan_workers(8, workers=2) == (2, 4)
+        assert plan_workers(2, workers=4) == (4, 1)
+
+    def test_single_worker_by_default(self):
+        """Un seul worker par défaut : l'état en mémoire n'est pas partagé"""
+        from core.config import settings
+        from serve import plan_workers
+
+        assert plan_workers(8, settings.WEB_WORKERS) == (1, 8)
+
+    def test_available_cpus_and_memory_usage(self):
+        """CPU utilisables et mémoire lue dans /proc"""
+        from serve import available_cpus, memory_usage
+
+        assert 1 <= available_cpus() <= (os.cpu_count() or 1)
+        usage = memory_usage(os.getpid())
+        assert usage["rss"] > 0
+        assert 0 < usage["private"] <= usage["rss"]
+        assert memory_usage(-1) == {"rss": 0, "pss": 0, "private": 0}
+
+    def test_preloaded_model_file_is_read_from_memory(self, tmp_path, monkeypatch):
+        """Après préchargement, le modèle est ouvert depuis les octets en mémoire"""
+        import h5py
+        import services.prediction_service as prediction_module
+
+        path = tmp_path / "model.h5"
+        with h5py.File(path, "w") as model_file:
+            model_file.attrs["backend"] = "tensorflow"
+
+        monkeypatch.setattr(prediction_module, "_preloaded_model_file", None)
+        assert prediction_module.preload_model_file(str(path)) == path.stat().st_size
+        path.unlink()
+
+        with prediction_module._open_model_file() as model_file:
+            assert model_file.attrs["backend"] == "tensorflow"
+
+class TestDrainOnSignal:
+    """Tests du drainage au signal d'arrêt"""
+
+    def test_sigterm_drains_before_uvicorn_shutdown(self):
+        """SIGTERM : drainage immédiat, socket gardé jusqu'à la fin des requêtes, budget partagé"""
+        import asyncio
+        import signal
+        import uvicorn
+        from serve import DrainingServer
+        from core.config import settings
+        from core.lifecycle import drain_controller
+        from main import app
+
+        server = DrainingServer(uvicorn.Config(app, timeout_graceful_shutdown=int(settings.SHUTDOWN_TIMEOUT)))
+
+        async def scenario():
+            drain_controller.enter()  # requête en cours
+            server.handle_exit(signal.SIGTERM, None)
+            assert drain_controller.draining
+            assert drain_controller.remaining() > 0
+
+            # Requête encore en cours : uvicorn ne ferme pas le socket
+            await asyncio.sleep(0.2)
+            assert not server.should_exit
+
+            drain_controller.leave()
+            await asyncio.sleep(0.2)
+            assert server.should_exit
+            assert 1 <= server.config.timeout_graceful_shutdown <= settings.SHUTDOWN_TIMEOUT
+
+        asyncio.run(scenario())
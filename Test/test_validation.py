@@ -36,3 +36,61 @@ class TestValidation:
             "password": "123"  # Trop court
         })
         assert response.status_code == 422
+
+class TestBodySizeLimit:
+    """Tests de la limite de taille appliquée pendant la réception"""
+    
+    @staticmethod
+    def _auth_headers():
+        response = client.post("/auth/login", json={"username": "testuser", "password": "user123!"})
+        return {"Authorization": f"Bearer {response.json()['access_token']}"}
+    
+    def test_declared_length_rejected_before_reading(self):
+        """Content-Length trop grand : 413 sans lire le corps"""
+        from core.config import settings
+        
+        response = client.post(
+            "/predict/image",
+            headers={**self._auth_headers(), "content-length": str(settings.MAX_REQUEST_BODY_SIZE + 1)},
+            content=b"x"
+        )
+        assert response.status_code == 413
+    
+    def test_chunked_body_interrupted_at_limit(self):
+        """Corps sans Content-Length : la réception s'arrête dès la limite franchie"""
+        import asyncio
+        from fastapi import FastAPI, Request
+        from core.middleware import PipelineMiddleware, BodySizeLimitStage
+        
+        test_app = FastAPI()
+        
+        @test_app.post("/upload")
+        async def upload(request: Request):
+            return {"size": len(await request.body())}
+        
+        asgi_app = PipelineMiddleware(test_app, [BodySizeLimitStage(default_limit=1024, route_limits={})])
+        chunks_read, messages = [], []
+        
+        async def receive():
+            chunks_read.append(1)
+            return {"type": "http.request", "body": b"x" * 256, "more_body": len(chunks_read) < 64}
+        
+        async def send(message):
+            messages.append(message)
+        
+        scope = {
+            "type": "http", "method": "POST", "path": "/upload", "raw_path": b"/upload",
+            "query_string": b"", "headers": [(b"host", b"testserver")], "root_path": "",
+            "scheme": "http", "server": ("testserver", 80), "client": ("127.0.0.1", 1234),
+            "http_version": "1.1", "asgi": {"version": "3.0"}
+        }
+        asyncio.run(asgi_app(scope, receive, send))
+        
+        assert messages[0]["status"] == 413
+        assert len(chunks_read) == 5
+    
+    def test_invalid_image_is_decoded_once(self):
+        """Image illisible : 400, détectée par le décodeur du service"""
+        files = {"file": ("fake.jpg", io.BytesIO(b"not really a jpeg"), "image/jpeg")}
+        response = client.post("/predict/image", headers=self._auth_headers(), files=files)
+        assert response.status_code == 400
@@ -0,0 +1,166 @@
+import pytest
+import io
+import asyncio
+from fastapi.testclient import TestClient
+from starlette.websockets import WebSocketDisconnect
+from PIL import Image
+import numpy as np
+
+from main import app
+
+def make_image() -> bytes:
+    """Image JPEG aléatoire"""
+    img = Image.fromarray(np.random.randint(0, 255, (150, 150, 3), dtype=np.uint8))
+    img_bytes = io.BytesIO()
+    img.save(img_bytes, format='JPEG')
+    return img_bytes.getvalue()
+
+@pytest.fixture
+def client():
+    """Client de test avec le cycle de vie complet (micro-batcher démarré)"""
+    with TestClient(app) as c:
+        yield c
+
+@pytest.fixture
+def auth_token(client):
+    """Fixture pour obtenir un token d'authentification"""
+    response = client.post("/auth/login", json={
+        "username": "testuser",
+        "password": "user123!"
+    })
+    return response.json()["access_token"]
+
+class TestWebSocketPredict:
+    """Tests de l'endpoint /ws/predict"""
+
+    def test_frames_are_predicted_with_ids(self, client, auth_token):
+        """Authentification par premier message, puis une prédiction par image"""
+        with client.websocket_connect("/ws/predict") as websocket:
+            websocket.send_json({"token": auth_token})
+            assert websocket.receive_json()["status"] == "ready"
+
+            websocket.send_bytes(make_image())
+            result = websocket.receive_json()
+            assert result["frame_id"] == 1
+            assert result["status"] == "success"
+            assert result["prediction"]["category"]
+
+            websocket.send_bytes(b"not an image")
+            result = websocket.receive_json()
+            assert (result["frame_id"], result["status"]) == (2, "error")
+
+    def test_header_authentication(self, client, auth_token):
+        """Authentification par header pour les clients qui peuvent en poser"""
+        headers = {"Authorization": f"Bearer {auth_token}"}
+        with client.websocket_connect("/ws/predict", headers=headers) as websocket:
+            assert websocket.receive_json()["status"] == "ready"
+
+    def test_frames_use_quota_and_skip_history(self, client, auth_token, monkeypatch):
+        """Images décomptées du quota de l'utilisateur, sans ajout à l'historique"""
+        from core.ratelimit import create_rate_limit_store
+        from main import rate_limit_stage
+
+        monkeypatch.setitem(rate_limit_stage.quotas, "user", 2)
+        monkeypatch.setitem(rate_limit_stage.stores, "user", create_rate_limit_store(2, 3600, namespace="ws-test:"))
+        prediction_service = app.state.prediction_service
+
+        with client.websocket_connect("/ws/predict") as websocket:
+            websocket.send_json({"token": auth_token})
+            user_id = websocket.receive_json()["user_id"]
+            history_version = prediction_service.history_version(user_id)
+
+            statuses = []
+            for _ in range(3):
+                websocket.send_bytes(make_image())
+                statuses.append(websocket.receive_json())
+
+        assert [result["status"] for result in statuses] == ["success", "success", "rate_limited"]
+        assert statuses[2]["retry_after"] >= 1
+        assert prediction_service.history_version(user_id) == history_version
+
+    def test_invalid_token_closes_connection(self, client):
+        """Connexion fermée (1008) sans authentification valide"""
+        with client.websocket_connect("/ws/predict") as websocket:
+            websocket.send_json({"token": "invalide"})
+            with pytest.raises(WebSocketDisconnect) as exc_info:
+                websocket.receive_json()
+        assert exc_info.value.code == 1008
+
+class TestMicroBatcher:
+    """Tests du regroupement en micro-lots"""
+
+    @pytest.fixture
+    def prediction_service(self):
+        from services.prediction_service import PredictionService
+
+        service = PredictionService()
+        asyncio.run(service.load_model())
+        return service
+
+    def test_concurrent_requests_share_one_model_call(self, prediction_service):
+        """Des requêtes simultanées de plusieurs utilisateurs forment un seul lot"""
+        from services.micro_batcher import MicroBatcher
+
+        calls = []
+        predict = prediction_service.model.predict
+
+        def counting_predict(x, verbose=0):
+            calls.append(len(x))
+            return predict(x, verbose=verbose)
+
+        prediction_service.model.predict = counting_predict
+
+        async def scenario():
+            batcher = MicroBatcher(prediction_service, max_batch_size=8, max_wait=0.05)
+            await batcher.start()
+            results = await asyncio.gather(*[
+                batcher.submit(make_image(), user_id) for user_id in (1, 2, 2, 3)
+            ])
+            await batcher.stop()
+            return results
+
+        results = asyncio.run(scenario())
+        assert calls == [4]
+        assert [result["user_id"] for result in results] == [1, 2, 2, 3]
+
+    def test_latest_frame_wins(self):
+        """Sous contrainte, l'image en attente est remplacée par la plus récente"""
+        from services.micro_batcher import LatestFrameChannel
+
+        async def scenario():
+            release = asyncio.Event()
+            submitted, results, dropped = [], [], []
+
+            class SlowBatcher:
+                async def submit(self, frame, user_id, filename=None, record=True):
+                    submitted.append(frame)
+                    await release.wait()
+                    return {"frame": frame}
+
+            async def on_result(frame_id, result):
+                results.append(frame_id)
+
+            async def on_dropped(frame_id):
+                dropped.append(frame_id)
+
+            async def on_error(frame_id, message):
+                raise AssertionError(message)
+
+            channel = LatestFrameChannel(SlowBatcher(), 2, on_result, on_dropped, on_error)
+            worker = asyncio.create_task(channel.run())
+
+            await channel.push(1, b"1")
+            await asyncio.sleep(0)  # image 1 en cours de prédiction
+            for frame_id in (2, 3, 4):
+                await channel.push(frame_id, str(frame_id).encode())
+
+            release.set()
+            while len(results) < 2:
+                await asyncio.sleep(0.01)
+            worker.cancel()
+            return submitted, results, dropped
+
+        submitted, results, dropped = asyncio.run(scenario())
+        assert submitted == [b"1", b"4"]
+        assert results == [1, 4]
+        assert dropped == [2, 3]
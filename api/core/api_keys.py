@@ -0,0 +1,181 @@
+import hashlib
+import logging
+import secrets
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+
+from .config import settings
+from .cache import TTLCache
+from .database import get_db_context, APIKeyCRUD
+
+logger = logging.getLogger(__name__)
+
+API_KEY_PREFIX = "p3_"
+
+def generate_api_key() -> str:
+    """Génération d'une clé API brute (affichée une seule fois au client)"""
+    return API_KEY_PREFIX + secrets.token_urlsafe(32)
+
+def hash_api_key(api_key: str) -> str:
+    """Empreinte SHA-256 stockée en base à la place de la clé"""
+    return hashlib.sha256(api_key.encode()).hexdigest()
+
+class APIKeyManager:
+    """
+    Authentification des clients machines par clé API
+
+    Seule l'empreinte SHA-256 de la clé est stockée, sous index unique : une
+    clé se vérifie par une recherche exacte, sans bcrypt. Les clés vérifiées
+    sont gardées dans un cache borné (`cache_ttl` secondes). Les clés
+    inconnues vont dans un cache séparé et plus petit (`unknown_cache_size`) :
+    des essais de clés au hasard n'évincent que des entrées négatives, jamais
+    les clés valides. Les mises à jour de `last_used` sont regroupées et
+    écrites au plus toutes les `flush_interval` secondes, au lieu d'une
+    écriture par requête.
+
+    Fenêtre de révocation : le cache est propre à chaque worker. Une clé
+    révoquée (ou la clé d'un utilisateur désactivé) est refusée aussitôt par
+    le worker qui traite la révocation, mais les autres workers l'acceptent
+    encore jusqu'à `cache_ttl` secondes.
+    """
+
+    def __init__(
+        self,
+        cache_size: int = 10000,
+        cache_ttl: float = 15.0,
+        flush_interval: float = 30.0,
+        unknown_cache_size: int = 1000
+    ):
+        self._cache = TTLCache(maxsize=cache_size, ttl=cache_ttl)
+        self._unknown = TTLCache(maxsize=unknown_cache_size, ttl=cache_ttl)
+        self.flush_interval = flush_interval
+        self._pending_usage: Dict[int, datetime] = {}
+        self._lock = threading.Lock()
+        self._next_flush = time.monotonic() + flush_interval
+
+    def create_key(self, user_id: int, name: str, expires_in_days: Optional[int] = None) -> Dict[str, Any]:
+        """Création d'une clé pour un utilisateur (la clé brute n'est renvoyée qu'ici)"""
+        api_key = generate_api_key()
+        expires_at = datetime.utcnow() + timedelta(days=expires_in_days) if expires_in_days else None
+
+        with get_db_context() as db:
+            record = APIKeyCRUD.create_api_key(db, user_id, hash_api_key(api_key), name, expires_at)
+            key_info = self._to_dict(record)
+
+        logger.info(f"Clé API créée : {name} (utilisateur {user_id})")
+        return {**key_info, "key": api_key}
+
+    def authenticate(self, api_key: str, record_use: bool = True) -> Optional[Dict[str, Any]]:
+        """Utilisateur associé à une clé valide, ou None"""
+        key_hash = hash_api_key(api_key)
+        entry = self._cache.get(key_hash)
+
+        if entry is None:
+            if self._unknown.get(key_hash) is not None:
+                return None
+            entry = self._load(key_hash)
+            if entry is None:
+                self._unknown.set(key_hash, True)
+                return None
+            self._cache.set(key_hash, entry)
+
+        if entry["expires_at"] is not None and entry["expires_at"] <= datetime.utcnow():
+            self._cache.pop(key_hash)
+            return None
+
+        if record_use:
+            self.record_use(entry["api_key_id"])
+        return entry
+
+    def _load(self, key_hash: str):
+        """Lecture en base (None pour une clé inconnue ou inactive)"""
+        with get_db_context() as db:
+            row = APIKeyCRUD.get_active_key_with_user(db, key_hash)
+            if row is None:
+                return None
+            api_key, user = row
+            return {
+                "api_key_id": api_key.id,
+                "user_id": user.id,
+                "username": user.username,
+                "role": user.role,
+                "expires_at": api_key.expires_at,
+                "key_hash": key_hash
+            }
+
+    def record_use(self, api_key_id: int):
+        """Enregistrement différé de la dernière utilisation"""
+        with self._lock:
+            self._pending_usage[api_key_id] = datetime.utcnow()
+        if time.monotonic() >= self._next_flush:
+            self.flush_usage()
+
+    def flush_usage(self) -> int:
+        """Écriture groupée des dates de dernière utilisation"""
+        with self._lock:
+            pending, self._pending_usage = self._pending_usage, {}
+            self._next_flush = time.monotonic() + self.flush_interval
+
+        if not pending:
+            return 0
+
+        try:
+            with get_db_context() as db:
+                APIKeyCRUD.update_last_used(db, pending)
+        except Exception as e:
+            logger.error(f"Écriture de last_used impossible : {str(e)}")
+            with self._lock:
+                for key_id, used_at in pending.items():
+                    self._pending_usage.setdefault(key_id, used_at)
+            return 0
+
+        return len(pending)
+
+    def list_keys(self, user_id: int) -> List[Dict[str, Any]]:
+        """Clés d'un utilisateur (sans la clé brute)"""
+        with get_db_context() as db:
+            return [self._to_dict(record) for record in APIKeyCRUD.get_user_keys(db, user_id)]
+
+    def revoke_key(self, user_id: int, api_key_id: int) -> bool:
+        """
+        Désactivation d'une clé et invalidation du cache local
+
+        Les autres workers gardent la clé en cache jusqu'à `cache_ttl` secondes.
+        """
+        with get_db_context() as db:
+            key_hash = APIKeyCRUD.deactivate(db, user_id, api_key_id)
+
+        if key_hash is None:
+            return False
+
+        self._cache.pop(key_hash)
+        logger.info(f"Clé API révoquée : {api_key_id} (utilisateur {user_id})")
+        return True
+
+    @staticmethod
+    def _to_dict(record) -> Dict[str, Any]:
+        return {
+            "id": record.id,
+            "name": record.name,
+            "is_active": record.is_active,
+            "created_at": record.created_at,
+            "expires_at": record.expires_at,
+            "last_used": record.last_used
+        }
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            **self._cache.stats(),
+            "unknown_keys": self._unknown.stats(),
+            "pending_usage_writes": len(self._pending_usage)
+        }
+
+# Instance globale du gestionnaire de clés API
+api_key_manager = APIKeyManager(
+    cache_size=settings.API_KEY_CACHE_SIZE,
+    cache_ttl=settings.API_KEY_CACHE_TTL,
+    flush_interval=settings.API_KEY_USAGE_FLUSH_INTERVAL,
+    unknown_cache_size=settings.API_KEY_UNKNOWN_CACHE_SIZE
+)
@@ -0,0 +1,111 @@
+import struct
+from typing import Iterable, List, Union
+
+# Formats acceptés par /predict/batch/binary (header Content-Type)
+LENGTH_PREFIXED_MEDIA_TYPE = "application/octet-stream"
+MSGPACK_MEDIA_TYPES = ("application/msgpack", "application/x-msgpack")
+
+# Préfixe de longueur : entier non signé 32 bits big-endian
+LENGTH_PREFIX = struct.Struct(">I")
+
+# En-têtes msgpack : tableau (fixarray, array 16, array 32) et binaire (bin 8, 16, 32)
+_MSGPACK_ARRAY_HEADERS = {0xdc: struct.Struct(">H"), 0xdd: struct.Struct(">I")}
+_MSGPACK_BIN_HEADERS = {0xc4: struct.Struct(">B"), 0xc5: struct.Struct(">H"), 0xc6: struct.Struct(">I")}
+
+class InvalidBinaryUpload(ValueError):
+    """Corps d'envoi binaire mal formé ou hors limites"""
+
+def _check_count(count: int, max_items: int):
+    if count > max_items:
+        raise InvalidBinaryUpload(f"Maximum {max_items} images par batch")
+
+def split_length_prefixed(body: Union[bytes, bytearray, memoryview], max_items: int) -> List[memoryview]:
+    """
+    Découpage d'un corps `[longueur uint32 big-endian][octets de l'image]...`
+
+    Chaque image est une vue (memoryview) sur le corps reçu : aucune copie.
+    La taille de chaque image est contrôlée ensuite, image par image, par
+    PredictionService (comme pour /predict/batch).
+    """
+    view = memoryview(body)
+    images: List[memoryview] = []
+    offset = 0
+
+    while offset < len(view):
+        if len(view) - offset < LENGTH_PREFIX.size:
+            raise InvalidBinaryUpload("Préfixe de longueur tronqué")
+        (size,) = LENGTH_PREFIX.unpack_from(view, offset)
+        offset += LENGTH_PREFIX.size
+
+        _check_count(len(images) + 1, max_items)
+        if size > len(view) - offset:
+            raise InvalidBinaryUpload(f"Image {len(images)} tronquée")
+
+        images.append(view[offset:offset + size])
+        offset += size
+
+    return images
+
+def split_msgpack(body: Union[bytes, bytearray, memoryview], max_items: int) -> List[memoryview]:
+    """
+    Découpage d'un tableau msgpack de binaires (`bin 8/16/32`)
+
+    Seul ce sous-ensemble de msgpack est lu, directement sur le corps reçu :
+    pas de dépendance au paquet msgpack, et chaque image reste une vue sans
+    copie (le décodeur msgpack, lui, copierait chaque binaire en bytes).
+    """
+    view = memoryview(body)
+    if not len(view):
+        raise InvalidBinaryUpload("Corps msgpack vide")
+
+    marker = view[0]
+    if 0x90 <= marker <= 0x9f:
+        count, offset = marker & 0x0f, 1
+    elif marker in _MSGPACK_ARRAY_HEADERS:
+        header = _MSGPACK_ARRAY_HEADERS[marker]
+        if len(view) < 1 + header.size:
+            raise InvalidBinaryUpload("En-tête msgpack tronqué")
+        (count,) = header.unpack_from(view, 1)
+        offset = 1 + header.size
+    else:
+        raise InvalidBinaryUpload("Le corps msgpack doit être un tableau d'images binaires")
+    _check_count(count, max_items)
+
+    images: List[memoryview] = []
+    for index in range(count):
+        header = _MSGPACK_BIN_HEADERS.get(view[offset]) if offset < len(view) else None
+        if header is None:
+            raise InvalidBinaryUpload(f"Élément {index} : binaire msgpack attendu")
+        if len(view) - offset - 1 < header.size:
+            raise InvalidBinaryUpload(f"Élément {index} : en-tête tronqué")
+        (size,) = header.unpack_from(view, offset + 1)
+        offset += 1 + header.size
+        if size > len(view) - offset:
+            raise InvalidBinaryUpload(f"Image {index} tronquée")
+
+        images.append(view[offset:offset + size])
+        offset += size
+
+    if offset != len(view):
+        raise InvalidBinaryUpload("Données en trop après le tableau msgpack")
+    return images
+
+def split_binary_upload(
+    body: Union[bytes, bytearray, memoryview],
+    content_type: str,
+    max_items: int
+) -> List[memoryview]:
+    """Découpage du corps selon son Content-Type (préfixes de longueur ou msgpack)"""
+    media_type = content_type.split(";", 1)[0].strip().lower()
+    if media_type == LENGTH_PREFIXED_MEDIA_TYPE:
+        return split_length_prefixed(body, max_items)
+    if media_type in MSGPACK_MEDIA_TYPES:
+        return split_msgpack(body, max_items)
+    raise InvalidBinaryUpload(
+        f"Content-Type non supporté : {media_type or 'absent'} "
+        f"(attendu {LENGTH_PREFIXED_MEDIA_TYPE} ou {MSGPACK_MEDIA_TYPES[0]})"
+    )
+
+def encode_length_prefixed(images: Iterable[bytes]) -> bytes:
+    """Corps `application/octet-stream` côté client (scripts d'envoi, tests)"""
+    return b"".join(part for image in images for part in (LENGTH_PREFIX.pack(len(image)), image))
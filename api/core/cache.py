@@ -0,0 +1,99 @@
+import time
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+
+class TTLCache:
+    """
+    Cache LRU borné avec expiration par entrée
+
+    Les entrées expirent après `ttl` secondes (ou à l'échéance passée à `set`)
+    et les moins récemment utilisées sont évincées au-delà de `maxsize`.
+    Toutes les opérations sont en O(1).
+    """
+
+    def __init__(
+        self,
+        maxsize: int = 1024,
+        ttl: float = 300.0,
+        on_evict: Optional[Callable[[Hashable, Any], None]] = None,
+        clock: Callable[[], float] = time.monotonic
+    ):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.on_evict = on_evict
+        self.clock = clock
+        self._data: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.RLock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """Récupération d'une entrée (None si absente ou expirée)"""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return default
+
+            expires_at, value = entry
+            if expires_at <= self.clock():
+                del self._data[key]
+                self.misses += 1
+                self._evicted(key, value)
+                return default
+
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None):
+        """Ajout ou remplacement d'une entrée"""
+        expires_at = self.clock() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._data[key] = (expires_at, value)
+            self._data.move_to_end(key)
+
+            while len(self._data) > self.maxsize:
+                old_key, (_, old_value) = self._data.popitem(last=False)
+                self._evicted(old_key, old_value)
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        """Invalidation d'une entrée"""
+        with self._lock:
+            entry = self._data.pop(key, None)
+        if entry is None:
+            return default
+        self._evicted(key, entry[1])
+        return entry[1]
+
+    def clear(self):
+        """Vidage complet du cache"""
+        with self._lock:
+            items = list(self._data.items())
+            self._data.clear()
+        for key, (_, value) in items:
+            self._evicted(key, value)
+
+    def _evicted(self, key: Hashable, value: Any):
+        if self.on_evict is not None:
+            self.on_evict(key, value)
+
+    def __contains__(self, key: Hashable) -> bool:
+        entry = self._data.get(key)
+        return entry is not None and entry[0] > self.clock()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def stats(self) -> Dict[str, Any]:
+        """Statistiques du cache"""
+        total = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / total if total else 0.0
+        }
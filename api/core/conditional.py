@@ -0,0 +1,38 @@
+import hashlib
+from typing import Any, Optional
+
+from starlette.responses import Response
+
+# Les réponses restent en cache côté client mais sont revalidées à chaque usage
+CACHE_CONTROL = "private, no-cache"
+
+def make_etag(*parts: Any) -> str:
+    """
+    ETag faible dérivé de compteurs de version
+
+    Les parties (nom de ressource, identifiant, versions, paramètres) suffisent
+    à identifier le contenu : aucune réponse n'est calculée ni hachée. L'ETag
+    est faible car le corps peut être compressé différemment selon le client.
+    """
+    digest = hashlib.blake2b(repr(parts).encode(), digest_size=8).hexdigest()
+    return f'W/"{digest}"'
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Comparaison faible de `If-None-Match` avec l'ETag courant"""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+
+    opaque = etag[2:] if etag.startswith("W/") else etag
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate == opaque:
+            return True
+    return False
+
+def not_modified_response(etag: str) -> Response:
+    """Réponse 304 sans corps"""
+    return Response(status_code=304, headers={"ETag": etag, "Cache-Control": CACHE_CONTROL})
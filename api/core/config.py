@@ -1,5 +1,5 @@
 from pydantic_settings import BaseSettings
-from typing import List, Optional
+from typing import Dict, List, Optional
 import os
 from pathlib import Path
 
@@ -17,9 +17,38 @@ class Settings(BaseSettings):
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 30
     REFRESH_TOKEN_EXPIRE_DAYS: int = 7
     
+    # Cache des tokens déjà vérifiés (entrées expirées à l'échéance du token)
+    TOKEN_CACHE_SIZE: int = 10000
+    
+    # Denylist des tokens révoqués (filtre de Bloom par tranche d'expiration)
+    DENYLIST_BUCKET_SECONDS: int = 3600
+    DENYLIST_BLOOM_CAPACITY: int = 10000
+    DENYLIST_BLOOM_ERROR_RATE: float = 0.001
+    DENYLIST_SYNC_INTERVAL: int = 5  # secondes entre deux synchronisations inter-workers
+    
+    # Clés API des clients machines (en-tête X-API-Key)
+    API_KEY_CACHE_SIZE: int = 10000
+    API_KEY_CACHE_TTL: int = 15  # secondes, délai max de prise en compte d'une révocation par les autres workers
+    API_KEY_UNKNOWN_CACHE_SIZE: int = 1000  # clés inconnues, cache séparé des clés valides
+    API_KEY_USAGE_FLUSH_INTERVAL: int = 30  # écriture groupée de last_used
+    
+    # Hachage des mots de passe (pool bcrypt dédié)
+    PASSWORD_HASH_WORKERS: int = 2
+    PASSWORD_HASH_MAX_QUEUE: int = 64
+    
     # Base de données
     DATABASE_URL: str = "sqlite:///./projet3_api.db"
     
+    # Utilisateurs initiaux, insérés une seule fois en base au premier démarrage.
+    # Les hashs bcrypt sont précalculés : aucun hachage sur le chemin de démarrage.
+    SEED_DEFAULT_USERS: bool = True
+    SEED_ADMIN_PASSWORD_HASH: str = "$2b$12$quNgbH5vgtBnuHg3rk/rSerUOCwJQTzCPFfeMTyc8SYBo8isLvbr6"  # admin123!
+    SEED_TESTUSER_PASSWORD_HASH: str = "$2b$12$EVK7pnsw3AAsNe0OjcGfJuanEnH2tEoGYJ8ibIG6lLHg6QF0pFG5m"  # user123!
+    
+    # Cache utilisateurs (read-through, par worker)
+    USER_CACHE_SIZE: int = 10000
+    USER_CACHE_TTL: int = 300  # secondes
+    
     # CORS et sécurité
     ALLOWED_ORIGINS: List[str] = [
         "http://localhost:3000",
@@ -39,19 +68,76 @@ class Settings(BaseSettings):
     # Rate Limiting
     RATE_LIMIT_REQUESTS: int = 100
     RATE_LIMIT_WINDOW: int = 3600  # 1 heure en secondes
+    RATE_LIMIT_MAX_CLIENTS: int = 100000  # clients suivis (LRU)
+    # Quotas par rôle (unités de coût par fenêtre) ; les clients anonymes,
+    # identifiés par IP, gardent RATE_LIMIT_REQUESTS
+    RATE_LIMIT_ROLE_QUOTAS: Dict[str, int] = {"user": 1000, "admin": 5000}
+    # Coût de base par route (1 par défaut)
+    RATE_LIMIT_ROUTE_COSTS: Dict[str, int] = {
+        "/predict/image": 5, "/predict/batch": 5, "/predict/batch/binary": 5, "/jobs": 5,
+        "/ws/predict": 1  # par image de flux prédite
+    }
+    RATE_LIMIT_COST_BYTES_UNIT: int = 256 * 1024  # +1 unité par tranche envoyée
+    RATE_LIMIT_BACKEND: str = "memory"  # "memory" (par worker) ou "redis" (partagé)
+    REDIS_URL: str = "redis://localhost:6379/0"
+    RATE_LIMIT_REDIS_PREFIX: str = "ratelimit:"
+    RATE_LIMIT_REDIS_TIMEOUT: float = 0.1  # secondes
+    RATE_LIMIT_REDIS_RETRY_INTERVAL: int = 5  # secondes en limitation locale après une panne
     
     # Modèle ML
     MODEL_PATH: str = "modele_cnn_transfer.h5"
+    MODEL_VERSION: str = "1.0.0"
     MODEL_CATEGORIES: List[str] = ["Playstation", "Xbox", "Nintendo", "PC Gaming"]
     IMAGE_SIZE: tuple = (150, 150)
     MAX_FILE_SIZE: int = 10 * 1024 * 1024  # 10MB
+    MAX_BATCH_FILES: int = 10
+    MAX_REQUEST_BODY_SIZE: int = 10 * 1024 * 1024 + 64 * 1024  # une image + l'enveloppe multipart
+    REQUEST_BODY_LIMITS: Dict[str, int] = {
+        "/predict/batch": 10 * (10 * 1024 * 1024 + 64 * 1024),
+        "/predict/batch/binary": 10 * (10 * 1024 * 1024 + 8),  # préfixe ou en-tête msgpack par image
+        "/jobs": 512 * 1024 * 1024
+    }
     ALLOWED_IMAGE_TYPES: List[str] = ["image/jpeg", "image/png", "image/webp"]
+    INFERENCE_BATCH_SIZE: int = 16  # images par appel au modèle (jobs, flux, micro-lots)
+    MICRO_BATCH_MAX_WAIT_MS: float = 5.0  # attente maximale pour compléter un micro-lot
+    WS_AUTH_TIMEOUT: float = 10.0  # secondes pour s'authentifier sur /ws/predict
+    WARMUP_BATCH_SIZES: List[int] = []  # vide : 1, INFERENCE_BATCH_SIZE et MAX_BATCH_FILES
+    READINESS_CACHE_TTL: float = 2.0  # secondes de validité du résultat de /readyz
+    READINESS_DB_TIMEOUT: float = 1.0  # secondes accordées au ping de la base par /readyz
+    SHUTDOWN_TIMEOUT: float = 20.0  # budget total de l'arrêt à partir de SIGTERM (drainage et vidage des files)
+    
+    # Serveur de production (serve.py) : workers préforkés
+    # 1 par défaut : historique, statistiques, ETags et métriques sont propres
+    # à chaque worker tant qu'ils ne sont pas agrégés (voir README)
+    WEB_WORKERS: int = 1  # 0 : selon les CPU disponibles
+    TF_INTRA_OP_THREADS: int = 0  # 0 : valeur par défaut de TensorFlow
+    TF_INTER_OP_THREADS: int = 0
+    WORKER_MEMORY_REPORT_INTERVAL: float = 300.0  # secondes entre deux rapports mémoire des workers
+    
+    # Surveillance de la boucle d'événements (piles des appels bloquants en mode DEBUG)
+    LOOP_MONITOR_INTERVAL: float = 0.25  # secondes entre deux mesures du retard
+    LOOP_BLOCKING_THRESHOLD: float = 0.1  # secondes de retard comptées comme un blocage
+    
+    # Profilage à la demande (POST /admin/profile)
+    PROFILER_SAMPLE_INTERVAL: float = 0.01  # secondes entre deux relevés des piles
+    PROFILER_MAX_DURATION: float = 60.0  # durée maximale d'un profilage
+    PROFILER_TRACEMALLOC_FRAMES: int = 1  # frames gardées par allocation tracée
+    
+    # Jobs de classification asynchrones
+    JOBS_DIR: str = "jobs"  # images reçues et résultats NDJSON, un sous-répertoire par job
+    MAX_JOB_FILES: int = 1000
+    JOB_WORKERS: int = 1
+    JOB_LEASE_SECONDS: float = 60.0  # bail d'un processus sur un job, prolongé à chaque lot
+    JOB_SCAN_INTERVAL: float = 15.0  # secondes entre deux recherches de jobs à reprendre
     
     # Logging
     LOG_LEVEL: str = "INFO"
     LOG_FILE: str = "api.log"
     LOG_ROTATION: str = "1 day"
     LOG_RETENTION: str = "30 days"
+    LOG_FORMAT: str = "text"  # format de la console : text ou json (le fichier est toujours en JSON)
+    LOG_QUEUE_SIZE: int = 10000  # au-delà, les enregistrements sont abandonnés et comptés
+    LOG_SAMPLE_RATES: Dict[str, float] = {"prediction": 0.1, "request": 0.1}  # fraction conservée des événements INFO
     
     # APIs externes
     NVIDIA_API_KEY: Optional[str] = None
@@ -61,6 +147,12 @@ class Settings(BaseSettings):
     UPLOAD_DIR: str = "uploads"
     PREDICTIONS_DIR: str = "predictions"
     
+    # Compression des réponses (brotli si le paquet est installé, sinon gzip)
+    COMPRESSION_MINIMUM_SIZE: int = 1024  # octets ; en dessous, la réponse part non compressée
+    COMPRESSION_GZIP_LEVEL: int = 6
+    COMPRESSION_BROTLI_QUALITY: int = 4  # qualité adaptée à du contenu dynamique
+    COMPRESSIBLE_CONTENT_TYPES: List[str] = ["application/json", "application/x-ndjson", "text/"]
+    
     # Monitoring
     ENABLE_METRICS: bool = True
     METRICS_PATH: str = "/metrics"
@@ -95,6 +187,7 @@ class Settings(BaseSettings):
 
 class ProductionConfig(Settings):
     DEBUG: bool = False
+    ENVIRONMENT: str = "production"
 
 class TestConfig(Settings):
     DEBUG: bool = True
@@ -1,9 +1,10 @@
-from sqlalchemy import create_engine, Column, Integer, String, Boolean, DateTime, Text, Float
+from sqlalchemy import create_engine, Column, Integer, String, Boolean, DateTime, Text, Float, text, and_, or_
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker, Session
 from sqlalchemy.sql import func
 from contextlib import contextmanager
-from datetime import datetime
+from datetime import datetime, timedelta
+from typing import Dict, Optional
 import logging
 
 from .config import settings
@@ -57,13 +58,40 @@ class APIKey(Base):
     
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, nullable=False, index=True)
-    key_hash = Column(String(255), unique=True, nullable=False)
+    key_hash = Column(String(255), unique=True, index=True, nullable=False)  # SHA-256 de la clé
     name = Column(String(100), nullable=False)
     is_active = Column(Boolean, default=True, nullable=False)
     last_used = Column(DateTime(timezone=True), nullable=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     expires_at = Column(DateTime(timezone=True), nullable=True)
 
+class RevokedToken(Base):
+    """Modèle token révoqué (denylist des identifiants `jti`)"""
+    __tablename__ = "revoked_tokens"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    jti = Column(String(64), unique=True, index=True, nullable=False)
+    user_id = Column(Integer, nullable=True)
+    expires_at = Column(DateTime, nullable=False, index=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+class Job(Base):
+    """Modèle job de classification asynchrone"""
+    __tablename__ = "jobs"
+    
+    id = Column(String(32), primary_key=True)
+    user_id = Column(Integer, nullable=False, index=True)
+    status = Column(String(20), default="pending", nullable=False, index=True)
+    total = Column(Integer, nullable=False)
+    processed = Column(Integer, default=0, nullable=False)
+    failed = Column(Integer, default=0, nullable=False)
+    error_message = Column(Text, nullable=True)
+    owner = Column(String(64), nullable=True)  # processus qui traite le job (bail)
+    lease_expires_at = Column(DateTime(timezone=True), nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), nullable=True)
+    completed_at = Column(DateTime(timezone=True), nullable=True)
+
 class LoginAttempt(Base):
     """Modèle tentatives de connexion"""
     __tablename__ = "login_attempts"
@@ -98,6 +126,37 @@ def get_db_context():
     finally:
         db.close()
 
+def default_users():
+    """Utilisateurs par défaut (hashs précalculés dans la configuration)"""
+    return [
+        {
+            "username": "admin",
+            "email": "admin@projet3.com",
+            "password_hash": settings.SEED_ADMIN_PASSWORD_HASH,
+            "role": "admin"
+        },
+        {
+            "username": "testuser",
+            "email": "test@projet3.com",
+            "password_hash": settings.SEED_TESTUSER_PASSWORD_HASH,
+            "role": "user"
+        }
+    ]
+
+def seed_default_users(db: Session):
+    """Insertion des utilisateurs par défaut absents (une seule requête de lecture)"""
+    seeds = default_users()
+    existing = {
+        username for (username,) in db.query(User.username).filter(
+            User.username.in_([seed["username"] for seed in seeds])
+        )
+    }
+    
+    for seed in seeds:
+        if seed["username"] not in existing:
+            db.add(User(is_active=True, **seed))
+            logger.info(f"✅ Utilisateur par défaut créé : {seed['username']}")
+
 async def init_db():
     """Initialisation de la base de données"""
     try:
@@ -106,20 +165,10 @@ async def init_db():
         # Création des tables
         Base.metadata.create_all(bind=engine)
         
-        # Création d'un utilisateur admin par défaut si nécessaire
-        with get_db_context() as db:
-            admin_user = db.query(User).filter(User.username == "admin").first()
-            if not admin_user:
-                from .security import hash_password
-                admin_user = User(
-                    username="admin",
-                    email="admin@projet3.com",
-                    password_hash=hash_password("admin123!"),
-                    role="admin",
-                    is_active=True
-                )
-                db.add(admin_user)
-                logger.info("✅ Utilisateur admin créé : admin / admin123!")
+        # Création des utilisateurs par défaut si nécessaire
+        if settings.SEED_DEFAULT_USERS:
+            with get_db_context() as db:
+                seed_default_users(db)
         
         logger.info("✅ Base de données initialisée")
         
@@ -131,7 +180,7 @@ def check_db_connection() -> bool:
     """Vérification de la connexion à la base de données"""
     try:
         with get_db_context() as db:
-            db.execute("SELECT 1")
+            db.execute(text("SELECT 1"))
         return True
     except Exception as e:
         logger.error(f"Erreur connexion base de données : {str(e)}")
@@ -175,6 +224,34 @@ class UserCRUD:
         """Liste des utilisateurs avec pagination"""
         return db.query(User).offset(skip).limit(limit).all()
     
+    @staticmethod
+    def count_users(db: Session) -> int:
+        """Nombre total d'utilisateurs"""
+        return db.query(User).count()
+    
+    @staticmethod
+    def get_users_ordered(db: Session, skip: int = 0, limit: int = 100):
+        """Liste des utilisateurs, plus récents en premier"""
+        return db.query(User).order_by(User.created_at.desc(), User.id.desc()).offset(skip).limit(limit).all()
+    
+    @staticmethod
+    def update_user(db: Session, user_id: int, **fields) -> User:
+        """Mise à jour des champs d'un utilisateur"""
+        user = db.query(User).filter(User.id == user_id).first()
+        if user:
+            for field, value in fields.items():
+                setattr(user, field, value)
+            db.commit()
+            db.refresh(user)
+        return user
+    
+    @staticmethod
+    def delete_user(db: Session, user_id: int) -> bool:
+        """Suppression d'un utilisateur"""
+        deleted = db.query(User).filter(User.id == user_id).delete()
+        db.commit()
+        return deleted > 0
+    
     @staticmethod
     def update_last_login(db: Session, user_id: int):
         """Mise à jour de la dernière connexion"""
@@ -244,6 +321,167 @@ class PredictionCRUD:
             Prediction.status == "success"
         ).count()
 
+# Fonctions CRUD pour les clés API
+class APIKeyCRUD:
+    """Opérations CRUD pour les clés API"""
+    
+    @staticmethod
+    def create_api_key(db: Session, user_id: int, key_hash: str, name: str, expires_at: datetime = None) -> APIKey:
+        """Création d'une clé API (seule l'empreinte est stockée)"""
+        api_key = APIKey(user_id=user_id, key_hash=key_hash, name=name, expires_at=expires_at)
+        db.add(api_key)
+        db.commit()
+        db.refresh(api_key)
+        return api_key
+    
+    @staticmethod
+    def get_active_key_with_user(db: Session, key_hash: str):
+        """Clé active et utilisateur actif associés à une empreinte (index unique)"""
+        return db.query(APIKey, User).join(User, User.id == APIKey.user_id).filter(
+            APIKey.key_hash == key_hash,
+            APIKey.is_active.is_(True),
+            User.is_active.is_(True)
+        ).first()
+    
+    @staticmethod
+    def get_user_keys(db: Session, user_id: int):
+        """Clés API d'un utilisateur"""
+        return db.query(APIKey).filter(APIKey.user_id == user_id).order_by(APIKey.id).all()
+    
+    @staticmethod
+    def deactivate(db: Session, user_id: int, api_key_id: int):
+        """Désactivation d'une clé ; renvoie son empreinte (None si introuvable)"""
+        api_key = db.query(APIKey).filter(APIKey.id == api_key_id, APIKey.user_id == user_id).first()
+        if not api_key:
+            return None
+        api_key.is_active = False
+        db.commit()
+        return api_key.key_hash
+    
+    @staticmethod
+    def update_last_used(db: Session, last_used_by_id: Dict[int, datetime]):
+        """Mise à jour groupée des dates de dernière utilisation"""
+        db.bulk_update_mappings(APIKey, [
+            {"id": key_id, "last_used": used_at}
+            for key_id, used_at in last_used_by_id.items()
+        ])
+        db.commit()
+
+# Fonctions CRUD pour les tokens révoqués
+class RevokedTokenCRUD:
+    """Opérations CRUD pour la denylist des tokens"""
+    
+    @staticmethod
+    def revoke(db: Session, jti: str, expires_at: datetime, user_id: int = None):
+        """Ajout d'un jti à la denylist (idempotent)"""
+        if db.query(RevokedToken.id).filter(RevokedToken.jti == jti).first():
+            return
+        db.add(RevokedToken(jti=jti, expires_at=expires_at, user_id=user_id))
+        db.commit()
+    
+    @staticmethod
+    def is_revoked(db: Session, jti: str) -> bool:
+        """Vérification exacte de la présence d'un jti"""
+        return db.query(RevokedToken.id).filter(RevokedToken.jti == jti).first() is not None
+    
+    @staticmethod
+    def get_since(db: Session, last_id: int, now: datetime):
+        """Révocations non expirées ajoutées après `last_id`"""
+        return db.query(RevokedToken.id, RevokedToken.jti, RevokedToken.expires_at).filter(
+            RevokedToken.id > last_id,
+            RevokedToken.expires_at > now
+        ).order_by(RevokedToken.id).all()
+    
+    @staticmethod
+    def purge_expired(db: Session, now: datetime) -> int:
+        """Suppression des révocations de tokens déjà expirés"""
+        deleted = db.query(RevokedToken).filter(RevokedToken.expires_at <= now).delete()
+        db.commit()
+        return deleted
+
+# Fonctions CRUD pour les jobs
+class JobCRUD:
+    """Opérations CRUD pour les jobs de classification"""
+    
+    @staticmethod
+    def create_job(db: Session, job_id: str, user_id: int, total: int) -> Job:
+        """Création d'un job en attente"""
+        job = Job(id=job_id, user_id=user_id, total=total, status="pending")
+        db.add(job)
+        db.commit()
+        db.refresh(job)
+        return job
+    
+    @staticmethod
+    def get_job(db: Session, job_id: str):
+        """Récupération d'un job par ID"""
+        return db.query(Job).filter(Job.id == job_id).first()
+    
+    @staticmethod
+    def update_job(db: Session, job_id: str, **fields):
+        """Mise à jour de l'état d'un job"""
+        db.query(Job).filter(Job.id == job_id).update({**fields, "updated_at": datetime.utcnow()})
+        db.commit()
+    
+    @staticmethod
+    def _claimable(now: datetime):
+        """Job en attente, ou en cours mais dont le bail a expiré (processus arrêté)"""
+        return or_(
+            Job.status == "pending",
+            and_(Job.status == "running", or_(Job.lease_expires_at.is_(None), Job.lease_expires_at < now))
+        )
+    
+    @staticmethod
+    def get_claimable(db: Session):
+        """Jobs qu'un processus peut prendre en charge"""
+        return db.query(Job.id).filter(JobCRUD._claimable(datetime.utcnow())).order_by(Job.created_at).all()
+    
+    @staticmethod
+    def claim_job(db: Session, job_id: str, owner: str, lease_seconds: float) -> bool:
+        """
+        Prise en charge atomique d'un job (un seul UPDATE conditionnel)
+        
+        Un seul processus obtient le job : les autres voient 0 ligne modifiée.
+        """
+        now = datetime.utcnow()
+        claimed = db.query(Job).filter(Job.id == job_id, JobCRUD._claimable(now)).update({
+            "status": "running",
+            "owner": owner,
+            "lease_expires_at": now + timedelta(seconds=lease_seconds),
+            "updated_at": now
+        }, synchronize_session=False)
+        db.commit()
+        return claimed == 1
+    
+    @staticmethod
+    def update_owned_job(db: Session, job_id: str, owner: str, lease_seconds: Optional[float] = None, **fields) -> bool:
+        """
+        Mise à jour d'un job par le processus qui en détient le bail
+        
+        Avec `lease_seconds`, le bail est prolongé. False si le bail a été
+        perdu (expiré puis repris par un autre processus).
+        """
+        now = datetime.utcnow()
+        if lease_seconds is not None:
+            fields["lease_expires_at"] = now + timedelta(seconds=lease_seconds)
+        updated = db.query(Job).filter(
+            Job.id == job_id, Job.owner == owner, Job.status == "running"
+        ).update({**fields, "updated_at": now}, synchronize_session=False)
+        db.commit()
+        return updated == 1
+    
+    @staticmethod
+    def release_jobs(db: Session, owner: str) -> int:
+        """Jobs en cours d'un processus remis en attente (arrêt du processus)"""
+        released = db.query(Job).filter(Job.owner == owner, Job.status == "running").update({
+            "status": "pending",
+            "owner": None,
+            "lease_expires_at": None,
+            "updated_at": datetime.utcnow()
+        }, synchronize_session=False)
+        db.commit()
+        return released
+
 # Utilitaires de migration
 def create_tables():
     """Création de toutes les tables"""
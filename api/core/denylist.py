@@ -0,0 +1,184 @@
+import hashlib
+import logging
+import math
+import threading
+import time
+from datetime import datetime
+from typing import Dict, Optional
+
+from .config import settings
+from .cache import TTLCache
+from .database import get_db_context, RevokedTokenCRUD
+
+logger = logging.getLogger(__name__)
+
+class BloomFilter:
+    """Filtre de Bloom : appartenance probabiliste sans faux négatifs"""
+
+    def __init__(self, capacity: int, error_rate: float = 0.001):
+        self.size = max(8, math.ceil(-capacity * math.log(error_rate) / (math.log(2) ** 2)))
+        self.hash_count = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def _positions(self, item: str):
+        # Double hachage (Kirsch-Mitzenmacher) à partir d'un seul condensat
+        digest = hashlib.blake2b(item.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        return ((h1 + i * h2) % self.size for i in range(self.hash_count))
+
+    def add(self, item: str):
+        for pos in self._positions(item):
+            self.bits[pos >> 3] |= 1 << (pos & 7)
+        self.count += 1
+
+    def __contains__(self, item: str) -> bool:
+        return all(self.bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(item))
+
+class TokenDenylist:
+    """
+    Denylist des tokens révoqués (identifiants `jti`)
+
+    La table `revoked_tokens` est la source de vérité. Chaque worker garde en
+    mémoire un filtre de Bloom par tranche d'expiration (`bucket_seconds`) :
+    le cas courant, « non révoqué », est tranché sans aller en base. Seuls les
+    positifs du filtre sont confirmés en base, puis mis en cache.
+
+    Une tranche dont tous les tokens ont expiré est supprimée automatiquement
+    (un token expiré est de toute façon refusé par la vérification JWT).
+    Les révocations faites par les autres workers sont relues toutes les
+    `sync_interval` secondes par un thread dédié (`start`/`stop`, dans le
+    lifespan) : la vérification d'un token ne lit que la mémoire et ne
+    bloque pas la boucle d'événements.
+    """
+
+    def __init__(
+        self,
+        bucket_seconds: int = 3600,
+        capacity: int = 10000,
+        error_rate: float = 0.001,
+        sync_interval: float = 5.0
+    ):
+        self.bucket_seconds = bucket_seconds
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.sync_interval = sync_interval
+        self._buckets: Dict[int, BloomFilter] = {}
+        self._confirmed = TTLCache(maxsize=10000, ttl=bucket_seconds)
+        self._lock = threading.Lock()
+        self._last_id = 0
+        self._stopped = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.db_lookups = 0
+
+    def start(self):
+        """Démarrage de la synchronisation périodique (première lecture immédiate)"""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stopped.clear()
+        self._thread = threading.Thread(target=self._sync_loop, name="denylist-sync", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 1.0):
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join(timeout=timeout)
+            self._thread = None
+
+    def _sync_loop(self):
+        while not self._stopped.is_set():
+            self.sync()
+            self._stopped.wait(self.sync_interval)
+
+    def _bucket_key(self, exp: float) -> int:
+        return int(exp) // self.bucket_seconds
+
+    def _add_local(self, jti: str, exp: float):
+        key = self._bucket_key(exp)
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = self._buckets[key] = BloomFilter(self.capacity, self.error_rate)
+        bucket.add(jti)
+
+    def _drop_expired_buckets(self, now: float):
+        current = self._bucket_key(now)
+        expired = [key for key in self._buckets if key < current]
+        for key in expired:
+            del self._buckets[key]
+        return len(expired)
+
+    def sync(self):
+        """Relecture des révocations ajoutées en base depuis la dernière synchronisation"""
+        now = time.time()
+        with self._lock:
+            try:
+                utc_now = datetime.utcnow()
+                with get_db_context() as db:
+                    if self._drop_expired_buckets(now):
+                        RevokedTokenCRUD.purge_expired(db, utc_now)
+                    for row_id, jti, expires_at in RevokedTokenCRUD.get_since(db, self._last_id, utc_now):
+                        self._add_local(jti, _to_timestamp(expires_at))
+                        self._last_id = max(self._last_id, row_id)
+            except Exception as e:
+                logger.warning(f"Synchronisation de la denylist impossible : {str(e)}")
+
+    def revoke(self, jti: str, exp: float, user_id: Optional[int] = None):
+        """Révocation d'un token jusqu'à son expiration"""
+        if exp <= time.time():
+            return
+
+        with get_db_context() as db:
+            RevokedTokenCRUD.revoke(db, jti, datetime.utcfromtimestamp(exp), user_id)
+
+        with self._lock:
+            self._add_local(jti, exp)
+        self._confirmed.set(jti, True, ttl=exp - time.time())
+
+        logger.info(f"Token révoqué : {jti}")
+
+    def is_revoked(self, jti: Optional[str], exp: Optional[float]) -> bool:
+        """
+        Vérifie si un token est révoqué
+
+        Le cas courant (absent du filtre) est tranché en mémoire ; seuls les
+        positifs du filtre, rares, sont confirmés en base.
+        """
+        if not jti or exp is None:
+            return False
+
+        bucket = self._buckets.get(self._bucket_key(exp))
+        if bucket is None or jti not in bucket:
+            return False
+
+        # Positif (vrai ou faux) du filtre : confirmation exacte en base
+        confirmed = self._confirmed.get(jti)
+        if confirmed is None:
+            self.db_lookups += 1
+            try:
+                with get_db_context() as db:
+                    confirmed = RevokedTokenCRUD.is_revoked(db, jti)
+            except Exception as e:
+                logger.error(f"Vérification de révocation impossible : {str(e)}")
+                return True
+            self._confirmed.set(jti, confirmed, ttl=max(0.0, exp - time.time()))
+        return confirmed
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "buckets": len(self._buckets),
+            "entries": sum(bucket.count for bucket in self._buckets.values()),
+            "db_lookups": self.db_lookups
+        }
+
+def _to_timestamp(value: datetime) -> float:
+    """Conversion d'une date UTC naïve en timestamp"""
+    return (value - datetime(1970, 1, 1)).total_seconds()
+
+# Instance globale de la denylist
+token_denylist = TokenDenylist(
+    bucket_seconds=settings.DENYLIST_BUCKET_SECONDS,
+    capacity=settings.DENYLIST_BLOOM_CAPACITY,
+    error_rate=settings.DENYLIST_BLOOM_ERROR_RATE,
+    sync_interval=settings.DENYLIST_SYNC_INTERVAL
+)
@@ -0,0 +1,76 @@
+import asyncio
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+class DrainController:
+    """
+    Requêtes en cours et mode drainage du worker
+
+    Une fois le drainage commencé (arrêt du worker ou POST /admin/drain),
+    /readyz répond 503 pour que le répartiteur de charge retire l'instance,
+    les nouvelles requêtes sont refusées (503) et celles déjà acceptées vont
+    jusqu'au bout : l'arrêt attend qu'elles soient terminées.
+
+    L'arrêt dispose d'un budget unique, SHUTDOWN_TIMEOUT à partir du signal :
+    attente des requêtes, fermeture des connexions par uvicorn et vidage des
+    files (micro-lots, jobs) se partagent `remaining()`.
+    """
+
+    # Intervalle de vérification pendant l'attente (indépendant de la boucle
+    # d'événements : le compteur est mis à jour depuis n'importe quelle requête)
+    POLL_INTERVAL = 0.05
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.in_flight = 0
+        self.draining = False
+        self.drain_started_at = None
+        self.shutdown_deadline = None
+
+    def enter(self):
+        with self._lock:
+            self.in_flight += 1
+
+    def leave(self):
+        with self._lock:
+            self.in_flight -= 1
+
+    def start_drain(self):
+        """Passage en drainage (sans effet s'il est déjà commencé)"""
+        if not self.draining:
+            self.draining = True
+            self.drain_started_at = time.monotonic()
+            logger.info(f"🚰 Drainage : {self.in_flight} requête(s) en cours, nouvelles requêtes refusées")
+
+    def start_shutdown(self, timeout: float):
+        """Début de l'arrêt : drainage et budget de `timeout` secondes (fixé au premier appel)"""
+        if self.shutdown_deadline is None:
+            self.shutdown_deadline = time.monotonic() + timeout
+        self.start_drain()
+
+    def remaining(self) -> float:
+        """Secondes restantes du budget d'arrêt"""
+        if self.shutdown_deadline is None:
+            return 0.0
+        return max(0.0, self.shutdown_deadline - time.monotonic())
+
+    def reset(self):
+        """Retour au service normal (démarrage du worker)"""
+        self.draining = False
+        self.drain_started_at = None
+        self.shutdown_deadline = None
+
+    async def wait_idle(self, timeout: float) -> bool:
+        """Attente de la fin des requêtes en cours ; False si le délai est dépassé"""
+        deadline = time.monotonic() + timeout
+        while self.in_flight > 0:
+            if time.monotonic() >= deadline:
+                return False
+            await asyncio.sleep(self.POLL_INTERVAL)
+        return True
+
+# Instance globale (une par worker)
+drain_controller = DrainController()
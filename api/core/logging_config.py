@@ -1,39 +1,107 @@
+import atexit
+import json
 import logging
 import logging.handlers
+import queue
+import random
 import sys
 from pathlib import Path
 from datetime import datetime
+from typing import Any, Dict, Optional
 
 from .config import settings
 
+# Attributs standard d'un LogRecord (tout le reste est un champ « extra »)
+_RECORD_ATTRIBUTES = frozenset(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime"}
+
+class JsonFormatter(logging.Formatter):
+    """Formatage d'un enregistrement en une ligne JSON"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "timestamp": datetime.utcfromtimestamp(record.created).isoformat(timespec="milliseconds") + "Z",
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage()
+        }
+
+        # Champs structurés (event, user_id, ...) passés via `extra`
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_ATTRIBUTES:
+                entry[key] = value
+
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+class NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    """
+    QueueHandler qui ne bloque jamais l'appelant
+
+    Seule l'interpolation du message est faite dans le thread appelant (la
+    boucle d'événements) ; le formatage complet et les écritures sont faits
+    par le thread du QueueListener. Si la file est pleine, l'enregistrement
+    est abandonné et compté plutôt que de ralentir la requête.
+    """
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Les enregistrements restent dans le processus : la trace d'exception
+        # est formatée plus tard par le thread d'écriture
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+class DrainingQueueListener(logging.handlers.QueueListener):
+    """QueueListener dont l'arrêt attend que la file soit vidée, même pleine"""
+
+    def enqueue_sentinel(self):
+        self.queue.put(self._sentinel)
+
+_queue_handler: Optional[NonBlockingQueueHandler] = None
+_listener: Optional[DrainingQueueListener] = None
+
+def _text_formatter() -> logging.Formatter:
+    return logging.Formatter(
+        fmt="%(asctime)s | %(name)s | %(levelname)s | %(message)s",
+        datefmt="%Y-%m-%d %H:%M:%S"
+    )
+
 def setup_logging():
     """Configuration du système de logging"""
-    
+    global _queue_handler, _listener
+
+    # Reconfiguration : arrêt propre de l'écrivain précédent
+    stop_logging()
+
     # Création du répertoire de logs
     log_dir = Path("logs")
     log_dir.mkdir(exist_ok=True)
-    
-    # Configuration du format des logs
-    log_format = logging.Formatter(
-        fmt="%(asctime)s | %(name)s | %(levelname)s | %(message)s",
-        datefmt="%Y-%m-%d %H:%M:%S"
-    )
-    
+
     # Configuration du logger racine
     root_logger = logging.getLogger()
     root_logger.setLevel(getattr(logging, settings.LOG_LEVEL))
-    
+
     # Suppression des handlers existants
     for handler in root_logger.handlers[:]:
         root_logger.removeHandler(handler)
-    
-    # Handler pour la console
+
+    # Handler pour la console (texte lisible ou JSON selon LOG_FORMAT)
     console_handler = logging.StreamHandler(sys.stdout)
     console_handler.setLevel(logging.INFO)
-    console_handler.setFormatter(log_format)
-    root_logger.addHandler(console_handler)
-    
-    # Handler pour le fichier avec rotation
+    console_handler.setFormatter(JsonFormatter() if settings.LOG_FORMAT == "json" else _text_formatter())
+
+    # Handler pour le fichier avec rotation (une ligne JSON par enregistrement)
     file_handler = logging.handlers.TimedRotatingFileHandler(
         filename=log_dir / settings.LOG_FILE,
         when="midnight",
@@ -42,18 +110,28 @@ def setup_logging():
         encoding="utf-8"
     )
     file_handler.setLevel(getattr(logging, settings.LOG_LEVEL))
-    file_handler.setFormatter(log_format)
-    root_logger.addHandler(file_handler)
-    
+    file_handler.setFormatter(JsonFormatter())
+
+    # Les écritures sont faites par un thread dédié : le logger racine ne fait
+    # que déposer les enregistrements dans une file bornée
+    log_queue = queue.Queue(maxsize=settings.LOG_QUEUE_SIZE)
+    _queue_handler = NonBlockingQueueHandler(log_queue)
+    root_logger.addHandler(_queue_handler)
+
+    _listener = DrainingQueueListener(
+        log_queue, console_handler, file_handler, respect_handler_level=True
+    )
+    _listener.start()
+
     # Configuration spécifique pour l'application
     app_logger = logging.getLogger("api")
     app_logger.setLevel(logging.DEBUG if settings.DEBUG else logging.INFO)
-    
+
     # Désactivation des logs trop verbeux
     logging.getLogger("uvicorn.access").setLevel(logging.WARNING)
     logging.getLogger("httpx").setLevel(logging.WARNING)
     logging.getLogger("tensorflow").setLevel(logging.ERROR)
-    
+
     # Log de démarrage
     logger = logging.getLogger(__name__)
     logger.info("=" * 50)
@@ -62,35 +140,93 @@ def setup_logging():
     logger.info(f"Fichier de log: {log_dir / settings.LOG_FILE}")
     logger.info("=" * 50)
 
+def stop_logging():
+    """Vidage de la file et arrêt du thread d'écriture"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        for handler in _listener.handlers:
+            handler.close()
+        _listener = None
+
+atexit.register(stop_logging)
+
+def logging_stats() -> Dict[str, int]:
+    """État de la file de logs"""
+    if _queue_handler is None:
+        return {"queued": 0, "dropped": 0}
+    return {"queued": _queue_handler.queue.qsize(), "dropped": _queue_handler.dropped}
+
 class StructuredLogger:
-    """Logger structuré pour les événements spécifiques"""
-    
-    def __init__(self, name: str):
+    """
+    Logger structuré pour les événements spécifiques
+
+    Chaque événement porte un nom (`event`) et ses champs en attributs du
+    LogRecord : ils apparaissent tels quels dans les logs JSON. Les
+    événements INFO à fort volume sont échantillonnés selon LOG_SAMPLE_RATES
+    (fraction conservée, 1.0 par défaut) ; le taux appliqué est indiqué dans
+    le champ `sample_rate` pour pouvoir extrapoler les volumes.
+    """
+
+    def __init__(self, name: str, sample_rates: Optional[Dict[str, float]] = None):
         self.logger = logging.getLogger(name)
-    
+        self.sample_rates = settings.LOG_SAMPLE_RATES if sample_rates is None else sample_rates
+
+    def _log(self, level: int, event: str, message: str, **fields: Any):
+        if not self.logger.isEnabledFor(level):
+            return
+
+        rate = self.sample_rates.get(event, 1.0) if level <= logging.INFO else 1.0
+        if rate < 1.0:
+            if random.random() >= rate:
+                return
+            fields["sample_rate"] = rate
+
+        self.logger.log(level, message, extra={"event": event, **fields})
+
     def log_authentication(self, username: str, success: bool, ip: str = "unknown"):
         """Log des tentatives d'authentification"""
         status = "SUCCESS" if success else "FAILED"
-        self.logger.info(f"AUTH_{status} | User: {username} | IP: {ip}")
-    
+        self._log(
+            logging.INFO, "authentication", f"AUTH_{status} | User: {username} | IP: {ip}",
+            username=username, success=success, ip=ip
+        )
+
     def log_prediction(self, user_id: int, category: str, confidence: float, processing_time: float):
         """Log des prédictions"""
-        self.logger.info(
+        self._log(
+            logging.INFO, "prediction",
             f"PREDICTION | User: {user_id} | Category: {category} | "
-            f"Confidence: {confidence:.3f} | Time: {processing_time:.3f}s"
+            f"Confidence: {confidence:.3f} | Time: {processing_time:.3f}s",
+            user_id=user_id, category=category, confidence=confidence, processing_time=processing_time
         )
-    
+
+    def log_request(self, client_ip: str, method: str, url: str, status_code: int, process_time: float):
+        """Log des requêtes HTTP"""
+        self._log(
+            logging.INFO, "request",
+            f"{client_ip} - {method} {url} - Status: {status_code} - Time: {process_time:.3f}s",
+            client_ip=client_ip, method=method, url=url, status_code=status_code, process_time=process_time
+        )
+
     def log_error(self, error_type: str, message: str, user_id: int = None):
         """Log des erreurs"""
         user_info = f"User: {user_id} | " if user_id else ""
-        self.logger.error(f"ERROR_{error_type} | {user_info}{message}")
-    
+        self._log(
+            logging.ERROR, "error", f"ERROR_{error_type} | {user_info}{message}",
+            error_type=error_type, user_id=user_id
+        )
+
     def log_admin_action(self, admin_user: str, action: str, target: str = None):
         """Log des actions administrateur"""
         target_info = f"Target: {target} | " if target else ""
-        self.logger.warning(f"ADMIN_ACTION | Admin: {admin_user} | Action: {action} | {target_info}")
+        self._log(
+            logging.WARNING, "admin_action",
+            f"ADMIN_ACTION | Admin: {admin_user} | Action: {action} | {target_info}",
+            admin_user=admin_user, action=action, target=target
+        )
 
 # Instances globales
 api_logger = StructuredLogger("api")
 security_logger = StructuredLogger("security")
-admin_logger = StructuredLogger("admin") 
\ No newline at end of file
+admin_logger = StructuredLogger("admin")
@@ -0,0 +1,115 @@
+import asyncio
+import logging
+import sys
+import threading
+import time
+import traceback
+from typing import Optional
+
+from .config import settings
+from .metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+LOOP_LAG_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+EVENT_LOOP_LAG = metrics.histogram(
+    "event_loop_lag_seconds",
+    "Retard de la boucle d'événements (réveil programmé contre réveil effectif)",
+    buckets=LOOP_LAG_BUCKETS
+)
+EVENT_LOOP_BLOCKED = metrics.counter(
+    "event_loop_blocked_total",
+    "Blocages de la boucle d'événements au-delà de LOOP_BLOCKING_THRESHOLD"
+)
+
+class EventLoopMonitor:
+    """
+    Mesure continue du retard de la boucle d'événements
+
+    Une tâche se réveille toutes les `interval` secondes ; l'écart entre le
+    réveil programmé et le réveil effectif est le temps pendant lequel la
+    boucle était occupée par d'autres callbacks (histogramme
+    `event_loop_lag_seconds`). Un retard au-delà de `threshold` compte comme
+    un blocage.
+
+    Avec `report_stacks` (mode DEBUG par défaut), un thread de surveillance
+    vérifie les battements de la tâche : si la boucle ne bat plus depuis
+    `threshold`, la pile du thread de la boucle est journalisée pendant le
+    blocage, ce qui désigne l'appel bloquant (SQLAlchemy, bcrypt, PIL...).
+    """
+
+    def __init__(
+        self,
+        interval: Optional[float] = None,
+        threshold: Optional[float] = None,
+        report_stacks: Optional[bool] = None
+    ):
+        self.interval = settings.LOOP_MONITOR_INTERVAL if interval is None else interval
+        self.threshold = settings.LOOP_BLOCKING_THRESHOLD if threshold is None else threshold
+        self.report_stacks = settings.DEBUG if report_stacks is None else report_stacks
+        self.max_lag = 0.0
+        self.blocked = 0
+        self._heartbeat = time.monotonic()
+        self._loop_thread_id: Optional[int] = None
+        self._task: Optional[asyncio.Task] = None
+        self._watchdog: Optional[threading.Thread] = None
+        self._stopped = threading.Event()
+
+    async def start(self):
+        self._loop_thread_id = threading.get_ident()
+        self._heartbeat = time.monotonic()
+        self._stopped.clear()
+        self._task = asyncio.create_task(self._run(), name="event-loop-monitor")
+        if self.report_stacks:
+            self._watchdog = threading.Thread(target=self._watch, name="event-loop-watchdog", daemon=True)
+            self._watchdog.start()
+
+    async def stop(self):
+        self._stopped.set()
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        if self._watchdog is not None:
+            self._watchdog.join(timeout=1.0)
+            self._watchdog = None
+
+    def stats(self) -> dict:
+        return {"max_lag_ms": round(self.max_lag * 1000, 1), "blocked": self.blocked}
+
+    def record(self, lag: float):
+        """Enregistrement d'un retard mesuré"""
+        EVENT_LOOP_LAG.observe(lag)
+        self.max_lag = max(self.max_lag, lag)
+        if lag >= self.threshold:
+            self.blocked += 1
+            EVENT_LOOP_BLOCKED.inc()
+            if not self.report_stacks:
+                logger.warning(f"🐢 Boucle d'événements bloquée {lag * 1000:.0f} ms")
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            expected = loop.time() + self.interval
+            await asyncio.sleep(self.interval)
+            self._heartbeat = time.monotonic()
+            self.record(max(0.0, loop.time() - expected))
+
+    def _watch(self):
+        """Thread de surveillance : pile de la boucle pendant un blocage"""
+        reported_heartbeat = None
+        period = max(self.threshold / 2, 0.005)
+        while not self._stopped.wait(period):
+            heartbeat = self._heartbeat
+            stalled = time.monotonic() - heartbeat - self.interval
+            if stalled < self.threshold or heartbeat == reported_heartbeat:
+                continue
+
+            # Un seul rapport par blocage (le battement n'a pas changé depuis)
+            reported_heartbeat = heartbeat
+            frame = sys._current_frames().get(self._loop_thread_id)
+            if frame is None:
+                continue
+            stack = "".join(traceback.format_stack(frame))
+            logger.warning(f"🐢 Boucle d'événements bloquée depuis {stalled * 1000:.0f} ms, pile :\n{stack}")
@@ -0,0 +1,322 @@
+import threading
+import time
+from bisect import bisect_left
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from prometheus_client import CollectorRegistry, generate_latest, CONTENT_TYPE_LATEST
+from prometheus_client.core import (
+    CounterMetricFamily, GaugeMetricFamily, HistogramMetricFamily, InfoMetricFamily
+)
+from prometheus_client.process_collector import ProcessCollector
+from prometheus_client.registry import Collector
+from prometheus_client.utils import floatToGoString
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+STAGE_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+BATCH_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128)
+
+class _Shard:
+    """Compteurs d'un seul thread"""
+
+    __slots__ = ("counts", "sum")
+
+    def __init__(self, size: int):
+        self.counts = [0] * size
+        self.sum = 0.0
+
+class _ShardedChild:
+    """
+    Valeur d'une série, répartie par thread
+
+    Chaque thread écrit dans son propre shard (`threading.local`) : aucune
+    écriture concurrente, donc aucun verrou sur le chemin critique. Le verrou
+    ne sert qu'à l'enregistrement d'un nouveau thread. Les shards sont sommés
+    à la collecte.
+    """
+
+    __slots__ = ("size", "_local", "_shards", "_lock")
+
+    def __init__(self, size: int):
+        self.size = size
+        self._local = threading.local()
+        self._shards: List[_Shard] = []
+        self._lock = threading.Lock()
+
+    def _shard(self) -> _Shard:
+        shard = getattr(self._local, "shard", None)
+        if shard is None:
+            shard = self._local.shard = _Shard(self.size)
+            with self._lock:
+                self._shards.append(shard)
+        return shard
+
+    def snapshot(self) -> Tuple[List[int], float]:
+        counts = [0] * self.size
+        total = 0.0
+        for shard in list(self._shards):
+            for i, count in enumerate(shard.counts):
+                counts[i] += count
+            total += shard.sum
+        return counts, total
+
+class HistogramChild(_ShardedChild):
+    __slots__ = ("bounds",)
+
+    def __init__(self, bounds: Tuple[float, ...]):
+        super().__init__(len(bounds) + 1)
+        self.bounds = bounds
+
+    def observe(self, value: float):
+        shard = self._shard()
+        shard.counts[bisect_left(self.bounds, value)] += 1
+        shard.sum += value
+
+class ValueChild(_ShardedChild):
+    __slots__ = ()
+
+    def __init__(self):
+        super().__init__(0)
+
+    def inc(self, amount: float = 1.0):
+        self._shard().sum += amount
+
+    def dec(self, amount: float = 1.0):
+        self._shard().sum -= amount
+
+    @property
+    def value(self) -> float:
+        return self.snapshot()[1]
+
+class _LabeledMetric:
+    """Métrique avec séries par jeu de labels"""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children: Dict[Tuple[str, ...], Any] = {}
+        self._lock = threading.Lock()
+        if not self.labelnames:
+            # Série unique exposée dès la déclaration (valeur 0)
+            self.labels()
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def labels(self, *values):
+        key = tuple(str(value) for value in values)
+        child = self._children.get(key)
+        if child is None:
+            if len(key) != len(self.labelnames):
+                raise ValueError(f"{self.name} attend les labels {self.labelnames}")
+            with self._lock:
+                child = self._children.setdefault(key, self._new_child())
+        return child
+
+    def children(self) -> List[Tuple[Tuple[str, ...], Any]]:
+        return list(self._children.items())
+
+class Histogram(_LabeledMetric):
+    def __init__(self, name, documentation, labelnames=(), buckets: Iterable[float] = LATENCY_BUCKETS):
+        self.bounds = tuple(sorted(float(b) for b in buckets))
+        super().__init__(name, documentation, labelnames)
+
+    def _new_child(self):
+        return HistogramChild(self.bounds)
+
+    def observe(self, value: float):
+        self.labels().observe(value)
+
+    def collect(self):
+        family = HistogramMetricFamily(self.name, self.documentation, labels=self.labelnames)
+        for labels, child in self.children():
+            counts, total = child.snapshot()
+            buckets, cumulative = [], 0
+            for bound, count in zip(self.bounds + (float("inf"),), counts):
+                cumulative += count
+                buckets.append((floatToGoString(bound), cumulative))
+            family.add_metric(list(labels), buckets, total)
+        yield family
+
+class Counter(_LabeledMetric):
+    def _new_child(self):
+        return ValueChild()
+
+    def inc(self, amount: float = 1.0):
+        self.labels().inc(amount)
+
+    def collect(self):
+        family = CounterMetricFamily(self.name, self.documentation, labels=self.labelnames)
+        for labels, child in self.children():
+            family.add_metric(list(labels), child.value)
+        yield family
+
+class Gauge(Counter):
+    def dec(self, amount: float = 1.0):
+        self.labels().dec(amount)
+
+    def collect(self):
+        family = GaugeMetricFamily(self.name, self.documentation, labels=self.labelnames)
+        for labels, child in self.children():
+            family.add_metric(list(labels), child.value)
+        yield family
+
+class MetricsRegistry(Collector):
+    """
+    Registre des métriques de l'API, exposé au format Prometheus
+
+    Les histogrammes et compteurs sont partitionnés par thread (voir
+    `_ShardedChild`) : une observation coûte un accès `threading.local` et
+    deux additions, sans verrou. Les valeurs déjà tenues ailleurs (caches,
+    files d'attente) sont lues par des callbacks au moment de la collecte,
+    sans aucun coût sur le chemin des requêtes.
+    """
+
+    content_type = CONTENT_TYPE_LATEST
+
+    def __init__(self, process_metrics: bool = True):
+        self._metrics: Dict[str, _LabeledMetric] = {}
+        self._gauge_callbacks: Dict[str, Tuple[str, Callable[[], float]]] = {}
+        self._caches: Dict[str, Callable[[], Dict[str, Any]]] = {}
+        self._info: Dict[str, Tuple[str, Dict[str, str]]] = {}
+        self._lock = threading.Lock()
+
+        self.registry = CollectorRegistry(auto_describe=False)
+        self.registry.register(self)
+        if process_metrics:
+            ProcessCollector(registry=self.registry)
+
+    def _get_or_create(self, cls, name: str, *args, **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, *args, **kwargs)
+            elif type(metric) is not cls:
+                raise ValueError(f"Métrique {name} déjà déclarée avec un autre type")
+            return metric
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (), buckets=LATENCY_BUCKETS) -> Histogram:
+        return self._get_or_create(Histogram, name, documentation, labelnames, buckets)
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._get_or_create(Counter, name, documentation, labelnames)
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self._get_or_create(Gauge, name, documentation, labelnames)
+
+    def get(self, name: str) -> Optional[_LabeledMetric]:
+        return self._metrics.get(name)
+
+    def gauge_callback(self, name: str, documentation: str, func: Callable[[], float]):
+        """Jauge lue à la collecte (profondeur de file, etc.)"""
+        self._gauge_callbacks[name] = (documentation, func)
+
+    def register_cache(self, name: str, stats: Callable[[], Dict[str, Any]]):
+        """Cache dont `stats()` fournit hits, misses, size et hit_ratio"""
+        self._caches[name] = stats
+
+    def set_info(self, name: str, documentation: str, values: Dict[str, Any]):
+        self._info[name] = (documentation, {key: str(value) for key, value in values.items()})
+
+    def collect(self):
+        for metric in list(self._metrics.values()):
+            yield from metric.collect()
+
+        for name, (documentation, func) in list(self._gauge_callbacks.items()):
+            try:
+                yield GaugeMetricFamily(name, documentation, value=func())
+            except Exception:
+                continue
+
+        if self._caches:
+            hits = CounterMetricFamily("cache_hits_total", "Succès par cache", labels=["cache"])
+            misses = CounterMetricFamily("cache_misses_total", "Échecs par cache", labels=["cache"])
+            ratio = GaugeMetricFamily("cache_hit_ratio", "Taux de succès par cache", labels=["cache"])
+            size = GaugeMetricFamily("cache_entries", "Entrées par cache", labels=["cache"])
+            for name, stats in list(self._caches.items()):
+                try:
+                    values = stats()
+                except Exception:
+                    continue
+                hits.add_metric([name], values.get("hits", 0))
+                misses.add_metric([name], values.get("misses", 0))
+                ratio.add_metric([name], values.get("hit_ratio", 0.0))
+                size.add_metric([name], values.get("size", 0))
+            yield from (hits, misses, ratio, size)
+
+        for name, (documentation, values) in list(self._info.items()):
+            yield InfoMetricFamily(name, documentation, value=values)
+
+    def render(self) -> bytes:
+        """Exposition au format texte Prometheus"""
+        return generate_latest(self.registry)
+
+# Registre global des métriques
+metrics = MetricsRegistry()
+
+# Métriques d'inférence
+INFERENCE_STAGE_SECONDS = metrics.histogram(
+    "prediction_stage_duration_seconds",
+    "Durée des étapes d'une prédiction (read, decode, resize, normalize, model, postprocess, history)",
+    ("stage",),
+    buckets=STAGE_BUCKETS
+)
+PREDICTIONS = metrics.counter("predictions_total", "Prédictions par statut", ("status",))
+BATCH_SIZE = metrics.histogram(
+    "prediction_batch_size",
+    "Nombre d'images par appel au modèle",
+    buckets=BATCH_SIZE_BUCKETS
+)
+INFERENCE_QUEUE_DEPTH = metrics.gauge(
+    "prediction_queue_depth",
+    "Prédictions en attente ou en cours d'exécution dans le pool d'inférence"
+)
+
+# Clé de `scope["state"]` : instant d'arrivée de la requête (perf_counter),
+# posée par le pipeline de middlewares avant la réception du corps
+REQUEST_START = "request_start"
+
+class StageTimer:
+    """
+    Chronométrage des étapes d'une requête de prédiction
+
+    `mark(stage)` attribue à `stage` le temps écoulé depuis la marque
+    précédente et l'ajoute à l'histogramme des étapes. Les durées sont
+    renvoyées au client dans le header `Server-Timing`.
+    """
+
+    __slots__ = ("timings", "_last")
+
+    def __init__(self, start: Optional[float] = None):
+        self.timings: Dict[str, float] = {}
+        self._last = time.perf_counter() if start is None else start
+
+    @classmethod
+    def from_scope(cls, scope) -> "StageTimer":
+        """
+        Chronométrage démarré à l'arrivée de la requête
+
+        FastAPI reçoit et analyse le corps (multipart) avant d'appeler la
+        route : la première marque (`read`) couvre donc cette réception.
+        """
+        return cls(scope.get("state", {}).get(REQUEST_START))
+
+    def mark(self, stage: str) -> float:
+        now = time.perf_counter()
+        elapsed = now - self._last
+        self._last = now
+        self.timings[stage] = self.timings.get(stage, 0.0) + elapsed
+        INFERENCE_STAGE_SECONDS.labels(stage).observe(elapsed)
+        return elapsed
+
+    def merge(self, other: "StageTimer"):
+        """Cumul des durées d'un autre chronométrage (lot d'images)"""
+        for stage, elapsed in other.timings.items():
+            self.timings[stage] = self.timings.get(stage, 0.0) + elapsed
+
+    def as_milliseconds(self) -> Dict[str, float]:
+        return {stage: round(elapsed * 1000, 3) for stage, elapsed in self.timings.items()}
+
+    def server_timing(self) -> str:
+        """Valeur du header Server-Timing (durées en millisecondes)"""
+        return ", ".join(f"{stage};dur={elapsed * 1000:.2f}" for stage, elapsed in self.timings.items())
@@ -1,175 +1,582 @@
-from fastapi import Request, Response, HTTPException
+from fastapi import HTTPException
 from fastapi.responses import JSONResponse
-from starlette.middleware.base import BaseHTTPMiddleware
-from starlette.types import ASGIApp
+from starlette.datastructures import Headers, MutableHeaders, URL
+from starlette.responses import Response
+from starlette.routing import Match
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+import asyncio
 import time
+import math
+import zlib
+import hashlib
 import logging
-from typing import Dict, Any
+from typing import Dict, Any, Optional, Sequence, Tuple
 from collections import defaultdict
-from datetime import datetime, timedelta
-import asyncio
 
 from .config import settings
+from .ratelimit import create_rate_limit_store, request_cost, RateLimitResult
+from .security import verify_token
+from .api_keys import api_key_manager
+from .metrics import MetricsRegistry, metrics, REQUEST_START
+from .logging_config import api_logger
+from .lifecycle import DrainController, drain_controller
+
+try:
+    import brotli
+except ImportError:  # brotli est optionnel : compression gzip seule
+    brotli = None
 
 logger = logging.getLogger(__name__)
 
-class RateLimitMiddleware(BaseHTTPMiddleware):
-    """Middleware de limitation du taux de requêtes"""
-    
-    def __init__(self, app: ASGIApp):
-        super().__init__(app)
-        self.requests = defaultdict(list)
-        self.max_requests = settings.RATE_LIMIT_REQUESTS
+ANONYMOUS = "anonymous"
+
+# Headers posés sur toutes les réponses de l'API
+BASIC_SECURITY_HEADERS = {
+    "X-Content-Type-Options": "nosniff",
+    "X-Frame-Options": "DENY",
+    "X-XSS-Protection": "1; mode=block"
+}
+
+STRICT_SECURITY_HEADERS = {
+    **BASIC_SECURITY_HEADERS,
+    "Strict-Transport-Security": "max-age=31536000; includeSubDomains",
+    "Referrer-Policy": "strict-origin-when-cross-origin",
+    "Content-Security-Policy": "default-src 'self'",
+    "Permissions-Policy": "geolocation=(), microphone=(), camera=()"
+}
+
+class RequestContext:
+    """État d'une requête HTTP partagé par les étapes d'un pipeline"""
+
+    __slots__ = ("scope", "headers", "path", "method", "start_time", "status_code", "state")
+
+    def __init__(self, scope: Scope):
+        self.scope = scope
+        self.headers = Headers(scope=scope)
+        self.path: str = scope["path"]
+        self.method: str = scope["method"]
+        self.start_time = time.perf_counter()
+        self.status_code: Optional[int] = None
+        self.state: Dict[str, Any] = {}
+
+    @property
+    def client_ip(self) -> str:
+        client = self.scope.get("client")
+        return client[0] if client else "unknown"
+
+    @property
+    def url(self) -> str:
+        return str(URL(scope=self.scope))
+
+    @property
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.start_time
+
+class MiddlewareStage:
+    """
+    Étape d'un pipeline de middlewares
+
+    - `on_request` : avant l'application ; renvoyer une réponse court-circuite
+      l'application (et les étapes suivantes)
+    - `wrap_receive` : interception du corps de la requête au fil de l'eau
+    - `on_response_start` : modification des headers de la réponse
+    - `wrap_send` : interception des messages de réponse, après les headers
+      posés par `on_response_start` (transformation du corps)
+    - `on_complete` : après l'envoi de la réponse, sur exception ou sur
+      annulation (`asyncio.CancelledError`)
+    """
+
+    async def on_request(self, ctx: RequestContext) -> Optional[Response]:
+        return None
+
+    def wrap_receive(self, ctx: RequestContext, receive: Receive) -> Receive:
+        return receive
+
+    def on_response_start(self, ctx: RequestContext, headers: MutableHeaders):
+        pass
+
+    def wrap_send(self, ctx: RequestContext, send: Send) -> Send:
+        return send
+
+    def on_complete(self, ctx: RequestContext, error: Optional[BaseException]):
+        pass
+
+def _overrides(stage: MiddlewareStage, hook: str) -> bool:
+    return getattr(type(stage), hook) is not getattr(MiddlewareStage, hook)
+
+class PipelineMiddleware:
+    """
+    Middleware ASGI exécutant plusieurs étapes en une seule passe
+
+    Contrairement à `BaseHTTPMiddleware`, aucune tâche ni flux intermédiaire
+    n'est créé : la requête va directement à l'application et seul le message
+    `http.response.start` est intercepté pour poser les headers. Les réponses
+    en streaming passent sans être mises en tampon. Les étapes sont appelées
+    dans l'ordre de la liste.
+    """
+
+    def __init__(self, app: ASGIApp, stages: Sequence[MiddlewareStage]):
+        self.app = app
+        self.stages = list(stages)
+        # Seules les étapes qui redéfinissent un hook sont appelées
+        self._request_hooks = [s for s in self.stages if _overrides(s, "on_request")]
+        self._receive_hooks = [s for s in self.stages if _overrides(s, "wrap_receive")]
+        self._response_hooks = [s for s in self.stages if _overrides(s, "on_response_start")]
+        self._send_hooks = [s for s in self.stages if _overrides(s, "wrap_send")]
+        self._complete_hooks = [s for s in self.stages if _overrides(s, "on_complete")]
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        ctx = RequestContext(scope)
+        # Instant d'arrivée transmis aux routes (étape `read` des prédictions)
+        scope.setdefault("state", {})[REQUEST_START] = ctx.start_time
+        response_hooks = self._response_hooks
+        for stage in self._send_hooks:
+            send = stage.wrap_send(ctx, send)
+
+        async def send_wrapper(message: Message):
+            if message["type"] == "http.response.start":
+                ctx.status_code = message["status"]
+                if response_hooks:
+                    headers = MutableHeaders(scope=message)
+                    for stage in response_hooks:
+                        stage.on_response_start(ctx, headers)
+            await send(message)
+
+        # Les hooks de fin s'exécutent aussi si la tâche est annulée
+        # (CancelledError : client déconnecté, arrêt du serveur), sans quoi
+        # une requête resterait comptée en cours pendant le drainage
+        error: Optional[BaseException] = None
+        try:
+            early_response = None
+            for stage in self._request_hooks:
+                early_response = await stage.on_request(ctx)
+                if early_response is not None:
+                    break
+
+            if early_response is not None:
+                await early_response(scope, receive, send_wrapper)
+            else:
+                for stage in self._receive_hooks:
+                    receive = stage.wrap_receive(ctx, receive)
+                await self.app(scope, receive, send_wrapper)
+        except BaseException as e:
+            error = e
+            raise
+        finally:
+            for stage in self._complete_hooks:
+                stage.on_complete(ctx, error)
+
+class RequestRateLimited(HTTPException):
+    """Quota épuisé pendant la réception du corps (volume au-delà du Content-Length annoncé)"""
+
+    def __init__(self, limit: int, retry_after: float):
+        retry_after = max(1, math.ceil(retry_after))
+        super().__init__(
+            status_code=429,
+            detail=f"Quota de {limit} unités dépassé pendant l'envoi",
+            headers={"Retry-After": str(retry_after)}
+        )
+
+class RateLimitStage(MiddlewareStage):
+    """
+    Limitation du taux de requêtes
+
+    Chaque requête consomme un coût (route + volume envoyé) sur le quota de
+    son identité : l'utilisateur du token ou de la clé API si présent, sinon
+    l'IP. Le quota dépend du rôle (RATE_LIMIT_ROLE_QUOTAS).
+
+    Le volume est d'abord estimé sur `Content-Length` ; les octets réellement
+    reçus au-delà (corps en chunked, header mensonger) sont facturés au fil
+    de la réception, et la lecture est interrompue par une 429 si le quota
+    est épuisé.
+    """
+
+    exempt_paths = frozenset({"/health", "/livez", "/readyz", "/", "/docs", "/redoc", settings.METRICS_PATH})
+
+    def __init__(self):
         self.window_seconds = settings.RATE_LIMIT_WINDOW
-        self.cleanup_task = None
-        self._start_cleanup_task()
-    
-    def _start_cleanup_task(self):
-        """Démarrage de la tâche de nettoyage périodique"""
-        async def cleanup():
-            while True:
-                await asyncio.sleep(300)  # Nettoyage toutes les 5 minutes
-                await self._cleanup_old_requests()
-        
-        self.cleanup_task = asyncio.create_task(cleanup())
-    
-    async def _cleanup_old_requests(self):
-        """Nettoyage des anciennes requêtes"""
-        cutoff_time = datetime.utcnow() - timedelta(seconds=self.window_seconds)
-        
-        for client_id in list(self.requests.keys()):
-            self.requests[client_id] = [
-                req_time for req_time in self.requests[client_id]
-                if req_time > cutoff_time
-            ]
-            
-            if not self.requests[client_id]:
-                del self.requests[client_id]
-    
-    def _get_client_identifier(self, request: Request) -> str:
+        self.quotas = {ANONYMOUS: settings.RATE_LIMIT_REQUESTS, **settings.RATE_LIMIT_ROLE_QUOTAS}
+        self.stores = {
+            role: create_rate_limit_store(limit, self.window_seconds, namespace=f"{role}:")
+            for role, limit in self.quotas.items()
+        }
+
+    def _get_client_identifier(self, ctx: RequestContext) -> str:
         """Identification du client (IP + User-Agent)"""
-        client_ip = request.client.host if request.client else "unknown"
-        user_agent = request.headers.get("user-agent", "unknown")
-        return f"{client_ip}:{hash(user_agent)}"
-    
-    async def dispatch(self, request: Request, call_next):
-        """Traitement des requêtes avec limitation du taux"""
+        user_agent = ctx.headers.get("user-agent", "unknown")
+        # Empreinte stable : hash() est salé par processus, chaque worker
+        # écrirait le même client sous une clé Redis différente
+        digest = hashlib.blake2b(user_agent.encode(), digest_size=8).hexdigest()
+        return f"{ctx.client_ip}:{digest}"
+
+    def _get_identity(self, ctx: RequestContext) -> Tuple[str, str]:
+        """Identité (clé de quota) et rôle ; anonyme si aucune authentification valide"""
+        authorization = ctx.headers.get("authorization", "")
+        if authorization[:7].lower() == "bearer ":
+            try:
+                token_data = verify_token(authorization[7:])
+                return f"user:{token_data.user_id}", token_data.role
+            except HTTPException:
+                pass
+
+        api_key = ctx.headers.get("x-api-key")
+        if api_key:
+            key_info = api_key_manager.authenticate(api_key, record_use=False)
+            if key_info is not None:
+                return f"user:{key_info['user_id']}", key_info["role"]
+
+        return self._get_client_identifier(ctx), ANONYMOUS
+
+    async def on_request(self, ctx: RequestContext) -> Optional[Response]:
         # Exemption pour les routes de santé
-        if request.url.path in ["/health", "/", "/docs", "/redoc"]:
-            return await call_next(request)
-        
-        client_id = self._get_client_identifier(request)
-        now = datetime.utcnow()
-        
-        # Nettoyage des anciennes requêtes pour ce client
-        cutoff_time = now - timedelta(seconds=self.window_seconds)
-        self.requests[client_id] = [
-            req_time for req_time in self.requests[client_id]
-            if req_time > cutoff_time
-        ]
-        
+        if ctx.path in self.exempt_paths:
+            return None
+
+        client_id, role = self._get_identity(ctx)
+        store = self.stores.get(role, self.stores[ANONYMOUS])
+        limit = self.quotas.get(role, self.quotas[ANONYMOUS])
+
+        content_length = ctx.headers.get("content-length", "")
+        cost = min(
+            request_cost(ctx.path, int(content_length) if content_length.isdigit() else 0),
+            limit
+        )
+        result = await store.hit(client_id, cost)
+
         # Vérification de la limite
-        if len(self.requests[client_id]) >= self.max_requests:
+        if not result.allowed:
+            retry_after = max(1, math.ceil(result.retry_after))
             logger.warning(f"Rate limit dépassé pour {client_id}")
             return JSONResponse(
                 status_code=429,
                 content={
                     "error": "Trop de requêtes",
-                    "detail": f"Limite de {self.max_requests} requêtes par {self.window_seconds}s dépassée",
-                    "retry_after": self.window_seconds
+                    "detail": f"Quota de {limit} unités par {self.window_seconds}s dépassé (coût de la requête : {cost})",
+                    "retry_after": retry_after
                 },
-                headers={"Retry-After": str(self.window_seconds)}
+                headers={"Retry-After": str(retry_after)}
             )
-        
-        # Enregistrement de la requête
-        self.requests[client_id].append(now)
-        
+
+        ctx.state["ratelimit"] = (result, cost)
+        if ctx.method not in ("GET", "HEAD", "OPTIONS"):
+            prepaid = int(content_length) if content_length.isdigit() else 0
+            ctx.state["ratelimit_body"] = (client_id, store, limit, prepaid)
+        return None
+
+    def wrap_receive(self, ctx: RequestContext, receive: Receive) -> Receive:
+        body = ctx.state.get("ratelimit_body")
+        if body is None:
+            return receive
+
+        client_id, store, limit, prepaid = body
+        unit = settings.RATE_LIMIT_COST_BYTES_UNIT
+        charged_units = prepaid // unit
+        received = 0
+
+        async def metered_receive() -> Message:
+            nonlocal received, charged_units
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                units = received // unit
+                if units > charged_units:
+                    # Tranches reçues au-delà de ce que Content-Length annonçait
+                    extra, charged_units = units - charged_units, units
+                    result = await store.hit(client_id, extra)
+                    _, cost = ctx.state["ratelimit"]
+                    ctx.state["ratelimit"] = (result, cost + extra)
+                    if not result.allowed:
+                        logger.warning(f"Rate limit dépassé pendant l'envoi pour {client_id} ({ctx.path})")
+                        raise RequestRateLimited(limit, result.retry_after)
+            return message
+
+        return metered_receive
+
+    async def charge_user(self, user_id: int, role: str, cost: int) -> RateLimitResult:
+        """
+        Coût hors requête HTTP (image d'un flux WebSocket) sur le quota de
+        l'utilisateur : même clé et même quota que ses requêtes HTTP
+        """
+        store = self.stores.get(role, self.stores[ANONYMOUS])
+        limit = self.quotas.get(role, self.quotas[ANONYMOUS])
+        return await store.hit(f"user:{user_id}", min(cost, limit))
+
+    def on_response_start(self, ctx: RequestContext, headers: MutableHeaders):
         # Ajout des headers de rate limiting
-        response = await call_next(request)
-        
-        remaining = max(0, self.max_requests - len(self.requests[client_id]))
-        reset_time = int((now + timedelta(seconds=self.window_seconds)).timestamp())
-        
-        response.headers["X-RateLimit-Limit"] = str(self.max_requests)
-        response.headers["X-RateLimit-Remaining"] = str(remaining)
-        response.headers["X-RateLimit-Reset"] = str(reset_time)
-        
-        return response
-
-class SecurityHeadersMiddleware(BaseHTTPMiddleware):
-    """Middleware pour les headers de sécurité"""
-    
-    async def dispatch(self, request: Request, call_next):
-        response = await call_next(request)
-        
-        # Headers de sécurité
-        security_headers = {
-            "X-Content-Type-Options": "nosniff",
-            "X-Frame-Options": "DENY",
-            "X-XSS-Protection": "1; mode=block",
-            "Strict-Transport-Security": "max-age=31536000; includeSubDomains",
-            "Referrer-Policy": "strict-origin-when-cross-origin",
-            "Content-Security-Policy": "default-src 'self'",
-            "Permissions-Policy": "geolocation=(), microphone=(), camera=()"
-        }
-        
-        for header, value in security_headers.items():
-            response.headers[header] = value
-        
-        return response
+        decision = ctx.state.get("ratelimit")
+        if decision is None:
+            return
 
-class LoggingMiddleware(BaseHTTPMiddleware):
-    """Middleware de logging des requêtes"""
-    
-    async def dispatch(self, request: Request, call_next):
-        start_time = time.time()
-        
-        # Informations de la requête
-        client_ip = request.client.host if request.client else "unknown"
-        method = request.method
-        url = str(request.url)
-        user_agent = request.headers.get("user-agent", "unknown")
-        
-        # Traitement de la requête
-        try:
-            response = await call_next(request)
-            
-            # Calcul du temps de traitement
-            process_time = time.time() - start_time
-            
-            # Logging de la requête
-            logger.info(
-                f"{client_ip} - {method} {url} - "
-                f"Status: {response.status_code} - "
-                f"Time: {process_time:.3f}s"
+        result, cost = decision
+        headers["X-RateLimit-Limit"] = str(result.limit)
+        headers["X-RateLimit-Remaining"] = str(result.remaining)
+        headers["X-RateLimit-Reset"] = str(int(time.time() + result.reset_after))
+        headers["X-RateLimit-Cost"] = str(cost)
+
+    async def close(self):
+        """Fermeture des stores (connexion Redis) à l'arrêt du worker"""
+        for store in {id(store): store for store in self.stores.values()}.values():
+            await store.close()
+
+class DrainStage(MiddlewareStage):
+    """
+    Comptage des requêtes en cours et refus des nouvelles pendant le drainage
+
+    Une requête compte jusqu'à la fin de l'envoi de sa réponse (flux compris).
+    Les sondes et les métriques restent servies pendant le drainage.
+    """
+
+    exempt_paths = frozenset({"/health", "/livez", "/readyz", settings.METRICS_PATH})
+
+    def __init__(self, controller: Optional[DrainController] = None):
+        self.controller = controller or drain_controller
+
+    async def on_request(self, ctx: RequestContext) -> Optional[Response]:
+        if ctx.path in self.exempt_paths:
+            return None
+
+        if self.controller.draining:
+            return JSONResponse(
+                status_code=503,
+                content={"error": "Service en cours d'arrêt", "detail": "Réessayer sur une autre instance"},
+                headers={"Retry-After": "1", "Connection": "close"}
             )
-            
-            # Ajout du header de temps de traitement
-            response.headers["X-Process-Time"] = str(process_time)
-            
-            return response
-            
-        except Exception as e:
-            process_time = time.time() - start_time
-            
+
+        self.controller.enter()
+        ctx.state["in_flight"] = True
+        return None
+
+    def on_complete(self, ctx: RequestContext, error: Optional[BaseException]):
+        if ctx.state.pop("in_flight", False):
+            self.controller.leave()
+
+class SecurityHeadersStage(MiddlewareStage):
+    """Headers de sécurité"""
+
+    def __init__(self, security_headers: Optional[Dict[str, str]] = None):
+        self.security_headers = dict(security_headers or STRICT_SECURITY_HEADERS)
+
+    def on_response_start(self, ctx: RequestContext, headers: MutableHeaders):
+        for header, value in self.security_headers.items():
+            headers[header] = value
+
+class LoggingStage(MiddlewareStage):
+    """Logging des requêtes (événement `request`, échantillonné)"""
+
+    def on_response_start(self, ctx: RequestContext, headers: MutableHeaders):
+        # Ajout du header de temps de traitement
+        headers["X-Process-Time"] = str(ctx.elapsed)
+
+    def on_complete(self, ctx: RequestContext, error: Optional[BaseException]):
+        process_time = ctx.elapsed
+
+        if error is None:
+            api_logger.log_request(ctx.client_ip, ctx.method, ctx.url, ctx.status_code, process_time)
+        elif isinstance(error, asyncio.CancelledError):
+            logger.info(f"{ctx.client_ip} - {ctx.method} {ctx.url} - Annulée - Time: {process_time:.3f}s")
+        else:
             logger.error(
-                f"{client_ip} - {method} {url} - "
-                f"Error: {str(e)} - "
+                f"{ctx.client_ip} - {ctx.method} {ctx.url} - "
+                f"Error: {str(error)} - "
                 f"Time: {process_time:.3f}s"
             )
-            
-            raise e
 
-class ValidationMiddleware(BaseHTTPMiddleware):
-    """Middleware de validation des requêtes"""
-    
-    def __init__(self, app: ASGIApp):
-        super().__init__(app)
+def negotiate_encoding(accept_encoding: str) -> Optional[str]:
+    """
+    Choix du codage de contenu selon `Accept-Encoding`
+
+    Le q le plus élevé l'emporte ; à égalité, brotli (si installé) est
+    préféré à gzip. `identity` seul, `q=0` ou un header absent : aucun codage.
+    """
+    if not accept_encoding:
+        return None
+
+    preferences: Dict[str, float] = {}
+    for item in accept_encoding.split(","):
+        coding, _, params = item.partition(";")
+        quality = 1.0
+        params = params.strip().lower()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        preferences[coding.strip().lower()] = quality
+
+    supported = ("br", "gzip") if brotli is not None else ("gzip",)
+    best, best_quality = None, 0.0
+    for coding in supported:
+        quality = preferences.get(coding, preferences.get("*", 0.0))
+        if quality > best_quality:
+            best, best_quality = coding, quality
+    return best
+
+class _GzipEncoder:
+    def __init__(self, level: int):
+        self._compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+    def compress(self, data: bytes, final: bool) -> bytes:
+        # Vidage à chaque morceau : un flux reste lisible au fil de l'eau
+        return self._compressor.compress(data) + self._compressor.flush(zlib.Z_FINISH if final else zlib.Z_SYNC_FLUSH)
+
+class _BrotliEncoder:
+    def __init__(self, quality: int):
+        self._compressor = brotli.Compressor(quality=quality)
+
+    def compress(self, data: bytes, final: bool) -> bytes:
+        output = self._compressor.process(data)
+        return output + (self._compressor.finish() if final else self._compressor.flush())
+
+class CompressionStage(MiddlewareStage):
+    """
+    Compression des réponses (gzip, ou brotli si le paquet est installé)
+
+    Le codage est négocié sur `Accept-Encoding`. Le début de la réponse est
+    retenu jusqu'au premier morceau du corps : une réponse complète sous le
+    seuil `minimum_size`, déjà codée ou d'un type non compressible part telle
+    quelle. Les réponses en streaming sont compressées morceau par morceau,
+    chacun étant vidé aussitôt pour ne rien retarder.
+    """
+
+    def __init__(
+        self,
+        minimum_size: Optional[int] = None,
+        content_types: Optional[Sequence[str]] = None,
+        gzip_level: Optional[int] = None,
+        brotli_quality: Optional[int] = None
+    ):
+        self.minimum_size = settings.COMPRESSION_MINIMUM_SIZE if minimum_size is None else minimum_size
+        self.content_types = tuple(settings.COMPRESSIBLE_CONTENT_TYPES if content_types is None else content_types)
+        self.gzip_level = gzip_level or settings.COMPRESSION_GZIP_LEVEL
+        self.brotli_quality = brotli_quality or settings.COMPRESSION_BROTLI_QUALITY
+
+    def _encoder(self, coding: str):
+        if coding == "br":
+            return _BrotliEncoder(self.brotli_quality)
+        return _GzipEncoder(self.gzip_level)
+
+    def _compressible(self, message: Message, headers: MutableHeaders) -> bool:
+        status = message["status"]
+        return (
+            200 <= status and status not in (204, 206, 304)
+            and "content-encoding" not in headers
+            and headers.get("content-type", "").startswith(self.content_types)
+        )
+
+    def wrap_send(self, ctx: RequestContext, send: Send) -> Send:
+        coding = negotiate_encoding(ctx.headers.get("accept-encoding", "")) if ctx.method != "HEAD" else None
+        pending_start: Optional[Message] = None
+        encoder = None
+
+        async def compressing_send(message: Message):
+            nonlocal pending_start, encoder
+
+            if message["type"] == "http.response.start":
+                # Retenu jusqu'au premier morceau du corps
+                pending_start = message
+                return
+
+            if message["type"] != "http.response.body" or pending_start is None:
+                if encoder is not None and message["type"] == "http.response.body":
+                    more_body = message.get("more_body", False)
+                    message = {**message, "body": encoder.compress(message.get("body", b""), final=not more_body)}
+                await send(message)
+                return
+
+            start, pending_start = pending_start, None
+            headers = MutableHeaders(scope=start)
+            body = message.get("body", b"")
+            more_body = message.get("more_body", False)
+
+            if self._compressible(start, headers):
+                headers.add_vary_header("Accept-Encoding")
+                if coding is not None and (more_body or len(body) >= self.minimum_size):
+                    encoder = self._encoder(coding)
+                    body = encoder.compress(body, final=not more_body)
+                    headers["Content-Encoding"] = coding
+                    if more_body:
+                        del headers["Content-Length"]
+                    else:
+                        headers["Content-Length"] = str(len(body))
+                    # Le corps change d'octets : l'ETag ne peut plus être fort
+                    etag = headers.get("etag")
+                    if etag and not etag.startswith("W/"):
+                        headers["ETag"] = f"W/{etag}"
+                    message = {**message, "body": body}
+
+            await send(start)
+            await send(message)
+
+        return compressing_send
+
+class RequestBodyTooLarge(HTTPException):
+    """Corps de requête au-delà de la limite, détecté pendant la réception"""
+
+    def __init__(self, limit: int):
+        super().__init__(
+            status_code=413,
+            detail=f"Contenu trop volumineux (taille maximale : {limit / (1024*1024):.1f}MB)"
+        )
+
+class BodySizeLimitStage(MiddlewareStage):
+    """
+    Limite de taille du corps des requêtes, appliquée pendant la réception
+
+    Un `Content-Length` trop grand est refusé avant toute lecture. Sinon
+    (corps en chunked, ou header mensonger), les octets sont comptés à chaque
+    message `http.request` et la lecture est interrompue par une 413 dès que
+    la limite est franchie : le corps n'est jamais mis en tampon en entier.
+    """
+
+    def __init__(self, default_limit: Optional[int] = None, route_limits: Optional[Dict[str, int]] = None):
+        self.default_limit = default_limit or settings.MAX_REQUEST_BODY_SIZE
+        self.route_limits = settings.REQUEST_BODY_LIMITS if route_limits is None else route_limits
+
+    async def on_request(self, ctx: RequestContext) -> Optional[Response]:
+        if ctx.method in ("GET", "HEAD", "OPTIONS"):
+            return None
+
+        limit = self.route_limits.get(ctx.path, self.default_limit)
+        content_length = ctx.headers.get("content-length", "")
+        if content_length.isdigit() and int(content_length) > limit:
+            error = RequestBodyTooLarge(limit)
+            return JSONResponse(status_code=error.status_code, content={"detail": error.detail})
+
+        ctx.state["body_limit"] = limit
+        return None
+
+    def wrap_receive(self, ctx: RequestContext, receive: Receive) -> Receive:
+        limit = ctx.state.get("body_limit")
+        if limit is None:
+            return receive
+
+        received = 0
+
+        async def limited_receive() -> Message:
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > limit:
+                    logger.warning(f"Corps de requête interrompu au-delà de {limit} octets ({ctx.path})")
+                    raise RequestBodyTooLarge(limit)
+            return message
+
+        return limited_receive
+
+class ValidationStage(MiddlewareStage):
+    """Validation des requêtes"""
+
+    def __init__(self):
         self.max_content_length = settings.MAX_FILE_SIZE
-    
-    async def dispatch(self, request: Request, call_next):
+
+    async def on_request(self, ctx: RequestContext) -> Optional[Response]:
         # Validation de la taille du contenu
-        content_length = request.headers.get("content-length")
+        content_length = ctx.headers.get("content-length")
         if content_length and int(content_length) > self.max_content_length:
             return JSONResponse(
                 status_code=413,
@@ -178,10 +585,10 @@ class ValidationMiddleware(BaseHTTPMiddleware):
                     "detail": f"Taille maximale autorisée : {self.max_content_length / (1024*1024):.1f}MB"
                 }
             )
-        
+
         # Validation du Content-Type pour les uploads
-        if request.method == "POST" and "/predict/" in request.url.path:
-            content_type = request.headers.get("content-type", "")
+        if ctx.method == "POST" and "/predict/" in ctx.path:
+            content_type = ctx.headers.get("content-type", "")
             if "multipart/form-data" not in content_type:
                 return JSONResponse(
                     status_code=400,
@@ -190,76 +597,157 @@ class ValidationMiddleware(BaseHTTPMiddleware):
                         "detail": "Les prédictions nécessitent multipart/form-data"
                     }
                 )
-        
-        return await call_next(request)
 
-class MetricsMiddleware(BaseHTTPMiddleware):
-    """Middleware de collecte de métriques"""
-    
-    def __init__(self, app: ASGIApp):
-        super().__init__(app)
-        self.metrics = {
-            "requests_total": 0,
-            "requests_by_method": defaultdict(int),
-            "requests_by_status": defaultdict(int),
-            "response_times": [],
-            "errors_total": 0,
-            "predictions_total": 0
-        }
-    
-    async def dispatch(self, request: Request, call_next):
-        start_time = time.time()
-        
-        try:
-            response = await call_next(request)
-            
-            # Collecte des métriques
-            process_time = time.time() - start_time
-            
-            self.metrics["requests_total"] += 1
-            self.metrics["requests_by_method"][request.method] += 1
-            self.metrics["requests_by_status"][response.status_code] += 1
-            self.metrics["response_times"].append(process_time)
-            
-            # Comptage des prédictions
-            if "/predict/" in request.url.path and response.status_code == 200:
-                self.metrics["predictions_total"] += 1
-            
-            # Limitation de l'historique des temps de réponse
-            if len(self.metrics["response_times"]) > 1000:
-                self.metrics["response_times"] = self.metrics["response_times"][-1000:]
-            
-            return response
-            
-        except Exception as e:
-            self.metrics["errors_total"] += 1
-            process_time = time.time() - start_time
-            self.metrics["response_times"].append(process_time)
-            raise e
-    
+        return None
+
+class MetricsStage(MiddlewareStage):
+    """
+    Collecte de métriques HTTP
+
+    Latence par méthode, route et statut dans un histogramme Prometheus. La
+    route est le modèle déclaré (`/admin/users/{user_id}`) et non le chemin
+    reçu, pour borner le nombre de séries ; les chemins inconnus sont
+    regroupés sous `unmatched`.
+    """
+
+    def __init__(self, registry: Optional[MetricsRegistry] = None):
+        registry = registry or metrics
+        self.registry = registry
+        self.requests = registry.histogram(
+            "http_request_duration_seconds",
+            "Latence des requêtes HTTP par méthode, route et statut",
+            ("method", "route", "status")
+        )
+        self.errors = registry.counter(
+            "http_request_exceptions_total",
+            "Exceptions non gérées par méthode et route",
+            ("method", "route")
+        )
+        self.in_progress = registry.gauge("http_requests_in_progress", "Requêtes HTTP en cours")
+        self._routes: Dict[Any, str] = {}
+
+    def _route(self, scope: Scope) -> str:
+        endpoint = scope.get("endpoint")
+        if endpoint is None:
+            # Réponse anticipée (429, 413...) : le routeur n'a pas été appelé
+            for candidate in getattr(scope.get("app"), "routes", ()):
+                match, _ = candidate.matches(scope)
+                if match is Match.FULL:
+                    return candidate.path
+            return "unmatched"
+
+        route = self._routes.get(endpoint)
+        if route is None:
+            app = scope.get("app")
+            for candidate in getattr(app, "routes", ()):
+                if getattr(candidate, "endpoint", None) is endpoint:
+                    route = candidate.path
+                    break
+            else:
+                route = "unmatched"
+            self._routes[endpoint] = route
+        return route
+
+    async def on_request(self, ctx: RequestContext) -> Optional[Response]:
+        self.in_progress.inc()
+        ctx.state["in_progress"] = True
+        return None
+
+    def on_complete(self, ctx: RequestContext, error: Optional[BaseException]):
+        if ctx.state.pop("in_progress", False):
+            self.in_progress.dec()
+        route = self._route(ctx.scope)
+
+        if isinstance(error, asyncio.CancelledError):
+            # Requête interrompue (client parti) : pas une erreur du serveur
+            status_code = ctx.status_code or 499
+        elif error is not None:
+            self.errors.labels(ctx.method, route).inc()
+            status_code = 500
+        else:
+            status_code = ctx.status_code
+
+        self.requests.labels(ctx.method, route, status_code).observe(ctx.elapsed)
+
     def get_metrics(self) -> Dict[str, Any]:
-        """Récupération des métriques collectées"""
-        response_times = self.metrics["response_times"]
-        
-        return {
-            "requests_total": self.metrics["requests_total"],
-            "requests_by_method": dict(self.metrics["requests_by_method"]),
-            "requests_by_status": dict(self.metrics["requests_by_status"]),
-            "errors_total": self.metrics["errors_total"],
-            "predictions_total": self.metrics["predictions_total"],
-            "response_time_stats": {
-                "count": len(response_times),
-                "avg": sum(response_times) / len(response_times) if response_times else 0,
-                "min": min(response_times) if response_times else 0,
-                "max": max(response_times) if response_times else 0
-            }
-        }
+        """Résumé des métriques collectées"""
+        return summarize_http_metrics(self.registry)
+
+def summarize_http_metrics(registry: MetricsRegistry) -> Dict[str, Any]:
+    """Résumé des requêtes par méthode et statut, à partir de l'histogramme"""
+    histogram = registry.get("http_request_duration_seconds")
+    summary = {
+        "requests_total": 0,
+        "requests_by_method": defaultdict(int),
+        "requests_by_status": defaultdict(int),
+        "errors_total": 0,
+        "predictions_total": 0,
+        "response_time_stats": {"count": 0, "avg": 0}
+    }
+    total_time = 0.0
+
+    for (method, route, status_code), child in (histogram.children() if histogram else []):
+        counts, elapsed = child.snapshot()
+        count = sum(counts)
+        summary["requests_total"] += count
+        summary["requests_by_method"][method] += count
+        summary["requests_by_status"][int(status_code)] += count
+        if int(status_code) >= 500:
+            summary["errors_total"] += count
+        if "/predict/" in route and status_code == "200":
+            summary["predictions_total"] += count
+        total_time += elapsed
+
+    summary["requests_by_method"] = dict(summary["requests_by_method"])
+    summary["requests_by_status"] = dict(summary["requests_by_status"])
+    summary["response_time_stats"] = {
+        "count": summary["requests_total"],
+        "avg": total_time / summary["requests_total"] if summary["requests_total"] else 0
+    }
+    return summary
+
+# Middlewares ASGI à une seule étape, pour un usage isolé
+
+class CompressionMiddleware(PipelineMiddleware):
+    """Middleware de compression des réponses"""
+
+    def __init__(self, app: ASGIApp, minimum_size: Optional[int] = None):
+        super().__init__(app, [CompressionStage(minimum_size)])
 
-# Instance globale des métriques
-metrics_middleware = None
+class RateLimitMiddleware(PipelineMiddleware):
+    """Middleware de limitation du taux de requêtes"""
+
+    def __init__(self, app: ASGIApp):
+        super().__init__(app, [RateLimitStage()])
+
+class SecurityHeadersMiddleware(PipelineMiddleware):
+    """Middleware pour les headers de sécurité"""
+
+    def __init__(self, app: ASGIApp, security_headers: Optional[Dict[str, str]] = None):
+        super().__init__(app, [SecurityHeadersStage(security_headers)])
+
+class LoggingMiddleware(PipelineMiddleware):
+    """Middleware de logging des requêtes"""
+
+    def __init__(self, app: ASGIApp):
+        super().__init__(app, [LoggingStage()])
+
+class ValidationMiddleware(PipelineMiddleware):
+    """Middleware de validation des requêtes"""
+
+    def __init__(self, app: ASGIApp):
+        super().__init__(app, [ValidationStage()])
+
+class MetricsMiddleware(PipelineMiddleware):
+    """Middleware de collecte de métriques"""
+
+    def __init__(self, app: ASGIApp, registry: Optional[MetricsRegistry] = None):
+        self.collector = MetricsStage(registry)
+        super().__init__(app, [self.collector])
+
+    def get_metrics(self) -> Dict[str, Any]:
+        return self.collector.get_metrics()
 
 def get_metrics() -> Dict[str, Any]:
-    """Fonction pour récupérer les métriques"""
-    if metrics_middleware:
-        return metrics_middleware.get_metrics()
-    return {"error": "Métriques non disponibles"} 
\ No newline at end of file
+    """Fonction pour récupérer les métriques (exposition complète sur METRICS_PATH)"""
+    return summarize_http_metrics(metrics)
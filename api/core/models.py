@@ -13,6 +13,12 @@ class PredictionStatus(str, Enum):
     ERROR = "error"
     PROCESSING = "processing"
 
+class JobStatus(str, Enum):
+    PENDING = "pending"
+    RUNNING = "running"
+    COMPLETED = "completed"
+    FAILED = "failed"
+
 # Modèles d'authentification
 class LoginRequest(BaseModel):
     username: str = Field(..., min_length=3, max_length=50)
@@ -28,6 +34,28 @@ class TokenData(BaseModel):
     username: Optional[str] = None
     user_id: Optional[int] = None
     role: Optional[str] = None
+    jti: Optional[str] = None
+    token_type: Optional[str] = None
+    exp: Optional[int] = None
+
+class RefreshRequest(BaseModel):
+    refresh_token: str
+
+class LogoutRequest(BaseModel):
+    refresh_token: Optional[str] = None
+
+class APIKeyCreate(BaseModel):
+    name: str = Field(..., min_length=1, max_length=100)
+    expires_in_days: Optional[int] = Field(None, ge=1, le=3650)
+
+class APIKeyResponse(BaseModel):
+    id: int
+    name: str
+    is_active: bool
+    created_at: Optional[datetime] = None
+    expires_at: Optional[datetime] = None
+    last_used: Optional[datetime] = None
+    key: Optional[str] = None  # renvoyée uniquement à la création
 
 # Modèles utilisateur
 class UserBase(BaseModel):
@@ -84,6 +112,7 @@ class PredictionResponse(BaseModel):
     user_id: int
     status: PredictionStatus = PredictionStatus.SUCCESS
     error_message: Optional[str] = None
+    timings: Optional[Dict[str, float]] = None  # durée des étapes en ms (?timings=true)
     
     class Config:
         from_attributes = True
@@ -94,6 +123,20 @@ class PredictionHistory(BaseModel):
     page: int
     page_size: int
 
+# Modèles des jobs asynchrones
+class JobResponse(BaseModel):
+    id: str
+    status: JobStatus
+    total: int
+    processed: int = 0
+    failed: int = 0
+    progress: float = 0.0
+    created_at: Optional[datetime] = None
+    updated_at: Optional[datetime] = None
+    completed_at: Optional[datetime] = None
+    error_message: Optional[str] = None
+    results_url: str
+
 # Modèles administrateur
 class StatsResponse(BaseModel):
     users: int
@@ -0,0 +1,168 @@
+import asyncio
+import logging
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from concurrent.futures import Future
+from typing import Any, Dict, List, Optional
+
+from .config import settings
+
+logger = logging.getLogger(__name__)
+
+class ProfilerBusy(RuntimeError):
+    """Un profilage est déjà en cours sur ce worker"""
+
+def frame_label(code) -> str:
+    """Nom d'une frame dans les piles repliées : fonction (fichier:ligne de définition)"""
+    # co_qualname (classe.méthode) n'existe qu'à partir de Python 3.11
+    name = getattr(code, "co_qualname", code.co_name)
+    return f"{name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+def collapse_stack(thread_name: str, frame) -> str:
+    """Pile d'un thread au format replié : racine d'abord, frames séparées par ';'"""
+    labels = []
+    while frame is not None:
+        labels.append(frame_label(frame.f_code))
+        frame = frame.f_back
+    labels.append(thread_name.replace(";", "_").replace(" ", "_"))
+    return ";".join(reversed(labels))
+
+def render_collapsed(stacks: Counter) -> str:
+    """Lignes `pile nombre`, lisibles par flamegraph.pl, speedscope ou inferno"""
+    return "".join(f"{stack} {count}\n" for stack, count in stacks.most_common())
+
+class SamplingProfiler:
+    """
+    Profileur par échantillonnage de tous les threads du worker
+
+    Un thread dédié relève toutes les `interval` secondes la pile de chaque
+    thread (`sys._current_frames`) : boucle d'événements, exécuteur des
+    prédictions TensorFlow, hachage des mots de passe, workers des tâches...
+    Aucun hook n'est posé sur le code profilé, le coût se limite à la
+    lecture des piles (mesuré et renvoyé dans `overhead_ms`).
+
+    En option, tracemalloc est activé pendant la fenêtre : la différence
+    entre les instantanés de début et de fin désigne les lignes dont les
+    allocations ont grossi.
+
+    Un seul profilage à la fois par worker ; l'arrêt du worker interrompt
+    le profilage en cours.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._cancelled = threading.Event()
+        self.running = False
+
+    def cancel(self):
+        """Interruption du profilage en cours (arrêt du worker)"""
+        self._cancelled.set()
+
+    async def profile(
+        self,
+        duration: float,
+        interval: Optional[float] = None,
+        trace_memory: bool = False,
+        top: int = 25
+    ) -> Dict[str, Any]:
+        """Profilage pendant `duration` secondes, sans occuper l'exécuteur par défaut"""
+        if not self._lock.acquire(blocking=False):
+            raise ProfilerBusy("Profilage déjà en cours")
+        self.running = True
+        self._cancelled.clear()
+
+        # Thread dédié : le profilage n'occupe pas un thread de l'exécuteur
+        # (celui des prédictions) pendant toute la fenêtre. Le verrou est
+        # rendu par ce thread, à la fin réelle du relevé.
+        future: Future = Future()
+
+        def target():
+            try:
+                result = self._sample(duration, interval or settings.PROFILER_SAMPLE_INTERVAL, trace_memory, top)
+                if future.set_running_or_notify_cancel():
+                    future.set_result(result)
+            except BaseException as e:
+                if not future.done():
+                    future.set_exception(e)
+            finally:
+                self.running = False
+                self._lock.release()
+
+        threading.Thread(target=target, name="sampling-profiler", daemon=True).start()
+        try:
+            return await asyncio.wrap_future(future)
+        except asyncio.CancelledError:
+            # Client déconnecté : relevé interrompu
+            self.cancel()
+            raise
+
+    def _sample(self, duration: float, interval: float, trace_memory: bool, top: int) -> Dict[str, Any]:
+        own_thread = threading.get_ident()
+        started_tracing = False
+        before = None
+        if trace_memory:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start(settings.PROFILER_TRACEMALLOC_FRAMES)
+                started_tracing = True
+            before = tracemalloc.take_snapshot()
+
+        stacks: Counter = Counter()
+        threads: Counter = Counter()
+        samples = 0
+        overhead = 0.0
+        start = time.perf_counter()
+        deadline = start + duration
+        try:
+            while time.perf_counter() < deadline and not self._cancelled.is_set():
+                tick = time.perf_counter()
+                names = {thread.ident: thread.name for thread in threading.enumerate()}
+                for ident, frame in sys._current_frames().items():
+                    if ident == own_thread:
+                        continue
+                    name = names.get(ident, f"thread-{ident}")
+                    stacks[collapse_stack(name, frame)] += 1
+                    threads[name] += 1
+                samples += 1
+                elapsed = time.perf_counter() - tick
+                overhead += elapsed
+                self._cancelled.wait(max(0.0, interval - elapsed))
+
+            result: Dict[str, Any] = {
+                "duration_s": round(time.perf_counter() - start, 3),
+                "interval_ms": round(interval * 1000, 3),
+                "samples": samples,
+                "overhead_ms": round(overhead * 1000, 1),
+                "threads": dict(threads.most_common()),
+                "collapsed": render_collapsed(stacks)
+            }
+            if trace_memory:
+                result["memory"] = self._memory_diff(before, tracemalloc.take_snapshot(), top)
+        finally:
+            if started_tracing:
+                tracemalloc.stop()
+
+        logger.info(f"🔬 Profilage : {samples} échantillons, {len(threads)} thread(s), {result['overhead_ms']} ms de relevé")
+        return result
+
+    @staticmethod
+    def _memory_diff(before, after, top: int) -> List[Dict[str, Any]]:
+        """Lignes dont les allocations ont le plus grossi pendant la fenêtre"""
+        # Allocations du module tracemalloc lui-même exclues
+        exclude = [tracemalloc.Filter(False, tracemalloc.__file__)]
+        stats = after.filter_traces(exclude).compare_to(before.filter_traces(exclude), "lineno")
+        return [
+            {
+                "location": f"{stat.traceback[0].filename}:{stat.traceback[0].lineno}",
+                "size_diff_kb": round(stat.size_diff / 1024, 1),
+                "size_kb": round(stat.size / 1024, 1),
+                "count_diff": stat.count_diff
+            }
+            for stat in stats[:top]
+        ]
+
+# Instance globale (une par worker)
+profiler = SamplingProfiler()
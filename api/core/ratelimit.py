@@ -0,0 +1,332 @@
+import asyncio
+import logging
+import time
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Callable, Hashable
+
+from .config import settings
+
+logger = logging.getLogger(__name__)
+
+NS_PER_SECOND = 1_000_000_000
+
+@dataclass
+class RateLimitResult:
+    """Décision du limiteur pour une requête"""
+    allowed: bool
+    limit: int
+    remaining: int
+    reset_after: float  # secondes avant que le quota soit entièrement rétabli
+    retry_after: float  # secondes avant qu'une requête refusée soit acceptée
+
+class GCRARateLimiter:
+    """
+    Limiteur de débit GCRA (Generic Cell Rate Algorithm)
+
+    Chaque client est représenté par un seul entier : son « theoretical
+    arrival time » (TAT) en nanosecondes sur l'horloge monotone. Une requête
+    de coût `c` avance le TAT de `c * T` (T = window / limit) ; elle est
+    refusée si le TAT dépasserait `now + window`. Mémoire O(1) par client et
+    décision O(1), sans liste d'horodatages ni tâche de nettoyage globale.
+
+    Les clients sont rangés par ordre d'utilisation (LRU) : ceux dont le TAT
+    est passé (quota entièrement rétabli, donc équivalents à un client
+    inconnu) sont évincés au fil de l'eau, et le nombre total de clients
+    suivis est borné par `max_clients`.
+    """
+
+    def __init__(
+        self,
+        limit: int,
+        window_seconds: int,
+        max_clients: int = 100_000,
+        clock: Callable[[], int] = time.monotonic_ns
+    ):
+        self.limit = limit
+        self.window = window_seconds * NS_PER_SECOND
+        self.interval = self.window // limit
+        self.max_clients = max_clients
+        self.clock = clock
+        self._tat: "OrderedDict[Hashable, int]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def hit(self, key: Hashable, cost: int = 1) -> RateLimitResult:
+        """Comptabilise une requête de coût `cost` pour `key`"""
+        now = self.clock()
+        increment = self.interval * cost
+
+        with self._lock:
+            tat = self._tat.get(key, now)
+            if tat < now:
+                tat = now
+            new_tat = tat + increment
+
+            if new_tat - now > self.window:
+                # Refus : l'état n'est pas modifié
+                return RateLimitResult(
+                    allowed=False,
+                    limit=self.limit,
+                    remaining=0,
+                    reset_after=(tat - now) / NS_PER_SECOND,
+                    retry_after=(new_tat - now - self.window) / NS_PER_SECOND
+                )
+
+            self._tat[key] = new_tat
+            self._tat.move_to_end(key)
+            self._evict(now)
+
+        return RateLimitResult(
+            allowed=True,
+            limit=self.limit,
+            remaining=int((self.window - (new_tat - now)) // self.interval),
+            reset_after=(new_tat - now) / NS_PER_SECOND,
+            retry_after=0.0
+        )
+
+    def _evict(self, now: int):
+        """Éviction des clients inactifs (TAT passé) et respect de la borne"""
+        tat = self._tat
+        while tat:
+            oldest_key = next(iter(tat))
+            if tat[oldest_key] > now and len(tat) <= self.max_clients:
+                break
+            del tat[oldest_key]
+
+    def reset(self, key: Hashable):
+        with self._lock:
+            self._tat.pop(key, None)
+
+    def __len__(self) -> int:
+        return len(self._tat)
+
+class MemoryRateLimitStore:
+    """Stockage des compteurs dans le processus (limite appliquée par worker)"""
+    
+    backend = "memory"
+    
+    def __init__(self, limit: int, window_seconds: int, max_clients: int = 100_000):
+        self.limiter = GCRARateLimiter(limit, window_seconds, max_clients=max_clients)
+    
+    async def hit(self, key: Hashable, cost: int = 1) -> RateLimitResult:
+        return self.limiter.hit(key, cost)
+    
+    async def close(self):
+        pass
+
+# Token bucket atomique côté Redis. L'horloge est celle du serveur Redis
+# (commande TIME) : tous les workers et réplicas partagent la même référence.
+TOKEN_BUCKET_LUA = """
+local capacity = tonumber(ARGV[1])
+local rate = tonumber(ARGV[2])
+local cost = tonumber(ARGV[3])
+local ttl_ms = tonumber(ARGV[4])
+
+local time = redis.call('TIME')
+local now = tonumber(time[1]) * 1000000 + tonumber(time[2])
+
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(state[1]) or capacity
+local ts = tonumber(state[2]) or now
+
+tokens = math.min(capacity, tokens + math.max(0, now - ts) * rate)
+
+local allowed = 0
+local retry_after = 0
+if tokens >= cost then
+    tokens = tokens - cost
+    allowed = 1
+else
+    retry_after = (cost - tokens) / rate
+end
+
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', tostring(now))
+redis.call('PEXPIRE', KEYS[1], ttl_ms)
+
+return {allowed, tostring(tokens), tostring(retry_after)}
+"""
+
+def _is_noscript(error: Exception) -> bool:
+    message = str(error).upper()
+    return "NOSCRIPT" in message or "NO MATCHING SCRIPT" in message
+
+class RedisUnavailable(Exception):
+    """Redis injoignable : la décision est prise localement"""
+
+class RedisRateLimitStore:
+    """
+    Stockage partagé dans Redis (token bucket atomique en Lua)
+
+    Les décisions demandées pendant un même tour de boucle sont envoyées
+    dans un seul pipeline (un aller-retour réseau pour N requêtes). Si Redis
+    ne répond pas, le store bascule sur `fallback` (limite locale au worker)
+    pendant `retry_interval` secondes avant de réessayer.
+    """
+    
+    backend = "redis"
+    
+    def __init__(
+        self,
+        redis_client,
+        limit: int,
+        window_seconds: int,
+        fallback: MemoryRateLimitStore,
+        prefix: str = "ratelimit:",
+        retry_interval: float = 5.0
+    ):
+        self.redis = redis_client
+        self.limit = limit
+        self.window_seconds = window_seconds
+        # Jetons rechargés par microseconde
+        self.rate = limit / (window_seconds * 1_000_000)
+        self.fallback = fallback
+        self.prefix = prefix
+        self.retry_interval = retry_interval
+        self._sha = None
+        self._pending = []
+        self._flush_scheduled = False
+        self._flush_task = None
+        self._unavailable_until = 0.0
+    
+    @property
+    def available(self) -> bool:
+        return time.monotonic() >= self._unavailable_until
+    
+    async def hit(self, key: Hashable, cost: int = 1) -> RateLimitResult:
+        if not self.available:
+            return await self.fallback.hit(key, cost)
+        
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((key, cost, future))
+        if not self._flush_scheduled:
+            # La tâche démarre au prochain tour de boucle : les requêtes
+            # arrivées d'ici là partent dans le même pipeline
+            self._flush_scheduled = True
+            self._flush_task = loop.create_task(self._flush())
+        
+        try:
+            return await future
+        except RedisUnavailable:
+            return await self.fallback.hit(key, cost)
+    
+    async def _flush(self):
+        batch, self._pending = self._pending, []
+        self._flush_scheduled = False
+        if not batch:
+            return
+        
+        try:
+            replies = await self._execute(batch)
+        except Exception as e:
+            self._mark_unavailable(e)
+            for _, _, future in batch:
+                if not future.done():
+                    future.set_exception(RedisUnavailable(str(e)))
+            return
+        
+        for (_, _, future), reply in zip(batch, replies):
+            if not future.done():
+                future.set_result(self._to_result(reply))
+    
+    async def _execute(self, batch):
+        """Envoi du lot en pipeline, avec rechargement du script si besoin"""
+        for attempt in range(2):
+            if self._sha is None:
+                self._sha = await self.redis.script_load(TOKEN_BUCKET_LUA)
+            
+            async with self.redis.pipeline(transaction=False) as pipe:
+                for key, cost, _ in batch:
+                    pipe.evalsha(
+                        self._sha, 1, f"{self.prefix}{key}",
+                        self.limit, repr(self.rate), cost, self.window_seconds * 1000
+                    )
+                replies = await pipe.execute(raise_on_error=False)
+            
+            errors = [reply for reply in replies if isinstance(reply, Exception)]
+            if not errors:
+                return replies
+            if attempt == 0 and all(_is_noscript(error) for error in errors):
+                # Script évincé (redémarrage de Redis, SCRIPT FLUSH) : rechargement
+                self._sha = None
+                continue
+            raise errors[0]
+    
+    def _to_result(self, reply) -> RateLimitResult:
+        allowed, tokens, retry_after = int(reply[0]), float(reply[1]), float(reply[2])
+        return RateLimitResult(
+            allowed=bool(allowed),
+            limit=self.limit,
+            remaining=int(tokens),
+            reset_after=(self.limit - tokens) / self.rate / 1_000_000,
+            retry_after=retry_after / 1_000_000
+        )
+    
+    def _mark_unavailable(self, error: Exception):
+        if self.available:
+            logger.warning(
+                f"Redis indisponible pour le rate limiting ({str(error)}) : "
+                f"limitation locale pendant {self.retry_interval:.0f}s"
+            )
+        self._unavailable_until = time.monotonic() + self.retry_interval
+    
+    async def close(self):
+        await self.redis.close()
+
+_redis_client = None
+
+def _get_redis_client():
+    """Client Redis partagé par tous les stores du worker"""
+    global _redis_client
+    if _redis_client is None:
+        import redis.asyncio as aioredis
+        
+        _redis_client = aioredis.from_url(
+            settings.REDIS_URL,
+            socket_timeout=settings.RATE_LIMIT_REDIS_TIMEOUT,
+            socket_connect_timeout=settings.RATE_LIMIT_REDIS_TIMEOUT
+        )
+    return _redis_client
+
+def create_rate_limit_store(limit: int = None, window_seconds: int = None, namespace: str = ""):
+    """Création du store configuré (RATE_LIMIT_BACKEND : memory ou redis)"""
+    limit = limit or settings.RATE_LIMIT_REQUESTS
+    window_seconds = window_seconds or settings.RATE_LIMIT_WINDOW
+    
+    local_store = MemoryRateLimitStore(
+        limit,
+        window_seconds,
+        max_clients=settings.RATE_LIMIT_MAX_CLIENTS
+    )
+    
+    if settings.RATE_LIMIT_BACKEND != "redis":
+        return local_store
+    
+    try:
+        client = _get_redis_client()
+    except ImportError:
+        logger.warning("Paquet redis non installé : rate limiting local au worker")
+        return local_store
+    
+    return RedisRateLimitStore(
+        client,
+        limit,
+        window_seconds,
+        fallback=local_store,
+        prefix=f"{settings.RATE_LIMIT_REDIS_PREFIX}{namespace}",
+        retry_interval=settings.RATE_LIMIT_REDIS_RETRY_INTERVAL
+    )
+
+def request_cost(path: str, content_length: int = 0) -> int:
+    """
+    Coût d'une requête en unités de quota
+
+    Coût de base de la route (RATE_LIMIT_ROUTE_COSTS, 1 par défaut), plus une
+    unité par tranche de RATE_LIMIT_COST_BYTES_UNIT octets envoyés : un lot de
+    dix images coûte plus qu'une seule, et bien plus qu'un simple GET.
+    """
+    cost = settings.RATE_LIMIT_ROUTE_COSTS.get(path, 1)
+    if content_length > 0:
+        cost += content_length // settings.RATE_LIMIT_COST_BYTES_UNIT
+    return cost
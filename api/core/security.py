@@ -1,16 +1,23 @@
 from datetime import datetime, timedelta
 from typing import Optional, Dict, Any
 from fastapi import HTTPException, Depends, status
-from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
+from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials, APIKeyHeader
 from passlib.context import CryptContext
 from jose import JWTError, jwt
+import asyncio
 import hashlib
 import secrets
 import logging
-from typing import List
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import List, Callable
 
 from .config import settings
 from .models import TokenData, UserRole
+from .cache import TTLCache
+from .denylist import token_denylist
+from .api_keys import api_key_manager
 
 logger = logging.getLogger(__name__)
 
@@ -20,6 +27,172 @@ pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 # Schéma de sécurité Bearer
 security = HTTPBearer(auto_error=False)
 
+# Schéma de sécurité par clé API (clients machines)
+api_key_header = APIKeyHeader(name="X-API-Key", auto_error=False)
+
+class PasswordHashQueueFull(Exception):
+    """File d'attente du hachage de mots de passe saturée"""
+
+class PasswordHashExecutor:
+    """
+    Exécuteur borné dédié à bcrypt
+
+    bcrypt coûte 100 à 300 ms de CPU par appel : exécuté dans la boucle
+    asyncio, il bloque toutes les requêtes en cours (dont les prédictions).
+    Les appels sont donc délégués à un pool de threads dédié, limité à
+    `max_workers` hachages simultanés et `max_queue` appels en attente.
+    Au-delà, l'appel est refusé immédiatement plutôt que de s'accumuler.
+    """
+    
+    def __init__(self, max_workers: int = 2, max_queue: int = 64):
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self._executor = None
+        self._lock = threading.Lock()
+        self.in_flight = 0
+        self.queued = 0
+        self.completed = 0
+        self.rejected = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+    
+    def _get_executor(self) -> ThreadPoolExecutor:
+        # Création paresseuse : aucun thread n'est démarré à l'import
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(
+                        max_workers=self.max_workers,
+                        thread_name_prefix="bcrypt"
+                    )
+        return self._executor
+    
+    async def run(self, func: Callable, *args):
+        """Exécution de `func(*args)` dans le pool sans bloquer la boucle"""
+        with self._lock:
+            if self.queued >= self.max_queue:
+                self.rejected += 1
+                raise PasswordHashQueueFull("Trop de requêtes d'authentification simultanées")
+            self.queued += 1
+        
+        submitted_at = time.perf_counter()
+        
+        def task():
+            wait = time.perf_counter() - submitted_at
+            with self._lock:
+                self.queued -= 1
+                self.in_flight += 1
+                self.total_wait += wait
+                self.max_wait = max(self.max_wait, wait)
+            try:
+                return func(*args)
+            finally:
+                with self._lock:
+                    self.in_flight -= 1
+                    self.completed += 1
+        
+        future = self._get_executor().submit(task)
+        future.add_done_callback(self._on_done)
+        return await asyncio.wrap_future(future)
+    
+    def _on_done(self, future: Future):
+        # Appelant annulé (déconnexion, timeout) avant le début du hachage :
+        # la tâche ne s'exécutera jamais, elle quitte la file ici
+        if future.cancelled():
+            with self._lock:
+                self.queued -= 1
+    
+    def stats(self) -> Dict[str, Any]:
+        """Métriques de la file de hachage"""
+        with self._lock:
+            return {
+                "max_workers": self.max_workers,
+                "max_queue": self.max_queue,
+                "in_flight": self.in_flight,
+                "queued": self.queued,
+                "completed": self.completed,
+                "rejected": self.rejected,
+                "avg_wait_ms": (self.total_wait / self.completed * 1000) if self.completed else 0.0,
+                "max_wait_ms": self.max_wait * 1000
+            }
+    
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+
+# Exécuteur global du hachage de mots de passe
+password_hasher = PasswordHashExecutor(
+    max_workers=settings.PASSWORD_HASH_WORKERS,
+    max_queue=settings.PASSWORD_HASH_MAX_QUEUE
+)
+
+class VerifiedTokenCache:
+    """
+    Cache des tokens JWT déjà vérifiés
+
+    Un même client renvoie le même token des centaines de fois : la
+    vérification HMAC et le décodage JSON ne sont faits qu'une fois, puis les
+    claims sont servis depuis le cache jusqu'à l'échéance `exp` du token.
+    La clé est le SHA-256 du token (le token brut n'est pas conservé).
+
+    Les vérifications de révocation enregistrées via `add_revocation_check`
+    sont appliquées à chaque lecture, y compris depuis le cache.
+    """
+    
+    def __init__(self, maxsize: int = 10000):
+        self._cache = TTLCache(maxsize=maxsize, ttl=0)
+        self._revocation_checks: List[Callable[[Dict[str, Any]], bool]] = []
+    
+    @staticmethod
+    def digest(token: str) -> bytes:
+        return hashlib.sha256(token.encode()).digest()
+    
+    def get(self, token: str) -> Optional[Dict[str, Any]]:
+        """Claims d'un token déjà vérifié (None si absent, expiré ou révoqué)"""
+        key = self.digest(token)
+        payload = self._cache.get(key)
+        if payload is None:
+            return None
+        if self.is_revoked(payload):
+            self._cache.pop(key)
+            return None
+        return payload
+    
+    def put(self, token: str, payload: Dict[str, Any]):
+        """Mise en cache des claims jusqu'à l'expiration du token"""
+        exp = payload.get("exp")
+        if exp is None:
+            return
+        ttl = float(exp) - time.time()
+        if ttl > 0:
+            self._cache.set(self.digest(token), payload, ttl=ttl)
+    
+    def add_revocation_check(self, check: Callable[[Dict[str, Any]], bool]):
+        """Enregistre une fonction `check(payload) -> bool` (True = révoqué)"""
+        self._revocation_checks.append(check)
+    
+    def is_revoked(self, payload: Dict[str, Any]) -> bool:
+        return any(check(payload) for check in self._revocation_checks)
+    
+    def revoke(self, token: str):
+        """Retrait immédiat d'un token du cache"""
+        self._cache.pop(self.digest(token))
+    
+    def clear(self):
+        self._cache.clear()
+    
+    def stats(self) -> Dict[str, Any]:
+        return self._cache.stats()
+
+# Cache global des tokens vérifiés
+token_cache = VerifiedTokenCache(maxsize=settings.TOKEN_CACHE_SIZE)
+
+# Les tokens révoqués (logout, rotation du refresh token) sont refusés, même en cache
+token_cache.add_revocation_check(
+    lambda payload: token_denylist.is_revoked(payload.get("jti"), payload.get("exp"))
+)
+
 class SecurityService:
     """Service de sécurité pour l'authentification et l'autorisation"""
     
@@ -28,6 +201,7 @@ class SecurityService:
         self.algorithm = settings.ALGORITHM
         self.access_token_expire_minutes = settings.ACCESS_TOKEN_EXPIRE_MINUTES
         self.refresh_token_expire_days = settings.REFRESH_TOKEN_EXPIRE_DAYS
+        self.token_cache = token_cache
     
     def hash_password(self, password: str) -> str:
         """Hachage sécurisé du mot de passe"""
@@ -41,7 +215,7 @@ class SecurityService:
         """Création d'un token d'accès JWT"""
         to_encode = data.copy()
         expire = datetime.utcnow() + timedelta(minutes=self.access_token_expire_minutes)
-        to_encode.update({"exp": expire, "type": "access"})
+        to_encode.update({"exp": expire, "type": "access", "jti": secrets.token_urlsafe(16)})
         
         return jwt.encode(to_encode, self.secret_key, algorithm=self.algorithm)
     
@@ -49,27 +223,44 @@ class SecurityService:
         """Création d'un token de rafraîchissement"""
         to_encode = data.copy()
         expire = datetime.utcnow() + timedelta(days=self.refresh_token_expire_days)
-        to_encode.update({"exp": expire, "type": "refresh"})
+        to_encode.update({"exp": expire, "type": "refresh", "jti": secrets.token_urlsafe(16)})
         
         return jwt.encode(to_encode, self.secret_key, algorithm=self.algorithm)
     
-    def verify_token(self, token: str) -> TokenData:
+    def decode_token(self, token: str) -> Dict[str, Any]:
+        """Décodage d'un token JWT, servi depuis le cache s'il a déjà été vérifié"""
+        payload = self.token_cache.get(token)
+        if payload is None:
+            payload = jwt.decode(token, self.secret_key, algorithms=[self.algorithm])
+            if self.token_cache.is_revoked(payload):
+                raise JWTError("Token révoqué")
+            self.token_cache.put(token, payload)
+        return payload
+    
+    def verify_token(self, token: str, expected_type: str = "access") -> TokenData:
         """Vérification et décodage d'un token JWT"""
         try:
-            payload = jwt.decode(token, self.secret_key, algorithms=[self.algorithm])
+            payload = self.decode_token(token)
             username: str = payload.get("sub")
             user_id: int = payload.get("user_id")
             role: str = payload.get("role", "user")
             token_type: str = payload.get("type", "access")
             
-            if username is None or user_id is None:
+            if username is None or user_id is None or token_type != expected_type:
                 raise HTTPException(
                     status_code=status.HTTP_401_UNAUTHORIZED,
                     detail="Token invalide",
                     headers={"WWW-Authenticate": "Bearer"},
                 )
             
-            return TokenData(username=username, user_id=user_id, role=role)
+            return TokenData(
+                username=username,
+                user_id=user_id,
+                role=role,
+                jti=payload.get("jti"),
+                token_type=token_type,
+                exp=payload.get("exp")
+            )
         
         except JWTError as e:
             logger.error(f"Erreur JWT : {str(e)}")
@@ -79,15 +270,20 @@ class SecurityService:
                 headers={"WWW-Authenticate": "Bearer"},
             )
     
-    def create_api_key(self, user_id: int) -> str:
-        """Génération d'une clé API pour un utilisateur"""
-        raw_key = f"{user_id}:{secrets.token_hex(32)}:{datetime.utcnow().timestamp()}"
-        return hashlib.sha256(raw_key.encode()).hexdigest()
+    def revoke_token(self, token_data: TokenData, token: Optional[str] = None):
+        """Révocation d'un token vérifié jusqu'à son expiration"""
+        if token_data.jti and token_data.exp:
+            token_denylist.revoke(token_data.jti, token_data.exp, token_data.user_id)
+        if token:
+            self.token_cache.revoke(token)
+    
+    def create_api_key(self, user_id: int, name: str = "default", expires_in_days: Optional[int] = None) -> str:
+        """Génération et enregistrement d'une clé API pour un utilisateur"""
+        return api_key_manager.create_key(user_id, name, expires_in_days)["key"]
     
     def validate_api_key(self, api_key: str) -> bool:
-        """Validation d'une clé API"""
-        # Implémentation simplifiée - en production, stocker en base
-        return len(api_key) == 64 and api_key.isalnum()
+        """Validation d'une clé API (empreinte connue, clé et utilisateur actifs)"""
+        return api_key_manager.authenticate(api_key) is not None
 
 # Instance globale du service de sécurité
 security_service = SecurityService()
@@ -101,6 +297,14 @@ def verify_password(plain_password: str, hashed_password: str) -> bool:
     """Fonction de vérification de mot de passe"""
     return security_service.verify_password(plain_password, hashed_password)
 
+async def hash_password_async(password: str) -> str:
+    """Hachage de mot de passe hors de la boucle d'événements"""
+    return await password_hasher.run(security_service.hash_password, password)
+
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    """Vérification de mot de passe hors de la boucle d'événements"""
+    return await password_hasher.run(security_service.verify_password, plain_password, hashed_password)
+
 def create_tokens(user_data: Dict[str, Any]) -> Dict[str, Any]:
     """Création des tokens d'accès et de rafraîchissement"""
     access_token = security_service.create_access_token(user_data)
@@ -113,17 +317,62 @@ def create_tokens(user_data: Dict[str, Any]) -> Dict[str, Any]:
         "expires_in": settings.ACCESS_TOKEN_EXPIRE_MINUTES * 60
     }
 
-def verify_token(token: str) -> TokenData:
+def verify_token(token: str, expected_type: str = "access") -> TokenData:
     """Fonction de vérification de token"""
-    return security_service.verify_token(token)
+    return security_service.verify_token(token, expected_type)
+
+def revoke_token(token: str, expected_type: str = "access") -> TokenData:
+    """Vérification puis révocation d'un token"""
+    token_data = security_service.verify_token(token, expected_type)
+    security_service.revoke_token(token_data, token)
+    return token_data
+
+def authenticate_credentials(token: Optional[str] = None, api_key: Optional[str] = None) -> Optional[Dict[str, Any]]:
+    """Utilisateur d'un token d'accès ou d'une clé API (None si invalide), hors dépendances FastAPI"""
+    if token:
+        try:
+            token_data = verify_token(token)
+        except HTTPException:
+            return None
+        return {"user_id": token_data.user_id, "username": token_data.username, "role": token_data.role}
+    
+    if api_key:
+        key_info = api_key_manager.authenticate(api_key)
+        if key_info is None:
+            return None
+        return {
+            "user_id": key_info["user_id"],
+            "username": key_info["username"],
+            "role": key_info["role"],
+            "api_key_id": key_info["api_key_id"]
+        }
+    
+    return None
 
 # Dépendances FastAPI pour l'authentification
 async def get_current_user(
-    credentials: Optional[HTTPAuthorizationCredentials] = Depends(security)
+    credentials: Optional[HTTPAuthorizationCredentials] = Depends(security),
+    api_key: Optional[str] = Depends(api_key_header)
 ) -> Dict[str, Any]:
     """
     Dépendance pour obtenir l'utilisateur actuel depuis le token JWT
+    ou depuis une clé API (en-tête X-API-Key)
     """
+    if credentials is None and api_key:
+        key_info = api_key_manager.authenticate(api_key)
+        if key_info is None:
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail="Clé API invalide",
+                headers={"WWW-Authenticate": "Bearer"},
+            )
+        return {
+            "user_id": key_info["user_id"],
+            "username": key_info["username"],
+            "role": key_info["role"],
+            "api_key_id": key_info["api_key_id"]
+        }
+    
     if credentials is None:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -185,7 +434,7 @@ async def get_optional_user(
         return None
     
     try:
-        return await get_current_user(credentials)
+        return await get_current_user(credentials, api_key=None)
     except HTTPException:
         return None
 
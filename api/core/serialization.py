@@ -0,0 +1,54 @@
+from typing import Any, Dict, Iterable, Optional, Tuple, Union
+
+import orjson
+from fastapi.responses import ORJSONResponse
+from starlette.responses import Response
+
+from .models import PredictionResponse
+
+def _field_defaults(model) -> Tuple[Tuple[str, Any], ...]:
+    """Champs d'un modèle, dans l'ordre de déclaration, avec leur valeur par défaut"""
+    return tuple(
+        (name, None if field.is_required() else field.get_default(call_default_factory=True))
+        for name, field in model.model_fields.items()
+    )
+
+# Calculé une seule fois : forme exacte d'une PredictionResponse sérialisée
+PREDICTION_RESPONSE_FIELDS = _field_defaults(PredictionResponse)
+
+def prediction_payload(result: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Mise en forme d'un résultat interne selon PredictionResponse
+
+    Les résultats produits par PredictionService sont déjà conformes : on ne
+    les revalide pas, on ne garde que les champs du modèle (valeurs par défaut
+    pour les champs absents), dans l'ordre du schéma.
+    """
+    return {name: result.get(name, default) for name, default in PREDICTION_RESPONSE_FIELDS}
+
+def prediction_json_response(
+    results: Union[Dict[str, Any], Iterable[Dict[str, Any]]],
+    headers: Optional[Dict[str, str]] = None
+) -> Response:
+    """Réponse JSON pré-sérialisée (orjson) d'une ou plusieurs prédictions"""
+    if isinstance(results, dict):
+        content = prediction_payload(results)
+    else:
+        content = [prediction_payload(result) for result in results]
+    return Response(content=orjson.dumps(content), media_type="application/json", headers=headers)
+
+def prediction_ndjson(result: Dict[str, Any]) -> bytes:
+    """Ligne NDJSON d'une prédiction"""
+    return orjson.dumps(prediction_payload(result)) + b"\n"
+
+def prediction_sse(result: Dict[str, Any], event_id: int) -> bytes:
+    """Événement Server-Sent Events `prediction` d'une prédiction"""
+    return b"id: %d\nevent: prediction\ndata: %s\n\n" % (event_id, orjson.dumps(prediction_payload(result)))
+
+def fast_json_response(
+    content: Any,
+    headers: Optional[Dict[str, str]] = None,
+    status_code: int = 200
+) -> ORJSONResponse:
+    """Réponse orjson pour des données internes déjà sérialisables (dict, datetime, Enum)"""
+    return ORJSONResponse(content=content, headers=headers, status_code=status_code)
@@ -1,38 +1,56 @@
-from fastapi import FastAPI, HTTPException, Depends, status, UploadFile, File, Request
+from fastapi import FastAPI, HTTPException, Depends, status, UploadFile, File, Request, WebSocket
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.middleware.trustedhost import TrustedHostMiddleware
-from fastapi.responses import JSONResponse, Response
+from fastapi.responses import JSONResponse, ORJSONResponse, Response, StreamingResponse
 from contextlib import asynccontextmanager
+import asyncio
 import logging
+import math
 import time
 from typing import Optional, List, Dict, Any
 import os
+import orjson
 from datetime import datetime
-import sys
-from PIL import Image
-import io
 
 from core.config import get_settings
-from core.security import verify_token, get_current_user, get_current_admin_user
-from core.models import PredictionResponse, UserResponse, LoginRequest, StatsResponse, UserCreate
-from services.prediction_service import PredictionService
+from core.security import (
+    verify_token, get_current_user, get_current_admin_user, authenticate_credentials,
+    password_hasher, PasswordHashQueueFull, token_cache
+)
+from core.models import (
+    PredictionResponse, UserResponse, LoginRequest, StatsResponse, UserCreate,
+    RefreshRequest, LogoutRequest, APIKeyCreate, APIKeyResponse,
+    JobResponse, UserRole
+)
+from services.prediction_service import PredictionService, InvalidImageError
 from services.user_service import UserService
+from services.job_service import JobService, JobRejected
+from services.micro_batcher import MicroBatcher, LatestFrameChannel
+from services.health_service import HealthService
 from core.database import init_db
-from core.middleware import RateLimitMiddleware
-from core.logging_config import setup_logging
+from core.denylist import token_denylist
+from core.api_keys import api_key_manager
+from core.middleware import (
+    PipelineMiddleware, SecurityHeadersStage, RateLimitStage, MetricsStage, BodySizeLimitStage,
+    CompressionStage, DrainStage, BASIC_SECURITY_HEADERS
+)
+from core.lifecycle import drain_controller
+from core.ratelimit import request_cost
+from core.loop_monitor import EventLoopMonitor
+from core.profiler import profiler, ProfilerBusy
+from core.metrics import metrics, StageTimer
+from core.serialization import (
+    prediction_json_response, prediction_payload, prediction_ndjson, prediction_sse, fast_json_response
+)
+from core.binary_upload import split_binary_upload, InvalidBinaryUpload
+from core.conditional import CACHE_CONTROL, make_etag, etag_matches, not_modified_response
+from core.logging_config import setup_logging, logging_stats
 
 
-# Configuration du logging
+# Configuration du logging (console stdout et fichier, écrits par un thread dédié)
 setup_logging()
 
-# Ajout console stdout pour que les logs soient visibles dans Docker
-console_handler = logging.StreamHandler(sys.stdout)
-console_handler.setLevel(logging.getLevelName(os.getenv("LOG_LEVEL", "INFO")))
-formatter = logging.Formatter("🌟 [%(asctime)s] %(levelname)s in %(name)s: %(message)s")
-console_handler.setFormatter(formatter)
-logging.getLogger().addHandler(console_handler)
-
 logger = logging.getLogger(__name__)
 logger.info("main bien chargé")
 
@@ -46,19 +64,72 @@ logger.info(f"ALLOWED_HOSTS: {settings.ALLOWED_HOSTS}")
 async def lifespan(app: FastAPI):
     # Startup
     logger.info("🚀 Démarrage de l'API Projet_3...")
+    drain_controller.reset()
+    
+    # Retard de la boucle d'événements, mesuré dès le démarrage (chargement compris)
+    app.state.loop_monitor = EventLoopMonitor()
+    await app.state.loop_monitor.start()
+    
     await init_db()
     
+    # Révocations des autres workers relues en tâche de fond
+    token_denylist.start()
+    
     # Chargement du modèle de prédiction au démarrage
     app.state.prediction_service = PredictionService()
     await app.state.prediction_service.load_model()
     
     app.state.user_service = UserService()
+    app.state.health_service = HealthService(app.state.prediction_service)
+    
+    # Jobs asynchrones : reprise des jobs interrompus par un arrêt
+    app.state.job_service = JobService(app.state.prediction_service)
+    await app.state.job_service.start()
+    
+    # Micro-lots partagés par les flux temps réel (/ws/predict)
+    app.state.micro_batcher = MicroBatcher(app.state.prediction_service)
+    await app.state.micro_batcher.start()
+    metrics.gauge_callback(
+        "micro_batch_queue_depth",
+        "Images en attente d'un micro-lot",
+        lambda: app.state.micro_batcher.pending
+    )
+    metrics.gauge_callback(
+        "http_requests_in_flight",
+        "Requêtes HTTP en cours de traitement",
+        lambda: drain_controller.in_flight
+    )
+    metrics.register_cache("users", app.state.user_service.cache.stats)
+    metrics.set_info("model", "Modèle de classification chargé", {
+        "version": settings.MODEL_VERSION,
+        "path": settings.MODEL_PATH,
+        "categories": ",".join(settings.MODEL_CATEGORIES)
+    })
     
     logger.info("✅ API Projet_3 démarrée avec succès")
     yield
     
-    # Shutdown
+    # Shutdown : vidage des files et des écritures différées, dans ce qui reste
+    # du budget SHUTDOWN_TIMEOUT. Sous serve.py, le drainage (readiness à 503,
+    # nouvelles requêtes refusées, attente des requêtes en cours) a commencé dès
+    # SIGTERM, avant qu'uvicorn ne ferme le socket ; ici il ne reste en général
+    # plus de requête en cours.
     logger.info("🔄 Arrêt de l'API Projet_3...")
+    drain_controller.start_shutdown(settings.SHUTDOWN_TIMEOUT)
+    profiler.cancel()
+    remaining = drain_controller.remaining
+    
+    if not await drain_controller.wait_idle(remaining()):
+        logger.warning(f"⚠️ {drain_controller.in_flight} requête(s) encore en cours à l'arrêt")
+    await app.state.micro_batcher.stop(timeout=remaining())
+    await app.state.job_service.stop(timeout=remaining())
+    password_hasher.shutdown()
+    app.state.health_service.shutdown()
+    api_key_manager.flush_usage()
+    token_denylist.stop()
+    await rate_limit_stage.close()
+    await app.state.loop_monitor.stop()
+    logger.info("👋 API Projet_3 arrêtée")
 
 # Configuration de l'application FastAPI
 app = FastAPI(
@@ -81,18 +152,11 @@ app = FastAPI(
     """,
     version="1.0.0",
     lifespan=lifespan,
+    default_response_class=ORJSONResponse,
     docs_url="/docs",
     redoc_url="/redoc"
 )
 
-@app.middleware("http")
-async def add_security_headers(request, call_next):
-    response: Response = await call_next(request)
-    response.headers["X-Content-Type-Options"] = "nosniff"
-    response.headers["X-Frame-Options"] = "DENY"
-    response.headers["X-XSS-Protection"] = "1; mode=block"
-    return response
-
 # Configuration des middlewares de sécurité
 settings = get_settings()
 
@@ -109,7 +173,27 @@ app.add_middleware(
     allowed_hosts=settings.ALLOWED_HOSTS
 )
 
-app.add_middleware(RateLimitMiddleware)
+# Headers de sécurité, compression, métriques, drainage, limite de taille et rate
+# limiting fusionnés en une seule couche ASGI
+rate_limit_stage = RateLimitStage()
+app.add_middleware(
+    PipelineMiddleware,
+    stages=[
+        SecurityHeadersStage(BASIC_SECURITY_HEADERS), CompressionStage(), MetricsStage(),
+        DrainStage(), BodySizeLimitStage(), rate_limit_stage
+    ]
+)
+
+# Valeurs lues à chaque collecte Prometheus
+metrics.register_cache("tokens", token_cache.stats)
+metrics.register_cache("api_keys", api_key_manager.stats)
+metrics.gauge_callback("log_queue_depth", "Enregistrements en attente d'écriture", lambda: logging_stats()["queued"])
+metrics.gauge_callback("log_records_dropped", "Enregistrements abandonnés (file pleine)", lambda: logging_stats()["dropped"])
+metrics.gauge_callback(
+    "password_hash_queue_depth",
+    "Hachages bcrypt en attente ou en cours",
+    lambda: password_hasher.queued + password_hasher.in_flight
+)
 
 # Schéma de sécurité
 security = HTTPBearer()
@@ -127,18 +211,47 @@ async def root():
     }
 
 @app.get("/health", tags=["Info"])
-async def health_check():
+async def health_check(health_service: HealthService = Depends(lambda: app.state.health_service)):
     """Vérification de l'état de santé de l'API"""
+    readiness = await health_service.readiness()
+    checks = readiness["checks"]
     return {
-        "status": "healthy",
+        "status": "healthy" if readiness["ready"] else "degraded",
         "timestamp": datetime.utcnow().isoformat(),
         "services": {
-            "database": "connected",
-            "model": "loaded",
+            "database": checks["database"],
+            "model": "loaded" if checks["model"] == "ready" else checks["model"],
             "api": "running"
         }
     }
 
+@app.get("/livez", tags=["Info"])
+async def liveness():
+    """Sonde de vivacité : le processus répond (aucune dépendance vérifiée)"""
+    return fast_json_response({"status": "alive"})
+
+@app.get("/readyz", tags=["Info"])
+async def readiness(health_service: HealthService = Depends(lambda: app.state.health_service)):
+    """
+    Sonde de disponibilité
+    
+    200 une fois le modèle préchauffé à toutes les tailles de lot et la base
+    joignable, 503 sinon (l'instance ne doit pas recevoir de trafic). Résultat
+    mis en cache READINESS_CACHE_TTL secondes.
+    """
+    result = await health_service.readiness()
+    return fast_json_response(
+        {"status": "ready" if result["ready"] else "not_ready", **result["checks"]},
+        status_code=200 if result["ready"] else 503,
+        headers={"Cache-Control": "no-store"}
+    )
+
+if settings.ENABLE_METRICS:
+    @app.get(settings.METRICS_PATH, include_in_schema=False)
+    async def prometheus_metrics():
+        """Exposition des métriques au format Prometheus"""
+        return Response(content=metrics.render(), media_type=metrics.content_type)
+
 # Routes d'authentification
 @app.post("/auth/login", response_model=Dict[str, Any], tags=["Authentication"])
 async def login(
@@ -153,6 +266,13 @@ async def login(
         )
         logger.info(f"Connexion réussie pour l'utilisateur : {login_data.username}")
         return result
+    except PasswordHashQueueFull as e:
+        logger.warning(f"Connexion refusée pour {login_data.username}: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Service d'authentification saturé, réessayez plus tard",
+            headers={"Retry-After": "1"}
+        )
     except Exception as e:
         logger.error(f"Erreur de connexion pour {login_data.username}: {str(e)}")
         raise HTTPException(
@@ -160,6 +280,42 @@ async def login(
             detail="Identifiants invalides"
         )
 
+@app.post("/auth/refresh", response_model=Dict[str, Any], tags=["Authentication"])
+async def refresh(
+    refresh_data: RefreshRequest,
+    user_service: UserService = Depends(lambda: app.state.user_service)
+):
+    """Renouvellement des tokens (rotation du refresh token)"""
+    try:
+        return await user_service.refresh_tokens(refresh_data.refresh_token)
+    except Exception:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Refresh token invalide ou révoqué",
+            headers={"WWW-Authenticate": "Bearer"}
+        )
+
+@app.post("/auth/logout", tags=["Authentication"])
+async def logout(
+    logout_data: Optional[LogoutRequest] = None,
+    credentials: HTTPAuthorizationCredentials = Depends(security),
+    user_service: UserService = Depends(lambda: app.state.user_service)
+):
+    """Déconnexion : révocation du token d'accès (et du refresh token fourni)"""
+    try:
+        await user_service.logout(
+            credentials.credentials,
+            logout_data.refresh_token if logout_data else None
+        )
+        return {"message": "Déconnexion réussie"}
+    except Exception as e:
+        logger.warning(f"Échec de la déconnexion : {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Token invalide",
+            headers={"WWW-Authenticate": "Bearer"}
+        )
+
 @app.post("/auth/register", response_model=UserResponse, tags=["Authentication"])
 async def register(
     user_data: UserCreate,
@@ -175,6 +331,12 @@ async def register(
         )
         logger.info(f"Nouvel utilisateur créé : {user_data.username}")
         return user
+    except PasswordHashQueueFull as e:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Service d'authentification saturé, réessayez plus tard",
+            headers={"Retry-After": "1"}
+        )
     except Exception as e:
         logger.error(f"Erreur lors de la création de l'utilisateur : {str(e)}")
         raise HTTPException(
@@ -182,10 +344,51 @@ async def register(
             detail=str(e)
         )
 
+# Gestion des clés API (clients machines)
+def _require_interactive_session(current_user: Dict[str, Any]):
+    """Les clés API ne peuvent pas gérer d'autres clés API"""
+    if "api_key_id" in current_user:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Gestion des clés API réservée aux sessions authentifiées par token"
+        )
+
+@app.post("/auth/api-keys", response_model=APIKeyResponse, tags=["Authentication"])
+async def create_api_key(
+    key_data: APIKeyCreate,
+    current_user: Dict = Depends(get_current_user)
+):
+    """Création d'une clé API (la clé n'est affichée qu'une seule fois)"""
+    _require_interactive_session(current_user)
+    return api_key_manager.create_key(
+        current_user["user_id"],
+        key_data.name,
+        key_data.expires_in_days
+    )
+
+@app.get("/auth/api-keys", response_model=List[APIKeyResponse], tags=["Authentication"])
+async def list_api_keys(current_user: Dict = Depends(get_current_user)):
+    """Liste des clés API de l'utilisateur"""
+    _require_interactive_session(current_user)
+    return api_key_manager.list_keys(current_user["user_id"])
+
+@app.delete("/auth/api-keys/{key_id}", tags=["Authentication"])
+async def revoke_api_key(
+    key_id: int,
+    current_user: Dict = Depends(get_current_user)
+):
+    """Révocation d'une clé API"""
+    _require_interactive_session(current_user)
+    if not api_key_manager.revoke_key(current_user["user_id"], key_id):
+        raise HTTPException(status_code=404, detail="Clé API introuvable")
+    return {"message": "Clé API révoquée"}
+
 # Routes d'inférence (protégées)
 @app.post("/predict/image", response_model=PredictionResponse, tags=["Prediction"])
 async def predict_image(
+    request: Request,
     file: UploadFile = File(...),
+    timings: bool = False,
     current_user: Dict = Depends(get_current_user),
     prediction_service: PredictionService = Depends(lambda: app.state.prediction_service)
 ):
@@ -193,8 +396,10 @@ async def predict_image(
     Classification d'une image de jeu vidéo
     
     - **file**: Image au format JPG, PNG ou WEBP
+    - **timings**: Ajoute la durée de chaque étape (ms) à la réponse
     - **Retourne**: Catégorie prédite avec probabilités et métadonnées
     """
+    timer = StageTimer.from_scope(request.scope)
     try:
         # Validation du fichier
         if not file.content_type.startswith('image/'):
@@ -203,24 +408,24 @@ async def predict_image(
                 detail="Le fichier doit être une image"
             )
         
-        # Lecture et traitement de l'image
-        image_bytes = await file.read()
-
-        # tentatice de lecture avec PIL(détection image invalide)
+        # Le fichier reçu (taille déjà bornée pendant la réception) est passé
+        # tel quel au décodeur : ni copie en bytes, ni double décodage.
+        # `read` : de l'arrivée de la requête à la fin de la réception
+        timer.mark("read")
+        
+        # Prédiction (une image non décodable est signalée par InvalidImageError)
         try:
-            image = Image.open(io.BytesIO(image_bytes)).convert("RGB")
-        except Exception as e:
+            result = await prediction_service.predict_image(file.file, current_user["user_id"], timer=timer)
+        except InvalidImageError as e:
             logger.warning(f"Image invalide: {str(e)}")
             raise HTTPException(
                 status_code=400,
                 detail="Fichier image invalide ou non lisible"
             )
         
-        # Prédiction
-        result = await prediction_service.predict_image(image_bytes, current_user["user_id"])
-        
-        logger.info(f"Prédiction réalisée par {current_user['username']}: {result['prediction']}")
-        return result
+        if timings:
+            result = {**result, "timings": timer.as_milliseconds()}
+        return prediction_json_response(result, headers={"Server-Timing": timer.server_timing()})
 
     except HTTPException as http_err:
         raise http_err
@@ -232,71 +437,371 @@ async def predict_image(
             detail=f"Erreur lors de la prédiction : {str(e)}"
         )
 
+# Formats de réponse en flux de /predict/batch, choisis par le header Accept
+BATCH_STREAM_MEDIA_TYPES = ("application/x-ndjson", "text/event-stream")
+
+async def _stream_batch_results(
+    prediction_service: PredictionService,
+    images: List[Any],
+    user_id: int,
+    media_type: str,
+    timings: bool
+):
+    """Résultats de /predict/batch envoyés au fil des micro-lots (NDJSON ou SSE)"""
+    count = 0
+    async for results, timer in prediction_service.predict_stream(images, user_id):
+        for result in results:
+            if timings:
+                result = {**result, "timings": timer.as_milliseconds()}
+            if media_type == "text/event-stream":
+                yield prediction_sse(result, count)
+            else:
+                yield prediction_ndjson(result)
+            count += 1
+    
+    if media_type == "text/event-stream":
+        yield b'event: done\ndata: {"count": %d}\n\n' % count
+
 @app.post("/predict/batch", response_model=List[PredictionResponse], tags=["Prediction"])
 async def predict_batch(
+    request: Request,
     files: List[UploadFile] = File(...),
+    timings: bool = False,
     current_user: Dict = Depends(get_current_user),
     prediction_service: PredictionService = Depends(lambda: app.state.prediction_service)
 ):
-    """Classification en lot de plusieurs images"""
-    if len(files) > 10:
+    """
+    Classification en lot de plusieurs images
+    
+    Les images sont prédites par micro-lots (un appel au modèle par lot). Avec
+    `Accept: application/x-ndjson` (une ligne par image) ou `text/event-stream`
+    (un événement `prediction` par image, puis `done`), chaque résultat est
+    envoyé dès la fin de son micro-lot au lieu d'un tableau JSON final.
+    """
+    if len(files) > settings.MAX_BATCH_FILES:
         raise HTTPException(
             status_code=400,
-            detail="Maximum 10 images par batch"
+            detail=f"Maximum {settings.MAX_BATCH_FILES} images par batch"
         )
     
-    results = []
-    for file in files:
-        try:
-            image_bytes = await file.read()
-            result = await prediction_service.predict_image(image_bytes, current_user["user_id"])
-            results.append(result)
-        except Exception as e:
-            logger.error(f"Erreur sur l'image {file.filename}: {str(e)}")
-            results.append({
-                "filename": file.filename,
-                "error": str(e),
-                "prediction": None
-            })
+    images = [(file.file, file.filename) for file in files]
+    return await _batch_response(request, prediction_service, images, current_user["user_id"], timings)
+
+@app.post("/predict/batch/binary", response_model=List[PredictionResponse], tags=["Prediction"])
+async def predict_batch_binary(
+    request: Request,
+    timings: bool = False,
+    current_user: Dict = Depends(get_current_user),
+    prediction_service: PredictionService = Depends(lambda: app.state.prediction_service)
+):
+    """
+    Classification en lot à partir d'un corps binaire compact (clients scriptés)
+    
+    - `Content-Type: application/octet-stream` : images concaténées, chacune
+      précédée de sa longueur (uint32 big-endian)
+    - `Content-Type: application/msgpack` : tableau msgpack de binaires
     
-    return results
+    Sans enveloppe multipart ni fichier temporaire par image : chaque image
+    est une vue sur le corps reçu, passée directement au décodeur. Les
+    images sont nommées `image-<index>` ; réponses identiques à /predict/batch
+    (tableau JSON, NDJSON ou SSE selon le header Accept).
+    """
+    body = await request.body()
+    try:
+        views = split_binary_upload(body, request.headers.get("content-type", ""), settings.MAX_BATCH_FILES)
+    except InvalidBinaryUpload as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    images = [(view, f"image-{index}") for index, view in enumerate(views)]
+    return await _batch_response(request, prediction_service, images, current_user["user_id"], timings)
+
+async def _batch_response(
+    request: Request,
+    prediction_service: PredictionService,
+    images: List[Any],
+    user_id: int,
+    timings: bool
+) -> Response:
+    """Réponse d'une prédiction en lot : tableau JSON ou flux selon le header Accept"""
+    accept = request.headers.get("accept", "")
+    stream_media_type = next((media_type for media_type in BATCH_STREAM_MEDIA_TYPES if media_type in accept), None)
+    if stream_media_type is not None:
+        return StreamingResponse(
+            _stream_batch_results(prediction_service, images, user_id, stream_media_type, timings),
+            media_type=stream_media_type,
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+        )
+    
+    timer = StageTimer.from_scope(request.scope)
+    timer.mark("read")
+    try:
+        results = await prediction_service.predict_images(images, user_id, timer=timer)
+    except Exception as e:
+        logger.error(f"Erreur lors de la prédiction en lot : {str(e)}")
+        raise HTTPException(
+            status_code=500,
+            detail=f"Erreur lors de la prédiction : {str(e)}"
+        )
+    
+    if timings:
+        results = [{**result, "timings": timer.as_milliseconds()} for result in results]
+    
+    # Durées cumulées sur le lot
+    return prediction_json_response(results, headers={"Server-Timing": timer.server_timing()})
 
 @app.get("/predict/history", tags=["Prediction"])
 async def get_prediction_history(
+    request: Request,
     limit: int = 50,
     current_user: Dict = Depends(get_current_user),
     prediction_service: PredictionService = Depends(lambda: app.state.prediction_service)
 ):
-    """Historique des prédictions de l'utilisateur"""
+    """Historique des prédictions de l'utilisateur (ETag / If-None-Match)"""
     try:
-        history = await prediction_service.get_user_history(current_user["user_id"], limit)
-        return {"history": history}
+        user_id = current_user["user_id"]
+        etag = make_etag("history", prediction_service.epoch, user_id, prediction_service.history_version(user_id), limit)
+        if etag_matches(request.headers.get("if-none-match"), etag):
+            return not_modified_response(etag)
+        
+        history = await prediction_service.get_user_history(user_id, limit)
+        return fast_json_response({"history": history}, headers={"ETag": etag, "Cache-Control": CACHE_CONTROL})
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+# Classification continue (flux d'images de la caméra)
+async def _authenticate_websocket(websocket: WebSocket) -> Optional[Dict[str, Any]]:
+    """
+    Authentification d'une connexion WebSocket, une seule fois
+    
+    Headers `Authorization: Bearer` ou `X-API-Key` si le client peut les
+    poser, sinon premier message texte `{"token": ...}` ou `{"api_key": ...}`
+    (les navigateurs ne peuvent pas poser de headers sur un WebSocket).
+    """
+    authorization = websocket.headers.get("authorization", "")
+    token = authorization[7:] if authorization[:7].lower() == "bearer " else None
+    api_key = websocket.headers.get("x-api-key")
+    
+    if not token and not api_key:
+        try:
+            message = await asyncio.wait_for(websocket.receive_json(), settings.WS_AUTH_TIMEOUT)
+        except Exception:
+            return None
+        if isinstance(message, dict):
+            token, api_key = message.get("token"), message.get("api_key")
+    
+    return authenticate_credentials(token, api_key)
+
+@app.websocket("/ws/predict")
+async def websocket_predict(websocket: WebSocket):
+    """
+    Classification continue d'images JPEG envoyées en messages binaires
+    
+    Chaque image reçoit un numéro (`frame_id`, à partir de 1, dans l'ordre
+    d'envoi) et sa prédiction est renvoyée en JSON avec ce numéro. Les images
+    de toutes les connexions sont prédites ensemble par micro-lots. Si le
+    client envoie plus vite que le modèle ne répond, seule la dernière image
+    reçue est gardée : les autres sont signalées `{"frame_id", "status": "dropped"}`.
+    
+    Chaque image prédite est décomptée du quota de l'utilisateur (coût de
+    `/ws/predict`, partagé avec ses requêtes HTTP) ; quota épuisé : l'image
+    n'est pas prédite et `{"frame_id", "status": "rate_limited", "retry_after"}`
+    est renvoyé. Les images du flux ne sont pas ajoutées à l'historique.
+    """
+    if drain_controller.draining:
+        await websocket.close(code=status.WS_1013_TRY_AGAIN_LATER)
+        return
+    await websocket.accept()
+    
+    user = await _authenticate_websocket(websocket)
+    if user is None:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION, reason="Authentification requise")
+        return
+    await websocket.send_json({"status": "ready", "user_id": user["user_id"]})
+    
+    async def send_result(frame_id: int, result: Dict[str, Any]):
+        await websocket.send_text(orjson.dumps({"frame_id": frame_id, **prediction_payload(result)}).decode())
+    
+    async def send_dropped(frame_id: int):
+        await websocket.send_json({"frame_id": frame_id, "status": "dropped"})
+    
+    async def send_error(frame_id: int, message: str):
+        await websocket.send_json({"frame_id": frame_id, "status": "error", "error_message": message})
+    
+    async def admit(frame_id: int, frame: bytes) -> bool:
+        result = await rate_limit_stage.charge_user(user["user_id"], user["role"], request_cost("/ws/predict", len(frame)))
+        if not result.allowed:
+            await websocket.send_json({
+                "frame_id": frame_id,
+                "status": "rate_limited",
+                "retry_after": max(1, math.ceil(result.retry_after))
+            })
+        return result.allowed
+    
+    channel = LatestFrameChannel(app.state.micro_batcher, user["user_id"], send_result, send_dropped, send_error, admit)
+    worker = asyncio.create_task(channel.run())
+    frame_id = 0
+    try:
+        while True:
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                break
+            frame = message.get("bytes")
+            if frame is None:
+                continue
+            
+            frame_id += 1
+            if len(frame) > settings.MAX_FILE_SIZE:
+                await send_error(frame_id, f"Image trop volumineuse (max: {settings.MAX_FILE_SIZE / (1024*1024):.1f}MB)")
+                continue
+            await channel.push(frame_id, frame)
+    finally:
+        worker.cancel()
+        await asyncio.gather(worker, return_exceptions=True)
+        logger.info(
+            f"Flux /ws/predict terminé : {user['username']} - {frame_id} image(s), {channel.dropped} abandonnée(s)"
+        )
+
+# Jobs de classification asynchrones (grands lots)
+def _get_owned_job(job_service: JobService, job_id: str, current_user: Dict[str, Any]) -> Dict[str, Any]:
+    """Job de l'utilisateur (ou de n'importe qui pour un admin) ; 404 sinon"""
+    job = job_service.get_job(job_id)
+    if job is None or (job["user_id"] != current_user["user_id"] and current_user.get("role") != UserRole.ADMIN):
+        raise HTTPException(status_code=404, detail="Job introuvable")
+    return job
+
+@app.post("/jobs", response_model=JobResponse, status_code=status.HTTP_202_ACCEPTED, tags=["Jobs"])
+async def create_job(
+    files: List[UploadFile] = File(...),
+    current_user: Dict = Depends(get_current_user),
+    job_service: JobService = Depends(lambda: app.state.job_service)
+):
+    """
+    Classification asynchrone d'un grand nombre d'images
+    
+    - **files**: Images JPG, PNG ou WEBP, et/ou archives .zip d'images
+    - **Retourne**: Job créé ; avancement sur `/jobs/{id}`, résultats en NDJSON sur `/jobs/{id}/results`
+    """
+    try:
+        return await job_service.create_job(current_user["user_id"], [(file.filename, file.file) for file in files])
+    except JobRejected as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.get("/jobs/{job_id}", response_model=JobResponse, tags=["Jobs"])
+async def get_job(
+    job_id: str,
+    current_user: Dict = Depends(get_current_user),
+    job_service: JobService = Depends(lambda: app.state.job_service)
+):
+    """Avancement d'un job"""
+    return _get_owned_job(job_service, job_id, current_user)
+
+@app.get("/jobs/{job_id}/results", tags=["Jobs"])
+async def get_job_results(
+    job_id: str,
+    current_user: Dict = Depends(get_current_user),
+    job_service: JobService = Depends(lambda: app.state.job_service)
+):
+    """Résultats d'un job en NDJSON (une PredictionResponse par ligne), suivis jusqu'à la fin du job"""
+    _get_owned_job(job_service, job_id, current_user)
+    return StreamingResponse(job_service.stream_results(job_id), media_type="application/x-ndjson")
+
 # Routes d'administration (admin uniquement)
 @app.get("/admin/stats", response_model=StatsResponse, tags=["Admin"])
 async def get_admin_stats(
+    request: Request,
     current_admin: Dict = Depends(get_current_admin_user),
     user_service: UserService = Depends(lambda: app.state.user_service),
     prediction_service: PredictionService = Depends(lambda: app.state.prediction_service)
 ):
-    """Statistiques globales de l'API (admin uniquement)"""
+    """
+    Statistiques globales de l'API (admin uniquement)
+    
+    L'ETag suit le nombre d'utilisateurs (lu en base : les inscriptions
+    traitées par les autres workers comptent), la version de l'historique de
+    ce worker et le jour : une interrogation périodique sans changement
+    reçoit une 304 sans recalcul des statistiques. `system_info` est un
+    instantané pris lors du dernier calcul.
+    """
     try:
+        users = await user_service.get_user_count()
+        etag = make_etag("stats", prediction_service.epoch, users, prediction_service.stats_version, datetime.utcnow().date())
+        if etag_matches(request.headers.get("if-none-match"), etag):
+            return not_modified_response(etag)
+        
         stats = {
-            "users": await user_service.get_user_count(),
-            "predictions": await prediction_service.get_prediction_count(),
-            "predictions_today": await prediction_service.get_predictions_today(),
-            "top_categories": await prediction_service.get_top_categories(),
+            "users": users,
+            **await prediction_service.get_stats_rollup(),
             "system_info": {
                 "uptime": time.time(),
-                "version": "1.0.0"
+                "version": "1.0.0",
+                "password_hashing": password_hasher.stats(),
+                "token_cache": token_cache.stats(),
+                "token_denylist": token_denylist.stats(),
+                "api_keys": api_key_manager.stats(),
+                "event_loop": app.state.loop_monitor.stats()
             }
         }
-        return stats
+        return fast_json_response(stats, headers={"ETag": etag, "Cache-Control": CACHE_CONTROL})
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/admin/drain", tags=["Admin"])
+async def start_drain(current_admin: Dict = Depends(get_current_admin_user)):
+    """
+    Passage du worker en drainage (admin uniquement)
+    
+    /readyz répond 503 et les nouvelles requêtes sont refusées, les requêtes
+    en cours se terminent : à appeler avant l'arrêt (hook preStop) pour que
+    le répartiteur de charge retire l'instance sans perdre de prédiction.
+    """
+    drain_controller.start_drain()
+    logger.info(f"🚰 Drainage demandé par {current_admin['username']}")
+    return {"draining": True, "in_flight": drain_controller.in_flight}
+
+@app.post("/admin/profile", tags=["Admin"])
+async def profile_worker(
+    request: Request,
+    seconds: float = 10.0,
+    interval_ms: Optional[float] = None,
+    tracemalloc: bool = False,
+    top: int = 25,
+    current_admin: Dict = Depends(get_current_admin_user)
+):
+    """
+    Profilage par échantillonnage du worker (admin uniquement)
+    
+    Relève pendant `seconds` secondes les piles de tous les threads (boucle
+    d'événements, exécuteur des prédictions, workers des jobs) et renvoie
+    les piles repliées (`pile nombre`, une par ligne) : avec
+    `Accept: text/plain`, la réponse se passe telle quelle à flamegraph.pl
+    ou speedscope. Avec `tracemalloc=true`, la réponse JSON contient aussi
+    les `top` lignes dont les allocations ont le plus grossi.
+    
+    Seul le worker qui reçoit la requête est profilé.
+    """
+    if not 0 < seconds <= settings.PROFILER_MAX_DURATION:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Durée de profilage entre 0 et {settings.PROFILER_MAX_DURATION:g} secondes"
+        )
+    if interval_ms is not None and not 1 <= interval_ms <= 1000:
+        raise HTTPException(status_code=400, detail="Intervalle d'échantillonnage entre 1 et 1000 ms")
+    
+    logger.info(f"🔬 Profilage de {seconds:g}s demandé par {current_admin['username']}")
+    try:
+        result = await profiler.profile(
+            seconds,
+            interval=interval_ms / 1000 if interval_ms else None,
+            trace_memory=tracemalloc,
+            top=top
+        )
+    except ProfilerBusy as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    
+    if "text/plain" in request.headers.get("accept", ""):
+        return Response(content=result["collapsed"], media_type="text/plain; charset=utf-8")
+    return fast_json_response(result)
+
 @app.get("/admin/users", tags=["Admin"])
 async def get_users(
     skip: int = 0,
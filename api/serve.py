@@ -0,0 +1,333 @@
+"""
+Serveur de production : processus maître et workers uvicorn préforkés
+
+Le maître ouvre le socket d'écoute, importe l'application (TensorFlow, Keras,
+modules de l'API) et lit le fichier du modèle en mémoire, puis forke les
+workers : ces pages sont partagées en copie sur écriture au lieu d'être
+chargées par chaque worker. Le runtime TensorFlow, lui, n'est pas
+initialisé avant le fork (ses threads ne survivent pas au fork) : chaque
+worker construit son modèle depuis le fichier partagé, le préchauffe et
+sert les requêtes sur le socket commun.
+
+Le nombre de workers vient de WEB_WORKERS (1 par défaut, 0 : selon les CPU)
+et les threads TensorFlow de chaque worker sont calculés à partir des CPU
+disponibles (affinité et quota cgroup). Historique des prédictions,
+statistiques, ETags et métriques restent propres à chaque worker : avec
+plusieurs workers, ces réponses dépendent du worker qui accepte la
+connexion. Le maître
+relance un worker qui s'arrête, transmet SIGTERM/SIGINT et journalise la
+mémoire de chaque worker (RSS, PSS et mémoire privée).
+
+À SIGTERM, chaque worker passe en drainage alors que le socket est encore
+ouvert (/readyz à 503, nouvelles requêtes refusées), attend ses requêtes en
+cours puis laisse uvicorn fermer les connexions et arrêter l'application,
+le tout dans SHUTDOWN_TIMEOUT. Derrière un orchestrateur, un hook preStop
+(par exemple `sleep 5`) reste nécessaire pour que le répartiteur de charge
+retire l'instance avant SIGTERM.
+
+Usage :
+    python serve.py [--workers N] [--host 0.0.0.0] [--port 8080] [--no-preload]
+"""
+import argparse
+import asyncio
+import gc
+import logging
+import math
+import os
+import signal
+import socket
+import sys
+import time
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+import uvicorn
+
+API_DIR = Path(__file__).resolve().parent
+sys.path.insert(0, str(API_DIR))
+
+logger = logging.getLogger("serve")
+
+def available_cpus() -> int:
+    """CPU utilisables : affinité du processus, borné par le quota cgroup v2 (conteneur)"""
+    cpus = len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else (os.cpu_count() or 1)
+    try:
+        quota, period = Path("/sys/fs/cgroup/cpu.max").read_text().split()
+        if quota != "max":
+            cpus = min(cpus, max(1, math.ceil(int(quota) / int(period))))
+    except (OSError, ValueError):
+        pass
+    return cpus
+
+def plan_workers(cpus: int, workers: int = 0) -> Tuple[int, int]:
+    """
+    Nombre de workers et threads TensorFlow intra-op par worker
+
+    Par défaut un worker pour deux CPU : chaque prédiction profite de deux
+    threads de calcul et les workers se partagent les CPU sans se les
+    disputer (workers x threads ≈ CPU).
+    """
+    workers = workers or max(1, cpus // 2)
+    return workers, max(1, cpus // workers)
+
+def memory_usage(pid: int) -> Dict[str, int]:
+    """Mémoire d'un processus en octets : RSS, PSS (pages partagées au prorata) et privée"""
+    usage = {"rss": 0, "pss": 0, "private": 0}
+    try:
+        with open(f"/proc/{pid}/smaps_rollup") as smaps:
+            for line in smaps:
+                field, value = line.split(":", 1)
+                kilobytes = int(value.split()[0]) * 1024 if value.strip().endswith("kB") else 0
+                if field == "Rss":
+                    usage["rss"] = kilobytes
+                elif field == "Pss":
+                    usage["pss"] = kilobytes
+                elif field in ("Private_Clean", "Private_Dirty"):
+                    usage["private"] += kilobytes
+    except (OSError, ValueError):
+        pass
+    return usage
+
+class DrainingServer(uvicorn.Server):
+    """
+    Serveur uvicorn qui draine le worker dès SIGTERM
+
+    uvicorn ferme le socket et coupe les requêtes (timeout_graceful_shutdown)
+    avant l'arrêt du cycle de vie de l'application : le drainage doit donc
+    commencer ici, au signal. Les requêtes en cours sont attendues dans le
+    budget SHUTDOWN_TIMEOUT, puis uvicorn s'arrête avec ce qui reste du
+    budget. Un second signal arrête le worker sans attendre.
+    """
+
+    _draining: Optional[asyncio.Task] = None
+
+    def handle_exit(self, sig, frame):
+        from core.config import settings
+        from core.lifecycle import drain_controller
+
+        if self._draining is not None or self.should_exit:
+            self.config.timeout_graceful_shutdown = max(1, math.ceil(drain_controller.remaining()))
+            return super().handle_exit(sig, frame)
+
+        drain_controller.start_shutdown(settings.SHUTDOWN_TIMEOUT)
+        self._draining = asyncio.get_event_loop().create_task(self._drain(drain_controller))
+
+    async def _drain(self, drain_controller):
+        if not await drain_controller.wait_idle(drain_controller.remaining()):
+            logger.warning(f"⚠️ {drain_controller.in_flight} requête(s) encore en cours, fermeture des connexions")
+        # Fermeture des connexions restantes (flux, WebSocket) dans le reste du budget
+        self.config.timeout_graceful_shutdown = max(1, math.ceil(drain_controller.remaining()))
+        self.should_exit = True
+
+class PreforkServer:
+    """Processus maître : préchargement, fork et supervision des workers"""
+
+    def __init__(self, host: str, port: int, workers: int, tf_threads: int, preload: bool = True):
+        self.host = host
+        self.port = port
+        self.workers = workers
+        self.tf_threads = tf_threads
+        self.preload = preload
+        self.children: Dict[int, int] = {}  # pid -> numéro du worker
+        self.stopping = False
+        self.socket: Optional[socket.socket] = None
+        self.app = None
+
+    def _bind(self):
+        self.socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.socket.bind((self.host, self.port))
+        self.socket.listen(2048)
+        self.socket.set_inheritable(True)
+
+    def _preload(self):
+        """Import de l'application et lecture du modèle, avant tout fork"""
+        start = time.perf_counter()
+        from main import app
+        from core.logging_config import stop_logging
+        from services.prediction_service import preload_model_file
+
+        self.app = app
+        model_size = preload_model_file()
+
+        # Tables et utilisateurs par défaut créés une fois, ici : les workers
+        # ne se disputent pas la création au démarrage. Aucune connexion de la
+        # base n'est transmise aux workers.
+        from core.database import init_db, engine
+        asyncio.run(init_db())
+        engine.dispose()
+
+        # Aucun thread ne doit tourner au moment du fork : l'écrivain des logs
+        # est arrêté (chaque worker relance le sien) et le maître journalise
+        # directement sur la sortie standard
+        stop_logging()
+        self._master_logging()
+
+        # Objets du préchargement exclus du ramasse-miettes : leurs pages ne
+        # sont pas recopiées par un passage du GC dans un worker
+        gc.collect()
+        gc.freeze()
+        logger.info(
+            f"📦 Application préchargée en {time.perf_counter() - start:.1f}s "
+            f"(modèle : {model_size / 1e6:.1f} Mo, {gc.get_freeze_count()} objets gelés)"
+        )
+
+    @staticmethod
+    def _master_logging():
+        logging.basicConfig(
+            stream=sys.stdout,
+            level=logging.INFO,
+            format="%(asctime)s | %(name)s | %(levelname)s | %(message)s",
+            force=True
+        )
+
+    def _spawn(self, number: int):
+        pid = os.fork()
+        if pid:
+            self.children[pid] = number
+            return
+
+        # Worker
+        code = 0
+        try:
+            self._run_worker(number)
+        except BaseException as e:
+            logger.error(f"❌ Worker {number} arrêté sur erreur : {str(e)}")
+            code = 1
+        finally:
+            # os._exit saute les hooks atexit : la file de logs (journaux du
+            # drainage et de l'arrêt compris) est vidée explicitement
+            from core.logging_config import stop_logging
+            stop_logging()
+            os._exit(code)
+
+    def _run_worker(self, number: int):
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+        signal.signal(signal.SIGINT, signal.SIG_DFL)
+
+        if self.app is None:
+            from main import app
+            self.app = app
+        else:
+            from core.logging_config import setup_logging
+            setup_logging()
+
+        from core.config import settings
+        config = uvicorn.Config(
+            self.app,
+            lifespan="on",
+            log_config=None,
+            timeout_graceful_shutdown=int(settings.SHUTDOWN_TIMEOUT)
+        )
+        logger.info(f"👷 Worker {number} démarré (pid {os.getpid()})")
+        DrainingServer(config).run(sockets=[self.socket])
+
+    def _handle_stop(self, signum, frame):
+        self.stopping = True
+
+    def _reap(self):
+        """Workers arrêtés : relancés, sauf pendant l'arrêt du serveur"""
+        while self.children:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                return
+            if pid == 0:
+                return
+
+            number = self.children.pop(pid, None)
+            if number is not None and not self.stopping:
+                logger.warning(f"⚠️ Worker {number} (pid {pid}) arrêté (statut {status}), relance")
+                self._spawn(number)
+
+    def report_memory(self):
+        """RSS, PSS et mémoire privée de chaque worker (et du maître)"""
+        total_pss = 0
+        for pid, number in sorted(self.children.items(), key=lambda item: item[1]):
+            usage = memory_usage(pid)
+            total_pss += usage["pss"]
+            logger.info(
+                f"📊 Worker {number} (pid {pid}) : RSS {usage['rss'] / 1e6:.0f} Mo, "
+                f"PSS {usage['pss'] / 1e6:.0f} Mo, privée {usage['private'] / 1e6:.0f} Mo"
+            )
+        master = memory_usage(os.getpid())
+        logger.info(
+            f"📊 Maître : RSS {master['rss'] / 1e6:.0f} Mo ; "
+            f"total PSS {(total_pss + master['pss']) / 1e6:.0f} Mo pour {len(self.children)} worker(s)"
+        )
+
+    def run(self, report_interval: float):
+        from core.config import settings
+
+        # Lu par chaque worker au chargement du modèle
+        settings.TF_INTRA_OP_THREADS = self.tf_threads
+        settings.TF_INTER_OP_THREADS = 1
+
+        self._bind()
+        if self.preload:
+            self._preload()
+        else:
+            self._master_logging()
+
+        signal.signal(signal.SIGTERM, self._handle_stop)
+        signal.signal(signal.SIGINT, self._handle_stop)
+        logger.info(
+            f"🚀 {self.workers} worker(s) sur {self.host}:{self.port}, "
+            f"{self.tf_threads} thread(s) TensorFlow chacun (préchargement : {'oui' if self.preload else 'non'})"
+        )
+        for number in range(1, self.workers + 1):
+            self._spawn(number)
+
+        next_report = time.monotonic() + min(report_interval, 60.0)
+        while not self.stopping:
+            time.sleep(0.5)
+            self._reap()
+            if report_interval and time.monotonic() >= next_report:
+                self.report_memory()
+                next_report = time.monotonic() + report_interval
+
+        self._shutdown()
+
+    def _shutdown(self):
+        """
+        SIGTERM aux workers (drainage), puis SIGKILL après le délai
+
+        Chaque worker tient dans SHUTDOWN_TIMEOUT (drainage, fermeture des
+        connexions et vidage des files partagent ce budget) ; la marge couvre
+        l'écriture des derniers logs et la sortie du processus.
+        """
+        from core.config import settings
+
+        logger.info(f"🔄 Arrêt de {len(self.children)} worker(s)...")
+        for pid in self.children:
+            os.kill(pid, signal.SIGTERM)
+
+        deadline = time.monotonic() + settings.SHUTDOWN_TIMEOUT + 5
+        while self.children and time.monotonic() < deadline:
+            self._reap()
+            time.sleep(0.1)
+        for pid in self.children:
+            logger.warning(f"⚠️ Worker pid {pid} toujours actif : SIGKILL")
+            os.kill(pid, signal.SIGKILL)
+        self.socket.close()
+
+def main():
+    from core.config import settings
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--workers", type=int, default=settings.WEB_WORKERS, help="0 : selon les CPU")
+    parser.add_argument("--report-interval", type=float, default=settings.WORKER_MEMORY_REPORT_INTERVAL)
+    parser.add_argument("--no-preload", action="store_true", help="chaque worker importe l'application lui-même")
+    args = parser.parse_args()
+
+    workers, tf_threads = plan_workers(available_cpus(), args.workers)
+    if settings.TF_INTRA_OP_THREADS:
+        tf_threads = settings.TF_INTRA_OP_THREADS
+
+    server = PreforkServer(args.host, args.port, workers, tf_threads, preload=not args.no_preload)
+    server.run(args.report_interval)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+import asyncio
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Optional
+
+from core.config import settings
+from core.database import check_db_connection
+from core.lifecycle import drain_controller
+from services.prediction_service import PredictionService
+
+logger = logging.getLogger(__name__)
+
+class HealthService:
+    """
+    Sondes de vivacité (/livez) et de disponibilité (/readyz)
+
+    L'API n'est disponible qu'une fois le modèle chargé et préchauffé à toutes
+    les tailles de lot, et la base de données joignable. Le résultat est
+    gardé READINESS_CACHE_TTL secondes : des sondes rapprochées (orchestrateur,
+    répartiteur de charge) ne déclenchent qu'une requête `SELECT 1`. Un worker
+    en drainage n'est plus disponible, immédiatement (sans attendre le TTL).
+
+    Le ping de la base passe par un thread dédié, pas par l'exécuteur par
+    défaut qu'occupent les prédictions : sous charge d'inférence, la sonde
+    ne fait pas la queue derrière `model.predict` et ne retire pas du
+    service un worker occupé mais sain. Il est borné à `db_timeout` secondes.
+    """
+
+    def __init__(
+        self,
+        prediction_service: PredictionService,
+        ttl: Optional[float] = None,
+        db_timeout: Optional[float] = None
+    ):
+        self.prediction_service = prediction_service
+        self.ttl = settings.READINESS_CACHE_TTL if ttl is None else ttl
+        self.db_timeout = settings.READINESS_DB_TIMEOUT if db_timeout is None else db_timeout
+        self._cached: Optional[Dict[str, Any]] = None
+        self._checked_at = 0.0
+        self._lock = asyncio.Lock()
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        # Création paresseuse : recréé après un arrêt (nouveau lifespan)
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="readiness")
+        return self._executor
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+
+    def model_status(self) -> str:
+        service = self.prediction_service
+        if service.is_warmed_up:
+            return "ready"
+        return "warming_up" if service.is_model_loaded else "not_loaded"
+
+    async def _check(self) -> Dict[str, Any]:
+        # Session SQLAlchemy synchrone : hors de la boucle d'événements, dans
+        # le thread de la sonde
+        try:
+            database_ok = await asyncio.wait_for(
+                asyncio.wrap_future(self._get_executor().submit(check_db_connection)),
+                timeout=self.db_timeout
+            )
+        except asyncio.TimeoutError:
+            logger.warning(f"⚠️ Ping de la base sans réponse après {self.db_timeout} s")
+            database_ok = False
+
+        checks = {
+            "model": self.model_status(),
+            "database": "connected" if database_ok else "unavailable",
+            "state": "serving"
+        }
+        ready = checks["model"] == "ready" and database_ok
+        if not ready:
+            logger.warning(f"⚠️ API non disponible : {checks}")
+        return {"ready": ready, "checks": checks}
+
+    async def readiness(self) -> Dict[str, Any]:
+        """État de disponibilité, recalculé au plus une fois par TTL"""
+        if drain_controller.draining:
+            return {"ready": False, "checks": {"model": self.model_status(), "database": "not_checked", "state": "draining"}}
+
+        async with self._lock:  # sondes simultanées : une seule vérification
+            now = time.monotonic()
+            if self._cached is None or now - self._checked_at >= self.ttl:
+                self._cached = await self._check()
+                self._checked_at = time.monotonic()
+            return self._cached
+
@@ -0,0 +1,389 @@
+import asyncio
+import json
+import logging
+import os
+import shutil
+import socket
+import uuid
+import zipfile
+from datetime import datetime
+from pathlib import Path
+from typing import Any, AsyncIterator, BinaryIO, Dict, List, Optional, Sequence, Set, Tuple
+
+import orjson
+
+from core.config import settings
+from core.database import get_db_context, Job, JobCRUD
+from core.models import JobStatus, PredictionStatus
+from core.serialization import prediction_ndjson
+from services.prediction_service import PredictionService
+
+logger = logging.getLogger(__name__)
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".webp")
+MANIFEST_FILE = "manifest.json"
+RESULTS_FILE = "results.ndjson"
+FINISHED_STATUSES = (JobStatus.COMPLETED.value, JobStatus.FAILED.value)
+
+# Relecture du fichier de résultats pendant un suivi, même sans notification
+# (job traité par un autre processus)
+FOLLOW_POLL_INTERVAL = 1.0
+
+class JobRejected(ValueError):
+    """Envoi refusé : aucune image, trop d'images ou archive invalide"""
+
+def _copy_bounded(source: BinaryIO, destination: BinaryIO, limit: int):
+    """
+    Copie d'au plus `limit + 1` octets
+
+    Un fichier (ou un membre d'archive) plus gros que la limite est tronqué
+    juste au-delà : il sera signalé comme trop volumineux à la prédiction,
+    sans avoir été décompressé en entier.
+    """
+    remaining = limit + 1
+    while remaining > 0:
+        chunk = source.read(min(1024 * 1024, remaining))
+        if not chunk:
+            break
+        destination.write(chunk)
+        remaining -= len(chunk)
+
+class JobService:
+    """
+    Classification asynchrone de grands lots d'images
+
+    Les images d'un job sont écrites dans JOBS_DIR/<id>/ avec un manifeste,
+    l'état est persisté dans la table `jobs` et les résultats sont ajoutés
+    au fil de l'eau dans un fichier NDJSON. Des workers traitent les images
+    par lots de INFERENCE_BATCH_SIZE (un appel au modèle par lot).
+
+    Plusieurs processus (workers préforkés, instances) partagent la table :
+    un job est pris en charge par un UPDATE conditionnel qui pose un bail
+    (`owner`, `lease_expires_at`), prolongé à chaque lot. Un seul processus
+    traite donc un job et écrit son fichier de résultats. Au démarrage puis
+    toutes les JOB_SCAN_INTERVAL secondes, les jobs en attente et ceux dont
+    le bail a expiré (processus arrêté brutalement) sont repris là où leur
+    fichier de résultats s'arrête ; un arrêt normal rend ses jobs aussitôt.
+    """
+
+    def __init__(
+        self,
+        prediction_service: PredictionService,
+        jobs_dir: Optional[str] = None,
+        workers: Optional[int] = None,
+        batch_size: Optional[int] = None
+    ):
+        self.prediction_service = prediction_service
+        self.jobs_dir = Path(jobs_dir or settings.JOBS_DIR)
+        self.workers = workers or settings.JOB_WORKERS
+        self.batch_size = batch_size or settings.INFERENCE_BATCH_SIZE
+        self._queue: Optional[asyncio.Queue] = None
+        self._tasks: List[asyncio.Task] = []
+        self._events: Dict[str, asyncio.Event] = {}
+        self._busy: Set[asyncio.Task] = set()  # workers en train de traiter un job
+        self._queued: Set[str] = set()  # jobs en file ou en cours dans ce processus
+        self._stopping = False
+        self.lease_seconds = settings.JOB_LEASE_SECONDS
+        # Identifiant unique du processus (un redémarrage change d'identifiant)
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+    async def start(self):
+        """Reprise des jobs non terminés et démarrage des workers"""
+        self._queue = asyncio.Queue()
+        self._queued.clear()
+        self._stopping = False
+
+        resumed = self._enqueue_claimable()
+        if resumed:
+            logger.info(f"🔄 Reprise de {resumed} job(s) non terminé(s)")
+
+        self._tasks = [
+            asyncio.create_task(self._worker(), name=f"job-worker-{i}")
+            for i in range(self.workers)
+        ]
+        self._tasks.append(asyncio.create_task(self._scan(), name="job-scanner"))
+
+    def _enqueue(self, job_id: str):
+        if job_id not in self._queued:
+            self._queued.add(job_id)
+            self._queue.put_nowait(job_id)
+
+    def _enqueue_claimable(self) -> int:
+        """Mise en file des jobs en attente ou abandonnés (la prise en charge se fait au traitement)"""
+        with get_db_context() as db:
+            claimable = [job_id for (job_id,) in JobCRUD.get_claimable(db)]
+        new = [job_id for job_id in claimable if job_id not in self._queued]
+        for job_id in new:
+            self._enqueue(job_id)
+        return len(new)
+
+    async def _scan(self):
+        """Recherche périodique des jobs créés ailleurs ou abandonnés par un processus arrêté"""
+        while not self._stopping:
+            await asyncio.sleep(settings.JOB_SCAN_INTERVAL)
+            try:
+                self._enqueue_claimable()
+            except Exception as e:
+                logger.error(f"❌ Recherche des jobs à reprendre : {str(e)}")
+
+    async def stop(self, timeout: Optional[float] = None):
+        """
+        Arrêt des workers ; un job interrompu est rendu (remis en attente)
+        et repris par un autre processus ou au prochain démarrage
+
+        Avec `timeout`, les workers occupés terminent d'abord le lot en cours
+        (résultats écrits et progression enregistrée) puis s'arrêtent avant le
+        suivant, au plus `timeout` secondes.
+        """
+        self._stopping = True
+        busy = [task for task in self._tasks if task in self._busy]
+        for task in self._tasks:
+            if task not in busy or not timeout:
+                task.cancel()
+        if busy and timeout:
+            await asyncio.wait(busy, timeout=timeout)
+            for task in busy:
+                task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        self._busy.clear()
+
+        with get_db_context() as db:
+            released = JobCRUD.release_jobs(db, self.owner)
+        if released:
+            logger.info(f"⏸️ {released} job(s) interrompu(s) remis en attente")
+
+    @property
+    def pending(self) -> int:
+        """Jobs en attente d'un worker"""
+        return self._queue.qsize() if self._queue is not None else 0
+
+    @staticmethod
+    def _to_dict(job: Job) -> Dict[str, Any]:
+        """Conversion d'une ligne `Job` en dictionnaire détaché de la session"""
+        return {
+            "id": job.id,
+            "user_id": job.user_id,
+            "status": JobStatus(job.status),
+            "total": job.total,
+            "processed": job.processed,
+            "failed": job.failed,
+            "progress": job.processed / job.total if job.total else 1.0,
+            "created_at": job.created_at,
+            "updated_at": job.updated_at,
+            "completed_at": job.completed_at,
+            "error_message": job.error_message,
+            "results_url": f"/jobs/{job.id}/results"
+        }
+
+    def _store_uploads(self, job_dir: Path, uploads: Sequence[Tuple[Optional[str], BinaryIO]]) -> List[Dict[str, Any]]:
+        """Écriture des images (et du contenu des archives zip) sur disque"""
+        images_dir = job_dir / "images"
+        images_dir.mkdir(parents=True)
+        manifest: List[Dict[str, Any]] = []
+
+        def add(filename: Optional[str], stream: BinaryIO):
+            if len(manifest) >= settings.MAX_JOB_FILES:
+                raise JobRejected(f"Maximum {settings.MAX_JOB_FILES} images par job")
+            stored = f"{len(manifest):05d}{Path(filename or '').suffix.lower()}"
+            with open(images_dir / stored, "wb") as destination:
+                _copy_bounded(stream, destination, settings.MAX_FILE_SIZE)
+            manifest.append({"file": stored, "filename": filename})
+
+        try:
+            for filename, stream in uploads:
+                if not (filename or "").lower().endswith(".zip"):
+                    add(filename, stream)
+                    continue
+
+                if not zipfile.is_zipfile(stream):
+                    raise JobRejected(f"Archive zip invalide : {filename}")
+                with zipfile.ZipFile(stream) as archive:
+                    for member in archive.infolist():
+                        name = member.filename
+                        if member.is_dir() or name.startswith("__MACOSX/") or not name.lower().endswith(IMAGE_EXTENSIONS):
+                            continue
+                        with archive.open(member) as member_stream:
+                            add(Path(name).name, member_stream)
+
+            if not manifest:
+                raise JobRejected("Aucune image à traiter")
+
+            (job_dir / MANIFEST_FILE).write_text(json.dumps(manifest))
+            return manifest
+
+        except Exception:
+            shutil.rmtree(job_dir, ignore_errors=True)
+            raise
+
+    async def create_job(self, user_id: int, uploads: Sequence[Tuple[Optional[str], BinaryIO]]) -> Dict[str, Any]:
+        """
+        Création d'un job à partir des fichiers reçus
+
+        Args:
+            user_id: ID de l'utilisateur
+            uploads: Couples (nom du fichier, fichier) ; les archives .zip sont
+                dépliées (images JPG, PNG ou WEBP uniquement)
+
+        Returns:
+            État initial du job
+        """
+        job_id = uuid.uuid4().hex
+        loop = asyncio.get_event_loop()
+        manifest = await loop.run_in_executor(None, self._store_uploads, self.jobs_dir / job_id, uploads)
+
+        with get_db_context() as db:
+            job = self._to_dict(JobCRUD.create_job(db, job_id, user_id, len(manifest)))
+
+        # Sans worker démarré, le job reste en attente : un autre processus
+        # ou le prochain démarrage le prendra en charge
+        if self._queue is not None:
+            self._enqueue(job_id)
+
+        logger.info(f"📦 Job {job_id} créé : {len(manifest)} image(s) (utilisateur {user_id})")
+        return job
+
+    def get_job(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """État d'un job (None si inconnu)"""
+        with get_db_context() as db:
+            job = JobCRUD.get_job(db, job_id)
+            return self._to_dict(job) if job else None
+
+    async def _worker(self):
+        task = asyncio.current_task()
+        while not self._stopping:
+            job_id = await self._queue.get()
+            self._busy.add(task)
+            try:
+                await self._run_job(job_id)
+            except Exception as e:
+                logger.error(f"❌ Job {job_id} en échec : {str(e)}")
+                with get_db_context() as db:
+                    JobCRUD.update_owned_job(
+                        db, job_id, self.owner,
+                        status=JobStatus.FAILED.value,
+                        lease_expires_at=None,
+                        error_message=str(e),
+                        completed_at=datetime.utcnow()
+                    )
+                self._notify(job_id)
+            finally:
+                self._busy.discard(task)
+                self._queued.discard(job_id)
+                self._queue.task_done()
+
+    @staticmethod
+    def _recover_results(path: Path) -> Tuple[int, int]:
+        """Résultats déjà écrits (une ligne incomplète, après un arrêt brutal, est retirée)"""
+        if not path.exists():
+            return 0, 0
+
+        data = path.read_bytes()
+        complete = data[:data.rfind(b"\n") + 1]
+        if len(complete) != len(data):
+            with open(path, "r+b") as results:
+                results.truncate(len(complete))
+
+        lines = complete.splitlines()
+        failed = sum(orjson.loads(line)["status"] == PredictionStatus.ERROR.value for line in lines)
+        return len(lines), failed
+
+    async def _run_job(self, job_id: str):
+        # Prise en charge : terminé, ou traité par un autre processus -> rien à faire
+        with get_db_context() as db:
+            if not JobCRUD.claim_job(db, job_id, self.owner, self.lease_seconds):
+                return
+            user_id = JobCRUD.get_job(db, job_id).user_id
+
+        job_dir = self.jobs_dir / job_id
+        manifest = json.loads((job_dir / MANIFEST_FILE).read_text())
+        results_path = job_dir / RESULTS_FILE
+        processed, failed = self._recover_results(results_path)
+
+        with get_db_context() as db:
+            JobCRUD.update_owned_job(db, job_id, self.owner, processed=processed, failed=failed)
+
+        with open(results_path, "ab") as results_file:
+            for start in range(processed, len(manifest), self.batch_size):
+                if self._stopping:
+                    logger.info(f"⏸️ Job {job_id} interrompu après {processed} image(s), repris au prochain démarrage")
+                    return
+                chunk = manifest[start:start + self.batch_size]
+                results = await self.prediction_service.predict_images(
+                    [(job_dir / "images" / item["file"], item["filename"]) for item in chunk],
+                    user_id
+                )
+
+                processed += len(results)
+                failed += sum(result["status"] == PredictionStatus.ERROR for result in results)
+
+                # Progression et prolongation du bail avant l'écriture : un
+                # processus qui a perdu le job n'écrit plus dans ses résultats
+                with get_db_context() as db:
+                    owned = JobCRUD.update_owned_job(
+                        db, job_id, self.owner, lease_seconds=self.lease_seconds,
+                        processed=processed, failed=failed
+                    )
+                if not owned:
+                    logger.warning(f"⚠️ Job {job_id} repris par un autre processus, traitement abandonné")
+                    return
+
+                results_file.write(b"".join(prediction_ndjson(result) for result in results))
+                results_file.flush()
+                self._notify(job_id)
+
+        with get_db_context() as db:
+            JobCRUD.update_owned_job(
+                db, job_id, self.owner,
+                status=JobStatus.COMPLETED.value, completed_at=datetime.utcnow(), lease_expires_at=None
+            )
+        self._notify(job_id)
+
+        # Les images ne servent plus : seuls les résultats sont conservés
+        shutil.rmtree(job_dir / "images", ignore_errors=True)
+        logger.info(f"✅ Job {job_id} terminé : {processed} image(s), {failed} en erreur")
+
+    def _notify(self, job_id: str):
+        """Réveil des clients qui suivent les résultats du job"""
+        event = self._events.pop(job_id, None)
+        if event is not None:
+            event.set()
+
+    @staticmethod
+    def _read_complete_lines(path: Path, offset: int) -> bytes:
+        if not path.exists():
+            return b""
+        with open(path, "rb") as results:
+            results.seek(offset)
+            data = results.read()
+        return data[:data.rfind(b"\n") + 1]
+
+    async def stream_results(self, job_id: str) -> AsyncIterator[bytes]:
+        """
+        Résultats du job en NDJSON, une ligne par image
+
+        Les résultats déjà écrits sont envoyés immédiatement ; tant que le job
+        n'est pas terminé, le flux reste ouvert et suit les nouveaux lots.
+        """
+        path = self.jobs_dir / job_id / RESULTS_FILE
+        offset = 0
+
+        while True:
+            # Événement pris avant la lecture : aucune notification n'est perdue
+            event = self._events.setdefault(job_id, asyncio.Event())
+            job = self.get_job(job_id)
+
+            data = self._read_complete_lines(path, offset)
+            if data:
+                offset += len(data)
+                yield data
+                continue
+
+            if job is None or job["status"].value in FINISHED_STATUSES:
+                self._events.pop(job_id, None)
+                return
+
+            try:
+                await asyncio.wait_for(event.wait(), FOLLOW_POLL_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
@@ -0,0 +1,195 @@
+import asyncio
+import logging
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from core.config import settings
+from services.prediction_service import ImageSource, PredictionService
+
+logger = logging.getLogger(__name__)
+
+class MicroBatcher:
+    """
+    Regroupement des prédictions concurrentes en micro-lots
+
+    Les requêtes soumises (par toutes les connexions) sont mises en file ;
+    dès qu'une requête arrive, le batcher attend au plus `max_wait` secondes
+    que d'autres la rejoignent, puis prédit le lot (au plus `max_batch_size`
+    images) en un seul appel au modèle. Une requête dont l'appelant est parti
+    avant le traitement est retirée du lot.
+    """
+
+    def __init__(
+        self,
+        prediction_service: PredictionService,
+        max_batch_size: Optional[int] = None,
+        max_wait: Optional[float] = None
+    ):
+        self.prediction_service = prediction_service
+        self.max_batch_size = max_batch_size or settings.INFERENCE_BATCH_SIZE
+        self.max_wait = settings.MICRO_BATCH_MAX_WAIT_MS / 1000 if max_wait is None else max_wait
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self._current: List[Tuple[Any, ...]] = []  # lot en constitution ou en cours
+
+    async def start(self):
+        self._queue = asyncio.Queue()
+        self._task = asyncio.create_task(self._run(), name="micro-batcher")
+
+    async def stop(self, timeout: Optional[float] = None):
+        """
+        Arrêt du batcher
+
+        Avec `timeout`, les requêtes déjà soumises sont d'abord prédites (au
+        plus `timeout` secondes) ; celles qui restent ensuite sont en échec.
+        """
+        if timeout and self._task is not None:
+            deadline = time.monotonic() + timeout
+            while (self._current or not self._queue.empty()) and time.monotonic() < deadline:
+                await asyncio.sleep(0.01)
+
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+        # Requêtes du lot interrompu et requêtes jamais traitées
+        pending = self._current
+        self._current = []
+        while self._queue is not None and not self._queue.empty():
+            pending.append(self._queue.get_nowait())
+        for *_, future in pending:
+            if not future.done():
+                future.set_exception(RuntimeError("Service de prédiction arrêté"))
+
+    @property
+    def pending(self) -> int:
+        """Requêtes en attente d'un micro-lot"""
+        return self._queue.qsize() if self._queue is not None else 0
+
+    async def submit(
+        self,
+        image: ImageSource,
+        user_id: int,
+        filename: Optional[str] = None,
+        record: bool = True
+    ) -> Dict[str, Any]:
+        """Prédiction d'une image au sein du prochain micro-lot (`record` : ajout à l'historique)"""
+        if self._task is None:
+            raise RuntimeError("Service de prédiction arrêté")
+
+        future = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait((image, filename, user_id, record, future))
+        return await future
+
+    async def _collect(self) -> List[Tuple[Any, ...]]:
+        """Premier élément de la file, puis ceux arrivés avant l'échéance"""
+        loop = asyncio.get_running_loop()
+        batch = self._current = [await self._queue.get()]
+        deadline = loop.time() + self.max_wait
+
+        while len(batch) < self.max_batch_size:
+            if not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+                continue
+
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                break
+
+            # asyncio.wait (et non wait_for) : un élément reçu n'est jamais perdu,
+            # même si le batcher est arrêté pendant l'attente
+            getter = asyncio.ensure_future(self._queue.get())
+            try:
+                await asyncio.wait({getter}, timeout=remaining)
+            finally:
+                if getter.done() and not getter.cancelled():
+                    batch.append(getter.result())
+                else:
+                    getter.cancel()
+            if not getter.done() or getter.cancelled():
+                break
+
+        return batch
+
+    async def _run(self):
+        while True:
+            batch = self._current = [item for item in await self._collect() if not item[-1].done()]
+            if not batch:
+                continue
+
+            try:
+                results = await self.prediction_service.predict_requests(
+                    [(image, filename, user_id) for image, filename, user_id, _, _ in batch],
+                    record=[record for _, _, _, record, _ in batch]
+                )
+            except Exception as e:
+                logger.error(f"Erreur micro-lot ({len(batch)} image(s)) : {str(e)}")
+                for *_, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                self._current = []
+                continue
+
+            for (*_, future), result in zip(batch, results):
+                if not future.done():
+                    future.set_result(result)
+            self._current = []
+
+class LatestFrameChannel:
+    """
+    File d'une connexion de flux vidéo : la dernière image l'emporte
+
+    Une seule image de la connexion est en cours de prédiction à la fois, et
+    une seule attend son tour : une nouvelle image remplace celle qui attend,
+    qui est signalée comme abandonnée. Un client plus rapide que le modèle
+    reçoit donc toujours la prédiction de sa vue la plus récente.
+
+    Avant sa prédiction, chaque image passe par `admit` (quota de
+    l'utilisateur) : une image refusée n'est pas prédite. Les images d'un
+    flux ne sont pas ajoutées à l'historique des prédictions.
+    """
+
+    def __init__(
+        self,
+        batcher: MicroBatcher,
+        user_id: int,
+        on_result: Callable[[int, Dict[str, Any]], Awaitable[None]],
+        on_dropped: Callable[[int], Awaitable[None]],
+        on_error: Callable[[int, str], Awaitable[None]],
+        admit: Optional[Callable[[int, bytes], Awaitable[bool]]] = None
+    ):
+        self.batcher = batcher
+        self.user_id = user_id
+        self.on_result = on_result
+        self.on_dropped = on_dropped
+        self.on_error = on_error
+        self.admit = admit
+        self.dropped = 0
+        self._latest: Optional[Tuple[int, bytes]] = None
+        self._ready = asyncio.Event()
+
+    async def push(self, frame_id: int, frame: bytes):
+        """Nouvelle image ; celle qui attendait encore est abandonnée"""
+        previous, self._latest = self._latest, (frame_id, frame)
+        self._ready.set()
+        if previous is not None:
+            self.dropped += 1
+            await self.on_dropped(previous[0])
+
+    async def run(self):
+        """Prédiction des images au fil de l'eau (tâche de la connexion)"""
+        while True:
+            await self._ready.wait()
+            self._ready.clear()
+            frame_id, frame = self._latest
+            self._latest = None
+
+            if self.admit is not None and not await self.admit(frame_id, frame):
+                continue
+            try:
+                result = await self.batcher.submit(frame, self.user_id, filename=f"frame-{frame_id}", record=False)
+            except Exception as e:
+                await self.on_error(frame_id, str(e))
+                continue
+            await self.on_result(frame_id, result)
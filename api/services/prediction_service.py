@@ -2,8 +2,10 @@ import asyncio
 import time
 import io
 import logging
+import uuid
 from datetime import datetime
-from typing import Optional, List, Dict, Any
+from pathlib import Path
+from typing import Optional, List, Dict, Any, AsyncIterator, BinaryIO, Sequence, Tuple, Union
 import numpy as np
 from PIL import Image
 import tensorflow as tf
@@ -11,9 +13,59 @@ from tensorflow.keras.models import load_model
 
 from core.config import settings
 from core.models import PredictionResult, PredictionResponse, PredictionStatus
+from core.logging_config import api_logger
+from core.metrics import PREDICTIONS, BATCH_SIZE, INFERENCE_QUEUE_DEPTH, StageTimer
 
 logger = logging.getLogger(__name__)
 
+# Image à prédire : octets, fichier déjà reçu ou chemin sur disque (lus directement par PIL, sans copie)
+ImageSource = Union[bytes, bytearray, memoryview, BinaryIO, Path]
+
+class InvalidImageError(Exception):
+    """Données non décodables comme image"""
+
+# Fichier du modèle lu par le processus maître avant le fork des workers
+# (serve.py) : ses pages sont partagées en copie sur écriture et chaque worker
+# construit son modèle sans relire le disque
+_preloaded_model_file: Optional[bytes] = None
+
+def preload_model_file(path: Optional[str] = None) -> int:
+    """Lecture du fichier du modèle en mémoire (processus maître) ; taille en octets"""
+    global _preloaded_model_file
+    _preloaded_model_file = Path(path or settings.MODEL_PATH).read_bytes()
+    return len(_preloaded_model_file)
+
+def _open_model_file():
+    """Fichier préchargé (HDF5 lu depuis la mémoire partagée) ou chemin du modèle"""
+    if _preloaded_model_file is None:
+        return settings.MODEL_PATH
+    import h5py
+    return h5py.File(io.BytesIO(_preloaded_model_file), "r")
+
+def configure_tf_threads():
+    """
+    Threads TensorFlow (TF_INTRA_OP_THREADS, TF_INTER_OP_THREADS ; 0 : valeur
+    par défaut de TensorFlow), à appliquer avant la première opération
+    """
+    try:
+        if settings.TF_INTRA_OP_THREADS:
+            tf.config.threading.set_intra_op_parallelism_threads(settings.TF_INTRA_OP_THREADS)
+        if settings.TF_INTER_OP_THREADS:
+            tf.config.threading.set_inter_op_parallelism_threads(settings.TF_INTER_OP_THREADS)
+    except RuntimeError as e:
+        logger.warning(f"Threads TensorFlow non modifiés (runtime déjà initialisé) : {str(e)}")
+
+def _source_size(source: ImageSource) -> int:
+    """Taille en octets d'une source d'image"""
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        return memoryview(source).nbytes
+    if isinstance(source, Path):
+        return source.stat().st_size
+    position = source.tell()
+    size = source.seek(0, io.SEEK_END)
+    source.seek(position)
+    return size
+
 class PredictionService:
     """Service de prédiction pour la classification d'images de jeux vidéo"""
     
@@ -22,10 +74,20 @@ class PredictionService:
         self.categories = settings.MODEL_CATEGORIES
         self.image_size = settings.IMAGE_SIZE
         self.is_model_loaded = False
+        self.is_warmed_up = False  # préchauffage terminé à toutes les tailles de lot
         self.prediction_history = []  # En production, utiliser une base de données
+        # Versions de l'historique (par utilisateur) et des statistiques : elles
+        # changent à chaque écriture et servent d'ETag aux requêtes de lecture.
+        # L'historique est propre au processus et les compteurs repartent de 0 :
+        # l'époque (unique par processus) distingue les ETags de deux workers,
+        # ou d'un même worker avant et après un redémarrage.
+        self.epoch = uuid.uuid4().hex
+        self.history_versions: Dict[int, int] = {}
+        self.stats_version = 0
+        self._stats_rollup = None  # (version, jour, statistiques)
     
     async def load_model(self):
-        """Chargement du modèle TensorFlow"""
+        """Chargement du modèle TensorFlow, puis préchauffage"""
         if settings.ENVIRONMENT == "test":
             import inspect
 
@@ -39,68 +101,102 @@ class PredictionService:
                     # faux modèle ave méthode predict simulée
                     class DummyModel:
                         def predict(self, x, verbose=0):
-                            dummy_probs = np.array([[0.1] * len(settings.MODEL_CATEGORIES)])
-                            dummy_probs[0][0] = 0.9
+                            dummy_probs = np.full((len(x), len(settings.MODEL_CATEGORIES)), 0.1)
+                            dummy_probs[:, 0] = 0.9
                             return dummy_probs
                     
                     self.model = DummyModel()
                     self.is_model_loaded = True
+                    await self._test_model()
                     return
+        
+        try:
+            logger.info(f"🔄 Chargement du modèle : {settings.MODEL_PATH}")
+            configure_tf_threads()
+        
+            # Chargement asynchrone du modèle
+            loop = asyncio.get_event_loop()
+            self.model = await loop.run_in_executor(
+                None, 
+                lambda: load_model(_open_model_file())
+            )
             
-            try:
-                logger.info(f"🔄 Chargement du modèle : {settings.MODEL_PATH}")
-            
-                # Chargement asynchrone du modèle
-                loop = asyncio.get_event_loop()
-                self.model = await loop.run_in_executor(
-                    None, 
-                    lambda: load_model(settings.MODEL_PATH)
-                )
-                
-                self.is_model_loaded = True
-                logger.info("✅ Modèle chargé avec succès")
-                
-                # Test du modèle avec une image factice
-                await self._test_model()
+            self.is_model_loaded = True
+            logger.info("✅ Modèle chargé avec succès")
             
-            except Exception as e:
-                logger.error(f"❌ Erreur lors du chargement du modèle : {str(e)}")
-                raise Exception(f"Impossible de charger le modèle : {str(e)}")
+            # Préchauffage du modèle avec des images factices
+            await self._test_model()
         
-        async def _test_model(self):
-            """Test du modèle avec une image factice"""
-            try:
-                # Création d'une image de test
-                test_image = np.random.rand(*self.image_size, 3).astype(np.float32)
-                test_image = np.expand_dims(test_image, axis=0)
+        except Exception as e:
+            logger.error(f"❌ Erreur lors du chargement du modèle : {str(e)}")
+            raise Exception(f"Impossible de charger le modèle : {str(e)}")
+    
+    @property
+    def warmup_batch_sizes(self) -> List[int]:
+        """Tailles de lot préchauffées (WARMUP_BATCH_SIZES, sinon celles utilisées par l'API)"""
+        if settings.WARMUP_BATCH_SIZES:
+            return sorted(set(settings.WARMUP_BATCH_SIZES))
+        return sorted({1, settings.INFERENCE_BATCH_SIZE, settings.MAX_BATCH_FILES})
+    
+    async def _test_model(self):
+        """
+        Test et préchauffage du modèle avec des images factices
+        
+        Un lot factice est prédit à chaque taille de lot utilisée par l'API :
+        le traçage du graphe TensorFlow a lieu ici, et non sur les premières
+        requêtes. Le service n'est prêt (`is_warmed_up`) qu'ensuite.
+        """
+        self.is_warmed_up = False
+        loop = asyncio.get_event_loop()
+        try:
+            for batch_size in self.warmup_batch_sizes:
+                # Lot d'images de test
+                test_batch = np.random.rand(batch_size, *self.image_size, 3).astype(np.float32)
                 
                 # Prédiction de test
-                loop = asyncio.get_event_loop()
-                prediction = await loop.run_in_executor(
+                start = time.perf_counter()
+                await loop.run_in_executor(
                     None,
-                    lambda: self.model.predict(test_image, verbose=0)
+                    lambda: self.model.predict(test_batch, verbose=0)
                 )
-                
-                logger.info("✅ Test du modèle réussi")
-                
-            except Exception as e:
-                logger.error(f"❌ Échec du test du modèle : {str(e)}")
-                raise Exception(f"Le modèle ne fonctionne pas correctement : {str(e)}")
+                logger.info(f"🔥 Préchauffage lot de {batch_size} : {(time.perf_counter() - start) * 1000:.0f} ms")
+            
+            self.is_warmed_up = True
+            logger.info("✅ Test du modèle réussi")
+            
+        except Exception as e:
+            logger.error(f"❌ Échec du test du modèle : {str(e)}")
+            raise Exception(f"Le modèle ne fonctionne pas correctement : {str(e)}")
     
-    def _preprocess_image(self, image_bytes: bytes) -> np.ndarray:
-        """Prétraitement de l'image pour la prédiction"""
+    def _decode_image(self, source: ImageSource) -> Image.Image:
+        """Décodage de l'image depuis les bytes ou un fichier"""
+        try:
+            if isinstance(source, (bytes, bytearray, memoryview)):
+                # BytesIO partage le buffer d'un objet bytes ; une vue (memoryview,
+                # envoi binaire) n'est copiée qu'ici, image par image
+                source = io.BytesIO(source)
+            elif not isinstance(source, Path):
+                source.seek(0)
+            return Image.open(source).convert('RGB')
+        except Exception as e:
+            logger.error(f"Erreur décodage image : {str(e)}")
+            raise InvalidImageError(f"Impossible de traiter l'image : {str(e)}")
+    
+    def _prepare_image(self, image: Image.Image, timer: Optional[StageTimer] = None) -> np.ndarray:
+        """Redimensionnement et normalisation d'une image décodée"""
         try:
-            # Chargement de l'image depuis les bytes
-            image = Image.open(io.BytesIO(image_bytes)).convert('RGB')
-            
             # Redimensionnement
             image = image.resize(self.image_size)
+            if timer:
+                timer.mark("resize")
             
             # Conversion en array numpy et normalisation
             image_array = np.array(image) / 255.0
             
             # Ajout de la dimension batch
             image_array = np.expand_dims(image_array, axis=0)
+            if timer:
+                timer.mark("normalize")
             
             return image_array
             
@@ -108,117 +204,300 @@ class PredictionService:
             logger.error(f"Erreur prétraitement image : {str(e)}")
             raise Exception(f"Impossible de traiter l'image : {str(e)}")
     
+    def _preprocess_image(self, image_bytes: ImageSource) -> np.ndarray:
+        """Prétraitement de l'image pour la prédiction"""
+        return self._prepare_image(self._decode_image(image_bytes))
+    
     async def predict_image(
         self, 
-        image_bytes: bytes, 
+        image_bytes: ImageSource, 
         user_id: int,
-        filename: Optional[str] = None
+        filename: Optional[str] = None,
+        timer: Optional[StageTimer] = None
     ) -> Dict[str, Any]:
         """
         Prédiction de catégorie pour une image
         
         Args:
-            image_bytes: Données binaires de l'image
+            image_bytes: Données binaires de l'image, ou fichier reçu (lu sans copie)
             user_id: ID de l'utilisateur
             filename: Nom du fichier (optionnel)
+            timer: Chronométrage des étapes, partagé avec la route (optionnel)
             
         Returns:
             Dictionnaire avec les résultats de prédiction
         """
         start_time = time.time()
+        timer = timer or StageTimer()
         
         try:
             if not self.is_model_loaded:
                 raise Exception("Modèle non chargé")
             
             # Validation de la taille du fichier
-            if len(image_bytes) > settings.MAX_FILE_SIZE:
+            if _source_size(image_bytes) > settings.MAX_FILE_SIZE:
                 raise Exception(f"Fichier trop volumineux (max: {settings.MAX_FILE_SIZE / (1024*1024):.1f}MB)")
             
-            # Prétraitement de l'image
-            processed_image = self._preprocess_image(image_bytes)
+            # Décodage et prétraitement de l'image
+            image = self._decode_image(image_bytes)
+            timer.mark("decode")
+            processed_image = self._prepare_image(image, timer)
             
             # Prédiction asynchrone
-            loop = asyncio.get_event_loop()
-            predictions = await loop.run_in_executor(
-                None,
-                lambda: self.model.predict(processed_image, verbose=0)
-            )
+            INFERENCE_QUEUE_DEPTH.inc()
+            try:
+                loop = asyncio.get_event_loop()
+                predictions = await loop.run_in_executor(
+                    None,
+                    lambda: self.model.predict(processed_image, verbose=0)
+                )
+            finally:
+                INFERENCE_QUEUE_DEPTH.dec()
+            BATCH_SIZE.observe(len(processed_image))
+            timer.mark("model")
             
             # Traitement des résultats
-            probabilities = predictions[0]
-            predicted_class_idx = np.argmax(probabilities)
-            predicted_category = self.categories[predicted_class_idx]
-            confidence = float(probabilities[predicted_class_idx])
-            
-            # Création du dictionnaire des probabilités
-            prob_dict = {
-                category: float(prob) 
-                for category, prob in zip(self.categories, probabilities)
-            }
-            
-            # Création du résultat
-            prediction_result = PredictionResult(
-                category=predicted_category,
-                confidence=confidence,
-                probabilities=prob_dict
-            )
-            
-            # Calcul du temps de traitement
-            processing_time = time.time() - start_time
-            
-            # Création de la réponse
-            response = {
-                "filename": filename,
-                "prediction": prediction_result.dict(),
-                "processing_time": processing_time,
-                "timestamp": datetime.utcnow(),
-                "user_id": user_id,
-                "status": PredictionStatus.SUCCESS
-            }
+            response = self._success_result(predictions[0], filename, user_id, time.time() - start_time)
+            timer.mark("postprocess")
             
             # Sauvegarde dans l'historique
-            await self._save_prediction_history(response)
-            
-            logger.info(
-                f"Prédiction réussie - Utilisateur: {user_id}, "
-                f"Catégorie: {predicted_category}, Confiance: {confidence:.3f}"
-            )
+            await self._record(response)
+            timer.mark("history")
             
             return response
             
         except Exception as e:
-            processing_time = time.time() - start_time
-            error_response = {
-                "filename": filename,
-                "prediction": None,
-                "processing_time": processing_time,
-                "timestamp": datetime.utcnow(),
-                "user_id": user_id,
-                "status": PredictionStatus.ERROR,
-                "error_message": str(e)
-            }
-            
+            error_response = self._error_result(str(e), filename, user_id, time.time() - start_time)
             logger.error(f"Erreur prédiction - Utilisateur: {user_id}, Erreur: {str(e)}")
             
             # Sauvegarde de l'erreur dans l'historique
-            await self._save_prediction_history(error_response)
+            await self._record(error_response)
             
+            if isinstance(e, InvalidImageError):
+                raise
             raise Exception(str(e))
     
+    def _prepare_batch(
+        self,
+        sources: Sequence[ImageSource],
+        timer: StageTimer
+    ) -> Tuple[List[Optional[np.ndarray]], List[Optional[str]]]:
+        """Décodage et prétraitement d'un lot (pool de threads) ; erreur par image"""
+        arrays, errors = [], []
+        for source in sources:
+            try:
+                if _source_size(source) > settings.MAX_FILE_SIZE:
+                    raise Exception(f"Fichier trop volumineux (max: {settings.MAX_FILE_SIZE / (1024*1024):.1f}MB)")
+                image = self._decode_image(source)
+                timer.mark("decode")
+                arrays.append(self._prepare_image(image, timer))
+                errors.append(None)
+            except Exception as e:
+                arrays.append(None)
+                errors.append(str(e))
+        return arrays, errors
+    
+    async def predict_images(
+        self,
+        images: Sequence[Tuple[ImageSource, Optional[str]]],
+        user_id: int,
+        timer: Optional[StageTimer] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Prédiction groupée : un seul appel au modèle pour tout le lot
+        
+        Le décodage et le prétraitement sont faits dans le pool de threads,
+        puis les images valides sont empilées en un seul tenseur. Une image
+        invalide ne fait pas échouer le lot : elle produit un résultat en
+        erreur à sa place.
+        
+        Args:
+            images: Couples (source de l'image, nom du fichier)
+            user_id: ID de l'utilisateur
+            timer: Chronométrage des étapes, cumulé sur le lot (optionnel)
+            
+        Returns:
+            Un résultat par image, dans l'ordre reçu
+        """
+        return await self.predict_requests(
+            [(source, filename, user_id) for source, filename in images], timer
+        )
+    
+    async def predict_requests(
+        self,
+        requests: Sequence[Tuple[ImageSource, Optional[str], int]],
+        timer: Optional[StageTimer] = None,
+        record: Union[bool, Sequence[bool]] = True
+    ) -> List[Dict[str, Any]]:
+        """
+        Prédiction groupée de requêtes de plusieurs utilisateurs (micro-batching)
+        
+        Args:
+            requests: Triplets (source de l'image, nom du fichier, ID de l'utilisateur)
+            timer: Chronométrage des étapes, cumulé sur le lot (optionnel)
+            record: Ajout à l'historique, pour tout le lot ou par requête
+                (les images d'un flux vidéo ne sont pas historisées)
+            
+        Returns:
+            Un résultat par requête, dans l'ordre reçu
+        """
+        start_time = time.time()
+        timer = timer or StageTimer()
+        
+        if not self.is_model_loaded:
+            raise Exception("Modèle non chargé")
+        
+        loop = asyncio.get_event_loop()
+        arrays, errors = await loop.run_in_executor(
+            None, self._prepare_batch, [source for source, _, _ in requests], timer
+        )
+        
+        valid = [array for array in arrays if array is not None]
+        predictions = []
+        if valid:
+            batch = np.concatenate(valid)
+            INFERENCE_QUEUE_DEPTH.inc()
+            try:
+                predictions = await loop.run_in_executor(
+                    None,
+                    lambda: self.model.predict(batch, verbose=0)
+                )
+            finally:
+                INFERENCE_QUEUE_DEPTH.dec()
+            BATCH_SIZE.observe(len(batch))
+            timer.mark("model")
+        
+        processing_time = time.time() - start_time
+        results, row = [], 0
+        for (_, filename, user_id), error in zip(requests, errors):
+            if error is None:
+                results.append(self._success_result(predictions[row], filename, user_id, processing_time))
+                row += 1
+            else:
+                logger.warning(f"Image ignorée dans le lot - Utilisateur: {user_id}, Fichier: {filename}, Erreur: {error}")
+                results.append(self._error_result(error, filename, user_id, processing_time))
+        timer.mark("postprocess")
+        
+        flags = [record] * len(results) if isinstance(record, bool) else record
+        for result, history in zip(results, flags):
+            await self._record(result, history=history)
+        timer.mark("history")
+        
+        return results
+    
+    async def predict_stream(
+        self,
+        images: Sequence[Tuple[ImageSource, Optional[str]]],
+        user_id: int,
+        batch_size: Optional[int] = None
+    ) -> AsyncIterator[Tuple[List[Dict[str, Any]], StageTimer]]:
+        """
+        Prédiction par micro-lots, résultats rendus dès la fin de chaque lot
+        
+        Le premier micro-lot ne contient qu'une image (premier résultat après
+        une seule inférence), les suivants `batch_size` images. Un lot en échec
+        donne des résultats en erreur et n'interrompt pas les suivants.
+        
+        Yields:
+            Résultats du micro-lot, dans l'ordre reçu, et son chronométrage
+        """
+        batch_size = batch_size or settings.INFERENCE_BATCH_SIZE
+        start, size = 0, 1
+        
+        while start < len(images):
+            chunk = images[start:start + size]
+            timer = StageTimer()
+            try:
+                results = await self.predict_images(chunk, user_id, timer=timer)
+            except Exception as e:
+                logger.error(f"Erreur micro-lot - Utilisateur: {user_id}, Erreur: {str(e)}")
+                results = [self._error_result(str(e), filename, user_id, 0.0) for _, filename in chunk]
+                for result in results:
+                    await self._record(result)
+            
+            yield results, timer
+            start, size = start + size, batch_size
+    
+    def _success_result(
+        self,
+        probabilities: np.ndarray,
+        filename: Optional[str],
+        user_id: int,
+        processing_time: float
+    ) -> Dict[str, Any]:
+        """Résultat d'une image à partir de la sortie du modèle"""
+        predicted_class_idx = np.argmax(probabilities)
+        
+        # Création du résultat (valeurs produites ici : pas de revalidation)
+        prediction_result = PredictionResult.model_construct(
+            category=self.categories[predicted_class_idx],
+            confidence=float(probabilities[predicted_class_idx]),
+            probabilities={
+                category: float(prob)
+                for category, prob in zip(self.categories, probabilities)
+            }
+        )
+        
+        return {
+            "filename": filename,
+            "prediction": prediction_result.model_dump(),
+            "processing_time": processing_time,
+            "timestamp": datetime.utcnow(),
+            "user_id": user_id,
+            "status": PredictionStatus.SUCCESS
+        }
+    
+    @staticmethod
+    def _error_result(message: str, filename: Optional[str], user_id: int, processing_time: float) -> Dict[str, Any]:
+        """Résultat d'une image en erreur"""
+        return {
+            "filename": filename,
+            "prediction": None,
+            "processing_time": processing_time,
+            "timestamp": datetime.utcnow(),
+            "user_id": user_id,
+            "status": PredictionStatus.ERROR,
+            "error_message": message
+        }
+    
+    async def _record(self, result: Dict[str, Any], history: bool = True):
+        """Historique (optionnel), compteurs et log d'un résultat"""
+        if history:
+            await self._save_prediction_history(result)
+        PREDICTIONS.labels(result["status"].value).inc()
+        
+        if result["status"] == PredictionStatus.SUCCESS:
+            prediction = result["prediction"]
+            # Événement à fort volume : échantillonné (LOG_SAMPLE_RATES)
+            api_logger.log_prediction(
+                result["user_id"], prediction["category"], prediction["confidence"], result["processing_time"]
+            )
+    
     async def _save_prediction_history(self, prediction_data: Dict[str, Any]):
         """Sauvegarde de l'historique des prédictions"""
         try:
             # En production, sauvegarder en base de données
             self.prediction_history.append(prediction_data)
+            self._bump_history_version(prediction_data.get("user_id"))
             
             # Limitation de l'historique en mémoire (garder les 1000 dernières)
             if len(self.prediction_history) > 1000:
+                # L'historique des auteurs des entrées évincées change aussi
+                for pred in self.prediction_history[:-1000]:
+                    self._bump_history_version(pred.get("user_id"))
                 self.prediction_history = self.prediction_history[-1000:]
                 
         except Exception as e:
             logger.error(f"Erreur sauvegarde historique : {str(e)}")
     
+    def _bump_history_version(self, user_id: Optional[int]):
+        self.history_versions[user_id] = self.history_versions.get(user_id, 0) + 1
+        self.stats_version += 1
+    
+    def history_version(self, user_id: int) -> int:
+        """Version de l'historique d'un utilisateur (incrémentée à chaque modification)"""
+        return self.history_versions.get(user_id, 0)
+    
     async def get_user_history(self, user_id: int, limit: int = 50) -> List[Dict[str, Any]]:
         """Récupération de l'historique des prédictions d'un utilisateur"""
         try:
@@ -274,6 +553,26 @@ class PredictionService:
             logger.error(f"Erreur calcul top catégories : {str(e)}")
             return {}
     
+    async def get_stats_rollup(self) -> Dict[str, Any]:
+        """
+        Statistiques agrégées des prédictions
+        
+        Recalculées seulement si l'historique a changé depuis le dernier appel
+        (ou si le jour a changé, pour `predictions_today`).
+        """
+        version, today = self.stats_version, datetime.utcnow().date()
+        cached = self._stats_rollup
+        if cached is not None and cached[0] == version and cached[1] == today:
+            return cached[2]
+        
+        rollup = {
+            "predictions": await self.get_prediction_count(),
+            "predictions_today": await self.get_predictions_today(),
+            "top_categories": await self.get_top_categories()
+        }
+        self._stats_rollup = (version, today, rollup)
+        return rollup
+    
     async def get_model_info(self) -> Dict[str, Any]:
         """Informations sur le modèle chargé"""
         if not self.is_model_loaded:
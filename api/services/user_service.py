@@ -1,54 +1,82 @@
 import logging
 from datetime import datetime
 from typing import Optional, List, Dict, Any
-from sqlalchemy.orm import Session
+from sqlalchemy.exc import IntegrityError
 
-from core.security import hash_password, verify_password, create_tokens, login_attempt_manager
+from core.config import settings
+from core.cache import TTLCache
+from core.security import (
+    hash_password_async, verify_password_async,
+    create_tokens, verify_token, revoke_token,
+    security_service, login_attempt_manager
+)
 from core.models import UserRole, UserCreate, UserResponse
-from core.database import get_db
+from core.database import get_db_context, User, UserCRUD
 
 logger = logging.getLogger(__name__)
 
+# Champs exposés publiquement (sans le hash du mot de passe)
+PUBLIC_FIELDS = (
+    "id", "username", "email", "role", "is_active",
+    "created_at", "last_login", "prediction_count"
+)
+
+class UserCache:
+    """
+    Cache read-through des utilisateurs, indexé par id, username et email
+
+    La base de données reste la source de vérité : le cache est local au
+    worker, borné (LRU) et chaque entrée expire après `ttl` secondes, ce qui
+    borne l'obsolescence entre plusieurs workers.
+    """
+    
+    def __init__(self, maxsize: int = 10000, ttl: float = 300.0):
+        self._by_id = TTLCache(maxsize=maxsize, ttl=ttl, on_evict=self._drop_indexes)
+        self._id_by_username: Dict[str, int] = {}
+        self._id_by_email: Dict[str, int] = {}
+    
+    def _drop_indexes(self, user_id: int, user: Dict[str, Any]):
+        """Nettoyage des index secondaires lors d'une éviction"""
+        if self._id_by_username.get(user["username"]) == user_id:
+            del self._id_by_username[user["username"]]
+        if self._id_by_email.get(user["email"]) == user_id:
+            del self._id_by_email[user["email"]]
+    
+    def get_by_id(self, user_id: int) -> Optional[Dict[str, Any]]:
+        return self._by_id.get(user_id)
+    
+    def get_by_username(self, username: str) -> Optional[Dict[str, Any]]:
+        user_id = self._id_by_username.get(username)
+        return self._by_id.get(user_id) if user_id is not None else None
+    
+    def get_by_email(self, email: str) -> Optional[Dict[str, Any]]:
+        user_id = self._id_by_email.get(email)
+        return self._by_id.get(user_id) if user_id is not None else None
+    
+    def put(self, user: Dict[str, Any]):
+        # Suppression de l'ancienne entrée (username/email ont pu changer)
+        self._by_id.pop(user["id"])
+        self._by_id.set(user["id"], user)
+        self._id_by_username[user["username"]] = user["id"]
+        self._id_by_email[user["email"]] = user["id"]
+    
+    def invalidate(self, user_id: int):
+        self._by_id.pop(user_id)
+    
+    def clear(self):
+        self._by_id.clear()
+    
+    def stats(self) -> Dict[str, Any]:
+        return self._by_id.stats()
+
 class UserService:
     """Service de gestion des utilisateurs"""
     
     def __init__(self):
-        self.users_cache = {}  # En production, utiliser Redis
-        self._init_default_users()
-    
-    def _init_default_users(self):
-        """Initialisation des utilisateurs par défaut"""
-        # Utilisateur admin par défaut
-        admin_password = hash_password("admin123!")
-        self.users_cache[1] = {
-            "id": 1,
-            "username": "admin",
-            "email": "admin@projet3.com",
-            "password_hash": admin_password,
-            "role": UserRole.ADMIN,
-            "is_active": True,
-            "created_at": datetime.utcnow(),
-            "last_login": None,
-            "prediction_count": 0
-        }
-        
-        # Utilisateur test par défaut
-        user_password = hash_password("user123!")
-        self.users_cache[2] = {
-            "id": 2,
-            "username": "testuser",
-            "email": "test@projet3.com",
-            "password_hash": user_password,
-            "role": UserRole.USER,
-            "is_active": True,
-            "created_at": datetime.utcnow(),
-            "last_login": None,
-            "prediction_count": 0
-        }
-        
-        logger.info("✅ Utilisateurs par défaut initialisés")
-        logger.info("👤 Admin: admin / admin123!")
-        logger.info("👤 User: testuser / user123!")
+        self.cache = UserCache(
+            maxsize=settings.USER_CACHE_SIZE,
+            ttl=settings.USER_CACHE_TTL
+        )
     
     async def authenticate_user(self, username: str, password: str) -> Dict[str, Any]:
         """
@@ -73,7 +101,7 @@ class UserService:
                 raise Exception("Utilisateur non trouvé")
             
             # Vérification du mot de passe
-            if not verify_password(password, user["password_hash"]):
+            if not await verify_password_async(password, user["password_hash"]):
                 login_attempt_manager.record_failed_attempt(username)
                 raise Exception("Mot de passe incorrect")
             
@@ -112,6 +140,49 @@ class UserService:
             logger.error(f"Erreur authentification {username}: {str(e)}")
             raise e
     
+    async def refresh_tokens(self, refresh_token: str) -> Dict[str, Any]:
+        """
+        Rotation des tokens à partir d'un refresh token
+        
+        Args:
+            refresh_token: Refresh token valide et non révoqué
+            
+        Returns:
+            Nouvelle paire de tokens (l'ancien refresh token est révoqué)
+        """
+        try:
+            token_data = verify_token(refresh_token, expected_type="refresh")
+            
+            # Le rôle et l'état du compte sont relus (via le cache)
+            user = await self._get_user(token_data.user_id)
+            if not user or not user["is_active"]:
+                raise Exception("Compte introuvable ou désactivé")
+            
+            # Rotation : l'ancien refresh token ne peut plus être réutilisé
+            security_service.revoke_token(token_data, refresh_token)
+            
+            return create_tokens({
+                "sub": user["username"],
+                "user_id": user["id"],
+                "role": user["role"]
+            })
+            
+        except Exception as e:
+            logger.error(f"Erreur rafraîchissement de token : {str(e)}")
+            raise e
+    
+    async def logout(self, access_token: str, refresh_token: Optional[str] = None):
+        """Révocation du token d'accès et, si fourni, du refresh token associé"""
+        access_data = revoke_token(access_token)
+        
+        if refresh_token:
+            refresh_data = verify_token(refresh_token, expected_type="refresh")
+            if refresh_data.user_id != access_data.user_id:
+                raise Exception("Le refresh token n'appartient pas à l'utilisateur")
+            security_service.revoke_token(refresh_data, refresh_token)
+        
+        logger.info(f"Déconnexion : {access_data.username} (ID: {access_data.user_id})")
+    
     async def create_user(
         self, 
         username: str, 
@@ -139,29 +210,27 @@ class UserService:
             if await self._get_user_by_email(email):
                 raise Exception(f"L'email '{email}' est déjà utilisé")
             
-            # Génération d'un nouvel ID
-            new_id = max(self.users_cache.keys()) + 1 if self.users_cache else 1
-            
             # Hachage du mot de passe
-            password_hash = hash_password(password)
+            password_hash = await hash_password_async(password)
             
-            # Création de l'utilisateur
-            user_data = {
-                "id": new_id,
-                "username": username,
-                "email": email,
-                "password_hash": password_hash,
-                "role": role,
-                "is_active": True,
-                "created_at": datetime.utcnow(),
-                "last_login": None,
-                "prediction_count": 0
-            }
+            # Création de l'utilisateur (l'ID est attribué par la base)
+            try:
+                with get_db_context() as db:
+                    user = UserCRUD.create_user(
+                        db,
+                        username=username,
+                        email=email,
+                        password_hash=password_hash,
+                        role=UserRole(role).value
+                    )
+                    user_data = self._to_dict(user)
+            except IntegrityError:
+                # Création concurrente sur un autre worker
+                raise Exception(f"Le nom d'utilisateur '{username}' ou l'email '{email}' existe déjà")
             
-            # Sauvegarde en cache (en production, utiliser la base de données)
-            self.users_cache[new_id] = user_data
+            self.cache.put(user_data)
             
-            logger.info(f"Nouvel utilisateur créé : {username} (ID: {new_id})")
+            logger.info(f"Nouvel utilisateur créé : {username} (ID: {user_data['id']})")
             
             # Retour des données publiques
             return {
@@ -178,63 +247,81 @@ class UserService:
             logger.error(f"Erreur création utilisateur {username}: {str(e)}")
             raise e
     
+    @staticmethod
+    def _to_dict(user: User) -> Dict[str, Any]:
+        """Conversion d'une ligne `User` en dictionnaire détaché de la session"""
+        return {
+            "id": user.id,
+            "username": user.username,
+            "email": user.email,
+            "password_hash": user.password_hash,
+            "role": UserRole(user.role),
+            "is_active": user.is_active,
+            "created_at": user.created_at,
+            "last_login": user.last_login,
+            "prediction_count": user.prediction_count or 0
+        }
+    
+    @staticmethod
+    def _public(user: Dict[str, Any]) -> Dict[str, Any]:
+        """Données publiques uniquement"""
+        return {field: user[field] for field in PUBLIC_FIELDS}
+    
+    def _load(self, lookup, key) -> Optional[Dict[str, Any]]:
+        """Lecture en base puis mise en cache (read-through)"""
+        with get_db_context() as db:
+            user = lookup(db, key)
+            if not user:
+                return None
+            user_data = self._to_dict(user)
+        
+        self.cache.put(user_data)
+        return user_data
+    
+    async def _get_user(self, user_id: int) -> Optional[Dict[str, Any]]:
+        """Récupération d'un utilisateur par ID (données complètes)"""
+        user = self.cache.get_by_id(user_id)
+        if user is None:
+            user = self._load(UserCRUD.get_user_by_id, user_id)
+        return user
+    
     async def get_user_by_id(self, user_id: int) -> Optional[Dict[str, Any]]:
         """Récupération d'un utilisateur par son ID"""
-        user = self.users_cache.get(user_id)
+        user = await self._get_user(user_id)
         if user:
             # Retour des données publiques uniquement
-            return {
-                "id": user["id"],
-                "username": user["username"],
-                "email": user["email"],
-                "role": user["role"],
-                "is_active": user["is_active"],
-                "created_at": user["created_at"],
-                "last_login": user["last_login"],
-                "prediction_count": user["prediction_count"]
-            }
+            return self._public(user)
         return None
     
     async def _get_user_by_username(self, username: str) -> Optional[Dict[str, Any]]:
         """Récupération d'un utilisateur par nom d'utilisateur (données complètes)"""
-        for user in self.users_cache.values():
-            if user["username"] == username:
-                return user
-        return None
+        user = self.cache.get_by_username(username)
+        if user is None:
+            user = self._load(UserCRUD.get_user_by_username, username)
+        return user
     
     async def _get_user_by_email(self, email: str) -> Optional[Dict[str, Any]]:
         """Récupération d'un utilisateur par email"""
-        for user in self.users_cache.values():
-            if user["email"] == email:
-                return user
-        return None
+        user = self.cache.get_by_email(email)
+        if user is None:
+            user = self._load(UserCRUD.get_user_by_email, email)
+        return user
     
     async def get_users(self, skip: int = 0, limit: int = 100) -> List[Dict[str, Any]]:
         """Liste paginée des utilisateurs"""
-        users = list(self.users_cache.values())
-        users.sort(key=lambda x: x["created_at"], reverse=True)
-        
-        # Pagination
-        paginated_users = users[skip:skip + limit]
+        with get_db_context() as db:
+            users = [
+                self._to_dict(user)
+                for user in UserCRUD.get_users_ordered(db, skip=skip, limit=limit)
+            ]
         
         # Retour des données publiques uniquement
-        return [
-            {
-                "id": user["id"],
-                "username": user["username"],
-                "email": user["email"],
-                "role": user["role"],
-                "is_active": user["is_active"],
-                "created_at": user["created_at"],
-                "last_login": user["last_login"],
-                "prediction_count": user["prediction_count"]
-            }
-            for user in paginated_users
-        ]
+        return [self._public(user) for user in users]
     
     async def get_user_count(self) -> int:
         """Nombre total d'utilisateurs"""
-        return len(self.users_cache)
+        with get_db_context() as db:
+            return UserCRUD.count_users(db)
     
     async def update_user(
         self, 
@@ -242,42 +329,60 @@ class UserService:
         updates: Dict[str, Any]
     ) -> Optional[Dict[str, Any]]:
         """Mise à jour d'un utilisateur"""
-        if user_id not in self.users_cache:
-            return None
-        
-        user = self.users_cache[user_id]
-        
         # Champs autorisés à la mise à jour
         allowed_fields = ["email", "is_active", "role"]
         
-        for field, value in updates.items():
-            if field in allowed_fields:
-                user[field] = value
+        fields = {
+            field: (UserRole(value).value if field == "role" else value)
+            for field, value in updates.items()
+            if field in allowed_fields
+        }
+        
+        with get_db_context() as db:
+            user = UserCRUD.update_user(db, user_id, **fields)
+            if not user:
+                self.cache.invalidate(user_id)
+                return None
+            user_data = self._to_dict(user)
         
-        self.users_cache[user_id] = user
+        # Invalidation puis ré-indexation (l'email a pu changer)
+        self.cache.invalidate(user_id)
+        self.cache.put(user_data)
         
         logger.info(f"Utilisateur {user_id} mis à jour")
         
-        return await self.get_user_by_id(user_id)
+        return self._public(user_data)
     
     async def delete_user(self, user_id: int) -> bool:
         """Suppression d'un utilisateur"""
-        if user_id in self.users_cache:
-            username = self.users_cache[user_id]["username"]
-            del self.users_cache[user_id]
-            logger.info(f"Utilisateur supprimé : {username} (ID: {user_id})")
-            return True
-        return False
+        with get_db_context() as db:
+            deleted = UserCRUD.delete_user(db, user_id)
+        
+        self.cache.invalidate(user_id)
+        
+        if deleted:
+            logger.info(f"Utilisateur supprimé (ID: {user_id})")
+        return deleted
     
     async def _update_last_login(self, user_id: int):
         """Mise à jour de la dernière connexion"""
-        if user_id in self.users_cache:
-            self.users_cache[user_id]["last_login"] = datetime.utcnow()
+        now = datetime.utcnow()
+        with get_db_context() as db:
+            UserCRUD.update_user(db, user_id, last_login=now)
+        
+        # Mise à jour en place : la prochaine connexion reste servie par le cache
+        user = self.cache.get_by_id(user_id)
+        if user is not None:
+            user["last_login"] = now
     
     async def increment_prediction_count(self, user_id: int):
         """Incrémentation du compteur de prédictions"""
-        if user_id in self.users_cache:
-            self.users_cache[user_id]["prediction_count"] += 1
+        with get_db_context() as db:
+            UserCRUD.increment_prediction_count(db, user_id)
+        
+        user = self.cache.get_by_id(user_id)
+        if user is not None:
+            user["prediction_count"] += 1
     
     async def get_user_stats(self, user_id: int) -> Optional[Dict[str, Any]]:
         """Statistiques d'un utilisateur"""
@@ -296,9 +401,14 @@ class UserService:
     
     def health_check(self) -> Dict[str, Any]:
         """Vérification de l'état de santé du service"""
+        with get_db_context() as db:
+            total_users = UserCRUD.count_users(db)
+            active_users = db.query(User).filter(User.is_active.is_(True)).count()
+        
         return {
             "service": "user_service",
             "status": "healthy",
-            "total_users": len(self.users_cache),
-            "active_users": len([u for u in self.users_cache.values() if u["is_active"]])
+            "total_users": total_users,
+            "active_users": active_users,
+            "cache": self.cache.stats()
         } 
\ No newline at end of file
@@ -0,0 +1,104 @@
+"""
+Benchmark : coût de l'authentification sur `/predict/image`
+
+Compare le coût de la dépendance `get_current_user` (vérification HMAC +
+décodage JSON du JWT) sans cache et avec le cache des tokens vérifiés, puis
+la latence de bout en bout de `/predict/image` dans les deux modes.
+
+Usage :
+    python benchmarks/bench_auth.py [--iterations 20000] [--requests 200]
+"""
+import argparse
+import asyncio
+import io
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+from PIL import Image
+
+API_DIR = Path(__file__).resolve().parent.parent / "api"
+WORK_DIR = tempfile.mkdtemp(prefix="bench_auth_")
+
+os.environ.setdefault("ENVIRONMENT", "test")
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+os.environ["DATABASE_URL"] = f"sqlite:///{WORK_DIR}/bench.db"
+os.environ["RATE_LIMIT_REQUESTS"] = str(10 ** 9)
+os.environ["RATE_LIMIT_ROLE_QUOTAS"] = '{"user": 1000000000, "admin": 1000000000}'
+os.environ["DEBUG"] = "false"
+os.chdir(WORK_DIR)
+sys.path.insert(0, str(API_DIR))
+
+import httpx  # noqa: E402
+from fastapi.security import HTTPAuthorizationCredentials  # noqa: E402
+
+from main import app  # noqa: E402
+from core.security import get_current_user, token_cache, create_tokens  # noqa: E402
+
+
+def make_image() -> bytes:
+    img = Image.fromarray(np.random.randint(0, 255, (150, 150, 3), dtype=np.uint8))
+    buf = io.BytesIO()
+    img.save(buf, format="JPEG")
+    return buf.getvalue()
+
+
+async def time_dependency(token: str, iterations: int, cached: bool) -> float:
+    credentials = HTTPAuthorizationCredentials(scheme="Bearer", credentials=token)
+    start = time.perf_counter()
+    for _ in range(iterations):
+        if not cached:
+            token_cache.clear()
+        await get_current_user(credentials)
+    return (time.perf_counter() - start) / iterations
+
+
+async def time_endpoint(client, token, image, requests, cached: bool):
+    headers = {"Authorization": f"Bearer {token}"}
+    latencies = []
+    for _ in range(requests):
+        if not cached:
+            token_cache.clear()
+        start = time.perf_counter()
+        response = await client.post(
+            "/predict/image", headers=headers,
+            files={"file": ("bench.jpg", image, "image/jpeg")}
+        )
+        latencies.append(time.perf_counter() - start)
+        assert response.status_code == 200, response.text
+    return latencies
+
+
+async def main(args):
+    token = create_tokens({"sub": "testuser", "user_id": 2, "role": "user"})["access_token"]
+
+    print("Dépendance get_current_user :")
+    for cached in (False, True):
+        await time_dependency(token, 1000, cached)
+        per_call = await time_dependency(token, args.iterations, cached)
+        label = "avec cache" if cached else "sans cache"
+        print(f"  {label:<11} {per_call * 1e6:8.1f} µs / requête")
+
+    image = make_image()
+    transport = httpx.ASGITransport(app=app)
+    async with app.router.lifespan_context(app):
+        async with httpx.AsyncClient(transport=transport, base_url="http://localhost") as client:
+            await time_endpoint(client, token, image, 20, True)
+            print("/predict/image :")
+            for cached in (False, True):
+                latencies = await time_endpoint(client, token, image, args.requests, cached)
+                label = "avec cache" if cached else "sans cache"
+                print(
+                    f"  {label:<11} p50={np.percentile(latencies, 50) * 1000:6.2f} ms  "
+                    f"p99={np.percentile(latencies, 99) * 1000:6.2f} ms"
+                )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=20000, help="Appels de la dépendance par mode")
+    parser.add_argument("--requests", type=int, default=200, help="Requêtes /predict/image par mode")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,190 @@
+"""
+Benchmark : envoi multipart contre envoi binaire compact pour les lots
+
+Compare, pour des lots de 10, 100 et 1000 images JPEG :
+
+- réception seule : application minimale dont les deux endpoints ne font
+  que recevoir le lot (`List[UploadFile]` d'un côté, découpage en vues
+  `memoryview` du corps à préfixes de longueur de l'autre), corps découpé
+  en morceaux de 64 Ko comme par un serveur ASGI ;
+- bout en bout : `/predict/batch` contre `/predict/batch/binary` de l'API
+  (modèle factice : seuls la réception, le décodage et le prétraitement
+  sont mesurés).
+
+Usage :
+    python benchmarks/bench_binary_upload.py [--sizes 10 100 1000] [--width 320 --height 240]
+"""
+import argparse
+import asyncio
+import io
+import json
+import logging
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+from statistics import median
+from typing import List
+
+API_DIR = Path(__file__).resolve().parent.parent / "api"
+WORK_DIR = tempfile.mkdtemp(prefix="bench_binary_upload_")
+MAX_IMAGES = 1000
+
+os.environ.setdefault("ENVIRONMENT", "test")
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+os.environ["DATABASE_URL"] = f"sqlite:///{WORK_DIR}/bench.db"
+os.environ["JOBS_DIR"] = f"{WORK_DIR}/jobs"
+os.environ["RATE_LIMIT_REQUESTS"] = str(10 ** 9)
+os.environ["RATE_LIMIT_ROLE_QUOTAS"] = json.dumps({"user": 10 ** 9, "admin": 10 ** 9})
+os.environ["MAX_BATCH_FILES"] = str(MAX_IMAGES)
+os.environ["REQUEST_BODY_LIMITS"] = json.dumps({"/predict/batch": 2 ** 31, "/predict/batch/binary": 2 ** 31})
+os.environ["DEBUG"] = "false"
+os.chdir(WORK_DIR)
+sys.path.insert(0, str(API_DIR))
+
+import numpy as np  # noqa: E402
+from fastapi import FastAPI, File, Request, UploadFile  # noqa: E402
+from PIL import Image  # noqa: E402
+
+from core.binary_upload import encode_length_prefixed, split_binary_upload  # noqa: E402
+
+CHUNK_SIZE = 64 * 1024
+BOUNDARY = "benchmarkboundary7MA4YWxkTrZu0gW"
+
+
+def make_image(width: int, height: int) -> bytes:
+    img = Image.fromarray(np.random.randint(0, 255, (height, width, 3), dtype=np.uint8))
+    img_bytes = io.BytesIO()
+    img.save(img_bytes, format="JPEG")
+    return img_bytes.getvalue()
+
+
+def encode_multipart(images: List[bytes]) -> bytes:
+    parts = []
+    for i, image in enumerate(images):
+        parts.append(
+            f'--{BOUNDARY}\r\nContent-Disposition: form-data; name="files"; filename="{i}.jpg"\r\n'
+            f"Content-Type: image/jpeg\r\n\r\n".encode()
+        )
+        parts.append(image)
+        parts.append(b"\r\n")
+    parts.append(f"--{BOUNDARY}--\r\n".encode())
+    return b"".join(parts)
+
+
+def receive_only_app() -> FastAPI:
+    app = FastAPI()
+
+    @app.post("/multipart")
+    async def multipart(files: List[UploadFile] = File(...)):
+        return {"count": len([(file.file, file.filename) for file in files])}
+
+    @app.post("/binary")
+    async def binary(request: Request):
+        views = split_binary_upload(await request.body(), request.headers["content-type"], MAX_IMAGES)
+        return {"count": len([(view, f"image-{i}") for i, view in enumerate(views)])}
+
+    return app
+
+
+async def call(app, path: str, body: bytes, content_type: str, headers=()) -> int:
+    """Requête ASGI directe, corps envoyé par morceaux de 64 Ko"""
+    chunks = [body[i:i + CHUNK_SIZE] for i in range(0, len(body), CHUNK_SIZE)] or [b""]
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "POST",
+        "scheme": "http", "path": path, "raw_path": path.encode(), "query_string": b"",
+        "root_path": "", "client": ("127.0.0.1", 50000), "server": ("localhost", 8000),
+        "headers": [
+            (b"host", b"localhost"),
+            (b"content-type", content_type.encode()),
+            (b"content-length", str(len(body)).encode()),
+            *headers
+        ]
+    }
+    index = 0
+    status = []
+
+    async def receive():
+        nonlocal index
+        if index < len(chunks):
+            index += 1
+            return {"type": "http.request", "body": chunks[index - 1], "more_body": index < len(chunks)}
+        await asyncio.sleep(3600)
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            status.append(message["status"])
+
+    await app(scope, receive, send)
+    return status[0]
+
+
+def timed(loop, func, repeats: int) -> float:
+    samples = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        loop.run_until_complete(func())
+        samples.append(time.perf_counter() - start)
+    return median(samples)
+
+
+def report(label: str, count: int, multipart: float, binary: float):
+    print(
+        f"{label:<14} {count:5d} images  multipart {multipart * 1e3:9.1f} ms ({count / multipart:8.0f} img/s)"
+        f"  binaire {binary * 1e3:9.1f} ms ({count / binary:8.0f} img/s)  x{multipart / binary:.1f}"
+    )
+
+
+async def login(app) -> bytes:
+    from httpx import ASGITransport, AsyncClient
+
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://localhost") as client:
+        response = await client.post("/auth/login", json={"username": "testuser", "password": "user123!"})
+    return f"Bearer {response.json()['access_token']}".encode()
+
+
+def main(args):
+    loop = asyncio.new_event_loop()
+    receive_app = receive_only_app()
+
+    from main import app
+    logging.disable(logging.WARNING)
+    lifespan = app.router.lifespan_context(app)
+    loop.run_until_complete(lifespan.__aenter__())
+    auth = [(b"authorization", loop.run_until_complete(login(app)))]
+
+    try:
+        for count in args.sizes:
+            images = [make_image(args.width, args.height) for _ in range(count)]
+            multipart_body, binary_body = encode_multipart(images), encode_length_prefixed(images)
+            multipart_type = f"multipart/form-data; boundary={BOUNDARY}"
+            repeats = 5 if count <= 100 else 3
+            print(f"\n{count} images de {args.width}x{args.height} ({len(binary_body) / 1e6:.1f} Mo)")
+
+            def request(target, path, body, content_type, headers=()):
+                async def run():
+                    status = await call(target, path, body, content_type, headers)
+                    assert status == 200, f"{path} : HTTP {status}"
+                return run
+
+            report(
+                "réception", count,
+                timed(loop, request(receive_app, "/multipart", multipart_body, multipart_type), repeats),
+                timed(loop, request(receive_app, "/binary", binary_body, "application/octet-stream"), repeats)
+            )
+            report(
+                "bout en bout", count,
+                timed(loop, request(app, "/predict/batch", multipart_body, multipart_type, auth), repeats),
+                timed(loop, request(app, "/predict/batch/binary", binary_body, "application/octet-stream", auth), repeats)
+            )
+    finally:
+        loop.run_until_complete(lifespan.__aexit__(None, None, None))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 100, 1000])
+    parser.add_argument("--width", type=int, default=320)
+    parser.add_argument("--height", type=int, default=240)
+    main(parser.parse_args())
@@ -0,0 +1,124 @@
+"""
+Benchmark : latence des prédictions pendant une rafale de connexions
+
+Mesure la latence p50/p99 de `/predict/image` seule, puis pendant une
+« tempête » de connexions concurrentes (`/auth/login`, donc bcrypt).
+Le mode `inline` reproduit l'ancien comportement (bcrypt exécuté dans la
+boucle d'événements) pour comparaison avec le pool dédié.
+
+Usage :
+    python benchmarks/bench_login_storm.py [--requests 200] [--logins 8]
+"""
+import argparse
+import asyncio
+import io
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+from PIL import Image
+
+API_DIR = Path(__file__).resolve().parent.parent / "api"
+WORK_DIR = tempfile.mkdtemp(prefix="bench_login_")
+
+os.environ.setdefault("ENVIRONMENT", "test")
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+os.environ["DATABASE_URL"] = f"sqlite:///{WORK_DIR}/bench.db"
+os.environ["RATE_LIMIT_REQUESTS"] = str(10 ** 9)
+os.environ["RATE_LIMIT_ROLE_QUOTAS"] = '{"user": 1000000000, "admin": 1000000000}'
+os.environ["DEBUG"] = "false"
+os.chdir(WORK_DIR)
+sys.path.insert(0, str(API_DIR))
+
+import httpx  # noqa: E402
+
+from main import app  # noqa: E402
+from core.security import password_hasher  # noqa: E402
+
+
+def make_image() -> bytes:
+    img = Image.fromarray(np.random.randint(0, 255, (150, 150, 3), dtype=np.uint8))
+    buf = io.BytesIO()
+    img.save(buf, format="JPEG")
+    return buf.getvalue()
+
+
+def percentile(values, p):
+    return float(np.percentile(values, p)) * 1000 if values else 0.0
+
+
+async def predictor(client, token, image, count, latencies):
+    headers = {"Authorization": f"Bearer {token}"}
+    for _ in range(count):
+        start = time.perf_counter()
+        response = await client.post(
+            "/predict/image",
+            headers=headers,
+            files={"file": ("bench.jpg", image, "image/jpeg")}
+        )
+        latencies.append(time.perf_counter() - start)
+        assert response.status_code == 200, response.text
+
+
+async def login_storm(client, stop: asyncio.Event, counter):
+    while not stop.is_set():
+        response = await client.post("/auth/login", json={"username": "testuser", "password": "user123!"})
+        if response.status_code == 200:
+            counter[0] += 1
+
+
+async def run_phase(client, token, image, requests, logins):
+    latencies, counter = [], [0]
+    stop = asyncio.Event()
+    storm = [asyncio.create_task(login_storm(client, stop, counter)) for _ in range(logins)]
+
+    start = time.perf_counter()
+    await asyncio.gather(*[
+        predictor(client, token, image, requests // 4, latencies) for _ in range(4)
+    ])
+    elapsed = time.perf_counter() - start
+
+    stop.set()
+    await asyncio.gather(*storm)
+    return latencies, counter[0], elapsed
+
+
+async def main(args):
+    image = make_image()
+
+    if args.inline:
+        # Ancien comportement : bcrypt exécuté directement dans la boucle
+        async def inline_run(func, *func_args):
+            return func(*func_args)
+        password_hasher.run = inline_run
+
+    transport = httpx.ASGITransport(app=app)
+    async with app.router.lifespan_context(app):
+        async with httpx.AsyncClient(transport=transport, base_url="http://localhost") as client:
+            response = await client.post("/auth/login", json={"username": "testuser", "password": "user123!"})
+            token = response.json()["access_token"]
+
+            # Préchauffage
+            await run_phase(client, token, image, 20, 0)
+
+            mode = "inline" if args.inline else "executor"
+            print(f"Mode bcrypt : {mode}")
+            for logins in (0, args.logins):
+                latencies, done, elapsed = await run_phase(client, token, image, args.requests, logins)
+                print(
+                    f"  connexions concurrentes={logins:<3} "
+                    f"p50={percentile(latencies, 50):7.1f} ms  "
+                    f"p99={percentile(latencies, 99):7.1f} ms  "
+                    f"connexions réussies={done} en {elapsed:.1f}s"
+                )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=200, help="Nombre de prédictions par phase")
+    parser.add_argument("--logins", type=int, default=8, help="Connexions concurrentes pendant la tempête")
+    parser.add_argument("--inline", action="store_true", help="Exécuter bcrypt dans la boucle (ancien comportement)")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,161 @@
+"""
+Benchmark : surcoût des middlewares par requête
+
+Appelle directement l'application ASGI (sans client HTTP) sur un endpoint
+trivial, avec les mêmes étapes (headers de sécurité, rate limiting, logging,
+validation, métriques) empilées de trois façons :
+
+- `BaseHTTPMiddleware` : une couche `dispatch`/`call_next` par étape
+  (ancienne implémentation) ;
+- ASGI pur : une couche ASGI par étape ;
+- pipeline fusionné : toutes les étapes dans une seule couche ASGI.
+
+Usage :
+    python benchmarks/bench_middleware.py [--requests 5000]
+"""
+import argparse
+import asyncio
+import logging
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+from statistics import median
+
+API_DIR = Path(__file__).resolve().parent.parent / "api"
+WORK_DIR = tempfile.mkdtemp(prefix="bench_middleware_")
+
+os.environ.setdefault("ENVIRONMENT", "test")
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+os.environ["DATABASE_URL"] = f"sqlite:///{WORK_DIR}/bench.db"
+os.environ["RATE_LIMIT_REQUESTS"] = str(10 ** 9)
+os.environ["DEBUG"] = "false"
+os.chdir(WORK_DIR)
+sys.path.insert(0, str(API_DIR))
+
+from fastapi import FastAPI  # noqa: E402
+from starlette.middleware.base import BaseHTTPMiddleware  # noqa: E402
+
+from core.middleware import (  # noqa: E402
+    PipelineMiddleware, MiddlewareStage, RequestContext, SecurityHeadersStage,
+    RateLimitStage, LoggingStage, ValidationStage, MetricsStage, BASIC_SECURITY_HEADERS
+)
+
+logging.getLogger("core.middleware").setLevel(logging.WARNING)
+
+
+def make_stages():
+    return [
+        SecurityHeadersStage(BASIC_SECURITY_HEADERS),
+        RateLimitStage(),
+        LoggingStage(),
+        ValidationStage(),
+        MetricsStage()
+    ]
+
+
+class BaseHTTPStage(BaseHTTPMiddleware):
+    """Même étape, exécutée comme l'ancienne implémentation `dispatch`"""
+
+    def __init__(self, app, stage: MiddlewareStage):
+        super().__init__(app)
+        self.stage = stage
+
+    async def dispatch(self, request, call_next):
+        ctx = RequestContext(request.scope)
+        early_response = await self.stage.on_request(ctx)
+        response = early_response or await call_next(request)
+        ctx.status_code = response.status_code
+        self.stage.on_response_start(ctx, response.headers)
+        self.stage.on_complete(ctx, None)
+        return response
+
+
+def make_app(mode: str) -> FastAPI:
+    app = FastAPI()
+
+    @app.get("/ping")
+    async def ping():
+        return {"status": "ok"}
+
+    stages = make_stages()
+    if mode == "basehttp":
+        for stage in reversed(stages):
+            app.add_middleware(BaseHTTPStage, stage=stage)
+    elif mode == "asgi":
+        for stage in reversed(stages):
+            app.add_middleware(PipelineMiddleware, stages=[stage])
+    elif mode == "fused":
+        app.add_middleware(PipelineMiddleware, stages=stages)
+    return app
+
+
+async def call(app, scope):
+    messages = []
+    request_sent = False
+    response_done = asyncio.Event()
+
+    async def receive():
+        # Comme un serveur : le corps une fois, puis attente de la déconnexion
+        nonlocal request_sent
+        if not request_sent:
+            request_sent = True
+            return {"type": "http.request", "body": b"", "more_body": False}
+        await response_done.wait()
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        messages.append(message)
+        if message["type"] == "http.response.body" and not message.get("more_body", False):
+            response_done.set()
+
+    await app(dict(scope, headers=list(scope["headers"])), receive, send)
+    assert messages[0]["status"] == 200
+
+
+async def measure(app, requests: int) -> float:
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "GET",
+        "scheme": "http",
+        "path": "/ping",
+        "raw_path": b"/ping",
+        "query_string": b"",
+        "root_path": "",
+        "headers": [(b"host", b"localhost"), (b"user-agent", b"bench")],
+        "client": ("127.0.0.1", 1234),
+        "server": ("localhost", 80),
+    }
+    for _ in range(200):
+        await call(app, scope)
+
+    start = time.perf_counter()
+    for _ in range(requests):
+        await call(app, scope)
+    return (time.perf_counter() - start) / requests
+
+
+async def main(args):
+    modes = ["none", "basehttp", "asgi", "fused"]
+    apps = {mode: make_app(mode) for mode in modes}
+    results = {mode: [] for mode in modes}
+
+    for _ in range(args.rounds):
+        for mode in modes:
+            results[mode].append(await measure(apps[mode], args.requests))
+
+    baseline = median(results["none"])
+    print(f"{'empilement':<12} {'µs/requête':>11} {'surcoût':>10}")
+    for mode in modes:
+        per_request = median(results[mode])
+        print(f"{mode:<12} {per_request * 1e6:11.1f} {(per_request - baseline) * 1e6:9.1f}µs")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=5000, help="Requêtes par mesure")
+    parser.add_argument("--rounds", type=int, default=5, help="Nombre de mesures par empilement")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,173 @@
+"""
+Benchmark : mémoire par worker et débit du serveur préforké (api/serve.py)
+
+Lance `serve.py` avec 1, 2 puis 4 workers, avec et sans préchargement dans
+le maître (`--no-preload` : chaque worker importe l'application et lit le
+modèle lui-même), puis mesure :
+
+- le temps jusqu'à ce que tous les workers soient prêts ;
+- la mémoire de chaque worker (RSS, PSS : pages partagées au prorata,
+  mémoire privée) et le PSS total (maître compris) ;
+- le débit de `/predict/image` avec deux clients concurrents par worker.
+
+Un modèle Keras de la taille d'un CNN de transfert (MobileNetV2, 150x150,
+4 classes) est généré pour la mesure, ou lu depuis --model.
+
+Usage :
+    python benchmarks/bench_prefork.py [--workers 1 2 4] [--duration 15] [--model chemin.h5]
+"""
+import argparse
+import http.client
+import io
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+from statistics import mean
+
+API_DIR = Path(__file__).resolve().parent.parent / "api"
+WORK_DIR = tempfile.mkdtemp(prefix="bench_prefork_")
+sys.path.insert(0, str(API_DIR))
+
+import numpy as np  # noqa: E402
+from PIL import Image  # noqa: E402
+
+from serve import memory_usage  # noqa: E402
+
+PORT = 18090
+
+
+def make_model(path: str):
+    import tensorflow as tf
+
+    model = tf.keras.applications.MobileNetV2(weights=None, input_shape=(150, 150, 3), classes=4)
+    model.save(path)
+
+
+def make_image() -> bytes:
+    img = Image.fromarray(np.random.randint(0, 255, (300, 300, 3), dtype=np.uint8))
+    img_bytes = io.BytesIO()
+    img.save(img_bytes, format="JPEG")
+    return img_bytes.getvalue()
+
+
+def children_of(pid: int):
+    pids = []
+    for entry in Path("/proc").iterdir():
+        if entry.name.isdigit():
+            try:
+                if int((entry / "stat").read_text().rsplit(")", 1)[1].split()[1]) == pid:
+                    pids.append(int(entry.name))
+            except (OSError, IndexError, ValueError):
+                pass
+    return pids
+
+
+def request(conn: http.client.HTTPConnection, method: str, path: str, body=None, headers=None):
+    conn.request(method, path, body=body, headers=headers or {})
+    response = conn.getresponse()
+    return response.status, response.read()
+
+
+def multipart(image: bytes):
+    boundary = "benchprefork"
+    body = (
+        f'--{boundary}\r\nContent-Disposition: form-data; name="file"; filename="a.jpg"\r\n'
+        f"Content-Type: image/jpeg\r\n\r\n"
+    ).encode() + image + f"\r\n--{boundary}--\r\n".encode()
+    return body, f"multipart/form-data; boundary={boundary}"
+
+
+def start_server(workers: int, preload: bool, model_path: str, log_path: Path):
+    env = {
+        **os.environ,
+        "ENVIRONMENT": "production",
+        "MODEL_PATH": model_path,
+        "DATABASE_URL": f"sqlite:///{WORK_DIR}/bench.db",
+        "RATE_LIMIT_REQUESTS": str(10 ** 9),
+        "RATE_LIMIT_ROLE_QUOTAS": json.dumps({"user": 10 ** 9, "admin": 10 ** 9}),
+        "TF_CPP_MIN_LOG_LEVEL": "2"
+    }
+    command = [sys.executable, str(API_DIR / "serve.py"), "--workers", str(workers),
+               "--port", str(PORT), "--report-interval", "0"]
+    if not preload:
+        command.append("--no-preload")
+
+    log = open(log_path, "w")
+    start = time.perf_counter()
+    process = subprocess.Popen(command, cwd=WORK_DIR, env=env, stdout=log, stderr=subprocess.STDOUT)
+    while log_path.read_text().count("Application startup complete") < workers:
+        if process.poll() is not None or time.perf_counter() - start > 600:
+            raise RuntimeError(f"Démarrage impossible, voir {log_path}")
+        time.sleep(0.2)
+    return process, time.perf_counter() - start
+
+
+def throughput(clients: int, duration: float) -> float:
+    conn = http.client.HTTPConnection("127.0.0.1", PORT)
+    status, body = request(conn, "POST", "/auth/login", json.dumps({"username": "testuser", "password": "user123!"}),
+                           {"Content-Type": "application/json"})
+    assert status == 200, body
+    token = json.loads(body)["access_token"]
+    payload, content_type = multipart(make_image())
+    headers = {"Authorization": f"Bearer {token}", "Content-Type": content_type}
+
+    counts = [0] * clients
+    deadline = time.perf_counter() + duration
+
+    def client(index: int):
+        connection = http.client.HTTPConnection("127.0.0.1", PORT)
+        while time.perf_counter() < deadline:
+            status, body = request(connection, "POST", "/predict/image", payload, headers)
+            assert status == 200, body
+            counts[index] += 1
+
+    threads = [threading.Thread(target=client, args=(i,)) for i in range(clients)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return sum(counts) / duration
+
+
+def main(args):
+    model_path = args.model or f"{WORK_DIR}/model.h5"
+    if not args.model:
+        make_model(model_path)
+    print(f"Modèle : {Path(model_path).stat().st_size / 1e6:.1f} Mo, {os.cpu_count()} CPU\n")
+    print(f"{'mode':<12} {'workers':>7} {'démarrage':>10} {'RSS/worker':>11} {'PSS/worker':>11} "
+          f"{'privée/worker':>14} {'PSS total':>10} {'débit':>12}")
+
+    for preload in (True, False):
+        for workers in args.workers:
+            log_path = Path(WORK_DIR) / f"serve_{workers}_{preload}.log"
+            process, startup = start_server(workers, preload, model_path, log_path)
+            try:
+                time.sleep(2)
+                pids = children_of(process.pid)
+                usages = [memory_usage(pid) for pid in pids]
+                master = memory_usage(process.pid)
+                rate = throughput(2 * workers, args.duration)
+            finally:
+                process.terminate()
+                process.wait(60)
+
+            per_worker = {key: mean(usage[key] for usage in usages) / 1e6 for key in ("rss", "pss", "private")}
+            total_pss = (sum(usage["pss"] for usage in usages) + master["pss"]) / 1e6
+            print(
+                f"{'préchargé' if preload else 'sans':<12} {workers:>7} {startup:>9.1f}s "
+                f"{per_worker['rss']:>8.0f} Mo {per_worker['pss']:>8.0f} Mo {per_worker['private']:>11.0f} Mo "
+                f"{total_pss:>7.0f} Mo {rate:>7.1f} req/s"
+            )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--duration", type=float, default=15.0)
+    parser.add_argument("--model")
+    main(parser.parse_args())
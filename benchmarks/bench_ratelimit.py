@@ -0,0 +1,79 @@
+"""
+Microbenchmark : limiteur de débit avec 100k clients distincts
+
+Compare le limiteur GCRA (un entier par client) à l'ancienne approche
+(une liste de `datetime` par client, reconstruite à chaque requête) :
+temps par décision et mémoire retenue, mesurée avec tracemalloc.
+
+Usage :
+    python benchmarks/bench_ratelimit.py [--clients 100000] [--requests-per-client 20]
+"""
+import argparse
+import random
+import sys
+import time
+import tracemalloc
+from collections import defaultdict
+from datetime import datetime, timedelta
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "api"))
+
+from core.ratelimit import GCRARateLimiter  # noqa: E402
+
+LIMIT = 100
+WINDOW = 3600
+
+
+class LegacyLimiter:
+    """Reproduction de l'ancien RateLimitMiddleware (listes d'horodatages)"""
+
+    def __init__(self):
+        self.requests = defaultdict(list)
+
+    def hit(self, client_id):
+        now = datetime.utcnow()
+        cutoff_time = now - timedelta(seconds=WINDOW)
+        self.requests[client_id] = [t for t in self.requests[client_id] if t > cutoff_time]
+        if len(self.requests[client_id]) >= LIMIT:
+            return False
+        self.requests[client_id].append(now)
+        return True
+
+
+def run(name, factory, keys):
+    # Temps mesuré sans tracemalloc, qui fausserait la mesure
+    limiter = factory()
+    start = time.perf_counter()
+    for key in keys:
+        limiter.hit(key)
+    elapsed = time.perf_counter() - start
+
+    tracemalloc.start()
+    limiter = factory()
+    for key in keys:
+        limiter.hit(key)
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    print(
+        f"  {name:<8} {elapsed / len(keys) * 1e6:6.2f} µs/décision  "
+        f"mémoire retenue {current / (1024 * 1024):7.1f} Mo"
+    )
+
+
+def main(args):
+    keys = [f"10.{i >> 16 & 255}.{i >> 8 & 255}.{i & 255}:{i}" for i in range(args.clients)]
+    traffic = keys * args.requests_per_client
+    random.Random(0).shuffle(traffic)
+
+    print(f"{args.clients} clients, {len(traffic)} requêtes")
+    run("ancien", LegacyLimiter, traffic)
+    run("GCRA", lambda: GCRARateLimiter(LIMIT, WINDOW, max_clients=args.clients), traffic)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--clients", type=int, default=100_000)
+    parser.add_argument("--requests-per-client", type=int, default=20)
+    main(parser.parse_args())
@@ -0,0 +1,106 @@
+"""
+Benchmark : sérialisation des réponses de prédiction
+
+Compare, pour les plus grosses réponses de l'API (lot de 10 prédictions,
+historique de 50 entrées), le chemin FastAPI par défaut et le chemin rapide :
+
+- lot : validation par `response_model` + `json.dumps` (JSONResponse)
+  contre mise en forme pré-calculée + orjson ;
+- historique : `jsonable_encoder` + `json.dumps` contre orjson direct ;
+- résultat unitaire : `PredictionResult(...).dict()` contre
+  `model_construct(...).model_dump()`.
+
+Usage :
+    python benchmarks/bench_serialization.py [--iterations 2000]
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+import warnings
+from datetime import datetime, timedelta
+from pathlib import Path
+from statistics import median
+from typing import List
+
+API_DIR = Path(__file__).resolve().parent.parent / "api"
+
+os.environ.setdefault("ENVIRONMENT", "test")
+sys.path.insert(0, str(API_DIR))
+
+from fastapi.encoders import jsonable_encoder  # noqa: E402
+from fastapi.responses import JSONResponse  # noqa: E402
+from fastapi.routing import serialize_response  # noqa: E402
+from fastapi.utils import create_response_field  # noqa: E402
+
+from core.config import settings  # noqa: E402
+from core.models import PredictionResponse, PredictionResult, PredictionStatus  # noqa: E402
+from core.serialization import prediction_json_response, fast_json_response  # noqa: E402
+
+
+def make_result(i: int):
+    probabilities = {category: 1 / len(settings.MODEL_CATEGORIES) for category in settings.MODEL_CATEGORIES}
+    return {
+        "filename": f"image_{i}.jpg",
+        "prediction": {"category": "Xbox", "confidence": 0.25, "probabilities": probabilities},
+        "processing_time": 0.0123,
+        "timestamp": datetime.utcnow() - timedelta(seconds=i),
+        "user_id": 2,
+        "status": PredictionStatus.SUCCESS
+    }
+
+
+def timed(func, iterations: int) -> float:
+    samples = []
+    for _ in range(5):
+        start = time.perf_counter()
+        for _ in range(iterations):
+            func()
+        samples.append((time.perf_counter() - start) / iterations)
+    return median(samples)
+
+
+def report(label: str, before: float, after: float):
+    print(f"{label:<28} {before * 1e6:9.1f} µs -> {after * 1e6:8.1f} µs  (x{before / after:.1f})")
+
+
+def main(args):
+    batch = [make_result(i) for i in range(10)]
+    history = [make_result(i) for i in range(50)]
+    batch_field = create_response_field(name="response", type_=List[PredictionResponse])
+    loop = asyncio.new_event_loop()
+
+    def batch_default():
+        content = loop.run_until_complete(serialize_response(field=batch_field, response_content=batch))
+        return JSONResponse(content).body
+
+    def batch_fast():
+        return prediction_json_response(batch).body
+
+    def history_default():
+        return JSONResponse(jsonable_encoder({"history": history})).body
+
+    def history_fast():
+        return fast_json_response({"history": history}).body
+
+    probabilities = batch[0]["prediction"]["probabilities"]
+
+    def result_dict():
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore", DeprecationWarning)
+            return PredictionResult(category="Xbox", confidence=0.25, probabilities=probabilities).dict()
+
+    def result_model_dump():
+        return PredictionResult.model_construct(category="Xbox", confidence=0.25, probabilities=probabilities).model_dump()
+
+    print(f"Lot de 10 : {len(batch_fast())} octets, historique de 50 : {len(history_fast())} octets")
+    report("lot (10 prédictions)", timed(batch_default, args.iterations), timed(batch_fast, args.iterations))
+    report("historique (50 entrées)", timed(history_default, args.iterations), timed(history_fast, args.iterations))
+    report("résultat unitaire", timed(result_dict, args.iterations * 10), timed(result_model_dump, args.iterations * 10))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=2000, help="Sérialisations par mesure")
+    main(parser.parse_args())
@@ -0,0 +1,61 @@
+"""
+Benchmark : durée du démarrage de l'API (lifespan)
+
+Mesure le temps de la phase de démarrage (`init_db`, chargement du modèle
+factice en mode test, création des services) sur une base neuve puis sur une
+base déjà initialisée, comme lors du redémarrage d'un worker.
+
+Usage :
+    python benchmarks/bench_startup.py [--runs 5]
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+from statistics import median
+
+API_DIR = Path(__file__).resolve().parent.parent / "api"
+WORK_DIR = tempfile.mkdtemp(prefix="bench_startup_")
+DB_PATH = Path(WORK_DIR) / "bench.db"
+
+os.environ.setdefault("ENVIRONMENT", "test")
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+os.environ["DATABASE_URL"] = f"sqlite:///{DB_PATH}"
+os.environ["DEBUG"] = "false"
+os.chdir(WORK_DIR)
+sys.path.insert(0, str(API_DIR))
+
+import_start = time.perf_counter()
+from main import app  # noqa: E402
+import_time = time.perf_counter() - import_start
+
+from core.database import engine  # noqa: E402
+
+
+async def startup_time() -> float:
+    start = time.perf_counter()
+    async with app.router.lifespan_context(app):
+        elapsed = time.perf_counter() - start
+    return elapsed
+
+
+def main(args):
+    fresh, warm = [], []
+    for _ in range(args.runs):
+        engine.dispose()
+        DB_PATH.unlink(missing_ok=True)
+        fresh.append(asyncio.run(startup_time()))
+        warm.append(asyncio.run(startup_time()))
+
+    print(f"Import de main : {import_time * 1000:.0f} ms")
+    print(f"Démarrage, base neuve       : médiane {median(fresh) * 1000:7.1f} ms (min {min(fresh) * 1000:.1f})")
+    print(f"Démarrage, base initialisée : médiane {median(warm) * 1000:7.1f} ms (min {min(warm) * 1000:.1f})")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5, help="Nombre de démarrages mesurés")
+    main(parser.parse_args())